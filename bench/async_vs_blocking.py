@@ -0,0 +1,105 @@
+"""
+Compares the throughput of the blocking and asyncio API clients.
+Lists the builds of many versions from a local stand-in Paper API with some added latency,
+one after the other with Update, from a thread pool with Update, and concurrently in one event loop with AsyncUpdate.
+
+>python bench/async_vs_blocking.py --versions 200 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+
+import server_update  # noqa: E402
+from server import StandIn  # noqa: E402
+
+
+def blocking(api, versions, threads):
+
+    update = server_update.Update('1.0.0', pool_size=threads, base=api.v1)
+
+    try:
+
+        if threads == 1:
+
+            return [update.get_buildnums(version) for version in versions]
+
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+
+            return list(pool.map(update.get_buildnums, versions))
+
+    finally:
+
+        update._pool.close()
+
+
+def concurrent(api, versions, limit):
+
+    update = server_update.AsyncUpdate('1.0.0', pool_size=limit, base=api.v1)
+
+    async def listings():
+
+        try:
+
+            return await asyncio.gather(*(update.get_buildnums(version) for version in versions))
+
+        finally:
+
+            update.close()
+
+    return asyncio.run(listings())
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Blocking vs asyncio API client benchmark')
+
+    parser.add_argument('--versions', type=int, default=200, help='Number of versions to list the builds of')
+    parser.add_argument('--latency', type=float, default=0.02, help='Seconds the stand-in holds each request for')
+    parser.add_argument('--concurrency', type=int, default=16, help='Threads, or connections of the event loop')
+
+    args = parser.parse_args()
+
+    server_update.output = lambda text: None
+
+    api = StandIn()
+
+    for num in range(args.versions):
+
+        api.add('1.{}.0'.format(num), 1, b'jar')
+
+    api.start()
+    api.latency = args.latency
+
+    versions = ['1.{}.0'.format(num) for num in range(args.versions)]
+    runs = [('blocking', lambda: blocking(api, versions, 1)),
+            ('blocking x{} threads'.format(args.concurrency), lambda: blocking(api, versions, args.concurrency)),
+            ('asyncio x{} connections'.format(args.concurrency), lambda: concurrent(api, versions, args.concurrency))]
+
+    print('{} versions, {}s latency per request'.format(args.versions, args.latency))
+    print('{:<28}{:>10}{:>14}{:>13}'.format('client', 'seconds', 'requests/s', 'connections'))
+
+    for name, run in runs:
+
+        connections = api.stats['connections']
+        start = time.perf_counter()
+        results = run()
+        seconds = time.perf_counter() - start
+
+        assert all(result == ['1'] for result in results), 'Listing failed'
+
+        print('{:<28}{:>10.3f}{:>14.1f}{:>13}'.format(name, seconds, len(versions) / seconds,
+                                                      api.stats['connections'] - connections))
+
+    api.close()
+
+
+if __name__ == '__main__':
+
+    main()
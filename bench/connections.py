@@ -0,0 +1,91 @@
+"""
+Connection pool benchmark.
+Runs what one update does(Version list, build list, and the jar download) against a local stand-in Paper API
+with a simulated handshake cost, with a fresh connection per request and with the keep-alive pool,
+and shows how many connections each run opened and how long it took.
+
+>python bench/connections.py --runs 20 --handshake 0.05
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+
+import server_update  # noqa: E402
+from server import StandIn, make_jar  # noqa: E402
+
+
+def update_run(api, path, pooled):
+
+    """
+    Does what a single update run does, with a new updater like a new process would
+    """
+
+    # An idle timeout of 0 discards every connection once its request is done:
+
+    update = server_update.Update('1.16.5', pool_idle=(30 if pooled else 0), base=api.v1)
+
+    try:
+
+        assert update.get_versions() is not None
+        assert update.get_buildnums('1.16.5') is not None
+        assert update.download(path, '1.16.5', 'latest')
+
+    finally:
+
+        update._pool.close()
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Connection pool benchmark')
+
+    parser.add_argument('--runs', type=int, default=20, help='Number of update runs per mode')
+    parser.add_argument('--handshake', type=float, default=0.05, help='Seconds each new connection costs')
+    parser.add_argument('--size', type=int, default=1048576, help='Approximate size of the jar in bytes')
+
+    args = parser.parse_args()
+
+    # Quiet, like a run from cron:
+
+    server_update.args = argparse.Namespace(quiet=True, json=False)
+
+    api = StandIn()
+
+    api.add('1.16.5', 100, make_jar(entries=16, size=max(4, args.size // 16)))
+    api.start()
+    api.handshake = args.handshake
+
+    print('{} runs per mode, {}s per handshake'.format(args.runs, args.handshake))
+    print('{:<24}{:>18}{:>22}'.format('mode', 'connections/run', 'median seconds/run'))
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for name, pooled in (('fresh connections', False), ('keep-alive pool', True)):
+
+            connections = api.stats['connections']
+            walls = []
+
+            for num in range(args.runs):
+
+                start = time.perf_counter()
+
+                update_run(api, os.path.join(directory, '{}.jar'.format(num)), pooled)
+
+                walls.append(time.perf_counter() - start)
+
+            print('{:<24}{:>18.1f}{:>22.3f}'.format(name, (api.stats['connections'] - connections) / args.runs,
+                                                    statistics.median(walls)))
+
+    api.close()
+
+
+if __name__ == '__main__':
+
+    main()
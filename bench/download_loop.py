@@ -0,0 +1,161 @@
+"""
+Download loop microbenchmark.
+Downloads a jar from a local stand-in Paper API with the old loop(A new bytes object for every 4608 byte read,
+written through a buffered file), and with Update.download()(One reused buffer filled with readinto(),
+adaptive block sizes, and unbuffered writes). Shows throughput, the number of body reads that allocated
+a new bytes object, and the peak memory traced while downloading.
+Update.download() also hashes and verifies the jar, the old loop does neither.
+The stand-in runs in this process, so segmented downloads compete with it for the GIL,
+segments pay off on high latency links, not on loopback.
+
+>python bench/download_loop.py --size 40 --runs 5
+"""
+
+import argparse
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.request
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'tests'))
+
+import server_update  # noqa: E402
+from server import StandIn  # noqa: E402
+
+calls = {'read': 0, 'readinto': 0}  # Body reads made through the pooled responses
+
+
+def counted(name):
+
+    method = getattr(server_update.PooledResponse, name)
+
+    def wrapper(self, *args):
+
+        calls[name] += 1
+
+        return method(self, *args)
+
+    return wrapper
+
+
+def old_loop(url, path):
+
+    """
+    The download loop before the rewrite
+    """
+
+    reads = 0
+
+    with urllib.request.urlopen(url) as data, open(path, mode='wb') as file:
+
+        while True:
+
+            byts = data.read(4608)
+
+            reads += 1
+
+            if not byts:
+
+                break
+
+            file.write(byts)
+
+    return reads
+
+
+def new_loop(update, url, path):
+
+    calls.update(read=0, readinto=0)
+
+    assert update.download(path, '1.16.5', 100)
+
+    return calls['read']
+
+
+def measure(func, runs):
+
+    """
+    Times a download, then runs it once more under tracemalloc
+    :return: (median seconds, allocating reads, peak traced bytes)
+    """
+
+    walls = []
+
+    for _ in range(runs):
+
+        start = time.perf_counter()
+        reads = func()
+
+        walls.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    func()
+
+    peak = tracemalloc.get_traced_memory()[1]
+
+    tracemalloc.stop()
+
+    return statistics.median(walls), reads, peak
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Download loop microbenchmark')
+
+    parser.add_argument('--size', type=int, default=40, help='Size of the jar in MB')
+    parser.add_argument('--runs', type=int, default=5, help='Timed downloads per loop')
+
+    args = parser.parse_args()
+
+    server_update.args = argparse.Namespace(quiet=True, json=False)
+    server_update.PooledResponse.read = counted('read')
+    server_update.PooledResponse.readinto = counted('readinto')
+
+    api = StandIn()
+
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w') as jar:
+
+        for num in range(args.size):
+
+            jar.writestr('f{:04d}.class'.format(num), os.urandom(1048576))
+
+    api.add('1.16.5', 100, buffer.getvalue())
+    api.start()
+
+    url = api.v1 + '/1.16.5/100/download'
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        path = os.path.join(directory, 'server.jar')
+        single = server_update.Update('1.16.5', base=api.v1)
+        segmented = server_update.Update('1.16.5', base=api.v1, segments=4)
+
+        loops = [('old loop, read(4608)', lambda: old_loop(url, path)),
+                 ('Update.download()', lambda: new_loop(single, url, path)),
+                 ('Update.download(), 4 segments', lambda: new_loop(segmented, url, path))]
+
+        print('{} MB jar, median of {} runs'.format(args.size, args.runs))
+        print('{:<32}{:>10}{:>10}{:>18}{:>16}'.format('loop', 'seconds', 'MB/s', 'allocating reads',
+                                                      'peak traced MB'))
+
+        for name, loop in loops:
+
+            seconds, reads, peak = measure(loop, args.runs)
+
+            print('{:<32}{:>10.3f}{:>10.1f}{:>18}{:>16.2f}'.format(name, seconds, args.size / seconds, reads,
+                                                                   peak / 1048576))
+
+    api.close()
+
+
+if __name__ == '__main__':
+
+    main()
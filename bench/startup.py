@@ -0,0 +1,138 @@
+"""
+Startup benchmark for the check path, with a budget.
+Runs 'server_update.py --check-only' in fresh interpreters against a local stand-in Paper API,
+under 'python -X importtime', and fails if the median import time or wall time is over budget,
+or if the check imported any of the modules that are meant to be imported lazily.
+
+>python bench/startup.py --runs 10 --import-budget 60 --wall-budget 400
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, os.path.join(ROOT, 'tests'))
+
+from server import StandIn, make_jar  # noqa: E402
+
+# Modules the check path must not import, they are only needed to download, install, or run the other modes:
+
+LAZY = ('asyncio', 'http.server', 'concurrent.futures', 'zipfile', 'traceback')
+
+
+def imports(stderr):
+
+    """
+    Parses 'python -X importtime' output
+    :param stderr: Output of the interpreter
+    :return: Dictionary mapping module names to their cumulative import time in microseconds
+    """
+
+    times = {}
+
+    for line in stderr.splitlines():
+
+        if not line.startswith('import time:') or 'cumulative' in line:
+
+            continue
+
+        _, cumulative, name = line[12:].split('|')
+
+        # Nested imports are indented, top level ones are what the interpreter spent importing in total:
+
+        times[name.strip()] = (int(cumulative), len(name) - len(name.lstrip()) == 1)
+
+    return times
+
+
+def run(api, directory):
+
+    """
+    Runs one check in a fresh interpreter
+    :return: (wall seconds, import times)
+    """
+
+    command = [sys.executable, '-X', 'importtime', os.path.join(ROOT, 'server_update.py'), '--check-only', '-q',
+               '-nlc', '-iv', '1.16.5', '-ib', '102', '--api-base', api.v1, '--cache-dir', directory,
+               os.path.join(directory, 'server.jar')]
+
+    start = time.perf_counter()
+    proc = subprocess.run(command, capture_output=True, text=True, cwd=directory)
+    wall = time.perf_counter() - start
+
+    if proc.returncode != 0:
+
+        raise SystemExit('Check failed:\n{}'.format(proc.stdout + proc.stderr[-2000:]))
+
+    return wall, imports(proc.stderr)
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Check path startup benchmark')
+
+    parser.add_argument('--runs', type=int, default=10, help='Number of checks to run')
+    parser.add_argument('--import-budget', type=float, default=60, help='Median import time budget in ms')
+    parser.add_argument('--wall-budget', type=float, default=400, help='Median wall time budget in ms')
+
+    args = parser.parse_args()
+
+    api = StandIn()
+
+    api.add('1.16.5', 100, make_jar(entries=2, size=1000))
+    api.add('1.16.5', 102, make_jar(entries=2, size=1000))
+    api.start()
+
+    walls = []
+    totals = []
+    lazy = set()
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        for _ in range(args.runs):
+
+            wall, times = run(api, directory)
+
+            walls.append(wall * 1000)
+            totals.append(sum(value for value, top in times.values() if top) / 1000)
+            lazy.update(name for name in times if name in LAZY)
+
+    api.close()
+
+    wall = statistics.median(walls)
+    total = statistics.median(totals)
+
+    print('{} checks'.format(args.runs))
+    print('{:<34}{:>10.1f} ms'.format('median wall time', wall))
+    print('{:<34}{:>10.1f} ms  (budget {} ms)'.format('median import time, all modules', total, args.import_budget))
+
+    failed = []
+
+    if total > args.import_budget:
+
+        failed.append('import time {:.1f} ms is over the {} ms budget'.format(total, args.import_budget))
+
+    if wall > args.wall_budget:
+
+        failed.append('wall time {:.1f} ms is over the {} ms budget'.format(wall, args.wall_budget))
+
+    if lazy:
+
+        failed.append('check imported lazily loaded modules: {}'.format(', '.join(sorted(lazy))))
+
+    if failed:
+
+        raise SystemExit('FAILED - ' + '; '.join(failed))
+
+    print('OK')
+
+
+if __name__ == '__main__':
+
+    main()
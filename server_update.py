@@ -1,20 +1,37 @@
 import tempfile
-import urllib.request
-from urllib.error import URLError
+import http.client
+from urllib.error import URLError, HTTPError
+from urllib.parse import urlsplit, urljoin
 import os
 import shutil
 import json
 import sys
-from math import ceil
-import traceback
-import argparse
+import threading
+import ssl
+import time
+import hashlib
+import struct
+import socket
+import functools
+import errno
+import random
+import bisect
+from collections import namedtuple
 
 """
 A Set of tools to automate the server update process.
 Error philosophy:
  > As long as it is LOGGED or DISPLAYED somewhere for the user to see, it has been handled.
+Startup philosophy:
+ > Only what checking for an update needs is imported up here(Most of it comes with http.client anyway).
+   Modules only used for downloading, installing, and the other modes(asyncio, http.server, concurrent.futures, ...)
+   are imported where they are used, so a check that finds nothing new never pays for them.
  """
 
+args = None  # Parsed command line arguments, stays None when we are used as a library
+events = None  # Stream structured events are written to in JSON mode, None when disabled
+events_lock = threading.Lock()  # Lock keeping events from different threads on their own lines
+
 
 def output(text):
 
@@ -23,13 +40,47 @@ def output(text):
     will not print content if we are in quiet mode.
     """
 
-    if not args.quiet:
+    if not quiet():
 
         # We are not quieted, print the content
 
         print(text)
 
 
+def quiet():
+
+    """
+    Determines if we are in quiet mode
+    :return: True if quiet, False if not
+    """
+
+    return args is not None and (args.quiet or args.json)
+
+
+def emit(event, **fields):
+
+    """
+    Emits a structured event as a line of JSON, if we are in JSON mode.
+    :param event: Name of the event
+    :param fields: Fields of the event
+    :return:
+    """
+
+    if events is None:
+
+        # Not in JSON mode
+
+        return
+
+    fields['event'] = event
+    fields['time'] = round(time.time(), 3)
+
+    with events_lock:
+
+        events.write(json.dumps(fields) + "\n")
+        events.flush()
+
+
 def error_report(exc, net=False):
 
     """
@@ -51,6 +102,9 @@ def error_report(exc, net=False):
     # Print full traceback:
 
     print("Full Traceback:")
+
+    import traceback
+
     traceback.print_exc()
 
     if net:
@@ -77,937 +131,7312 @@ def error_report(exc, net=False):
     return
 
 
-class Update:
+FICLONE = 0x40049409  # ioctl that reflinks one file into another, on btrfs, XFS, and friends
 
-    """
-    Server updater, handles checking, downloading, and installing.
-    """
+# Errors meaning a copy strategy is not supported for these files, and the next one should be tried:
 
-    def __init__(self, ver):
+COPY_UNSUPPORTED = (errno.EXDEV, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.EBADF,
+                    errno.EPERM, errno.ETXTBSY)
 
-        self.ver = ver  # Version of the minecraft server we are currently using.
-        self._base = 'https://papermc.io/api/v1/paper'  # Base URL to build of off
-        self._headers = {
-             'Content-Type': 'application/json;charset=UTF-8',
-             'Accept': 'application/json, text/plain, */*',
-             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.10; rv:43.0) Gecko/20100101 Firefox/43.0',
-             'Accept-Language': 'en-US,en;q=0.5',
-             'DNT': '1',
-         }  # Request headers for contacting Paper Download API, emulating a Google client
 
-    def _progress_bar(self, total, step, end, prefix="", size=60, prog_char="#", empty_char="."):
+def fast_copy(src, dst):
 
-        """
-        Outputs a simple progress bar to stdout
-        :param total: Total amount of computations
-        :param step: Amount to increase the counter by
-        :param end:  Number to end on
-        :param prefix: What to show before the progress bar
-        :param size: Size of the progress bar
-        :return:
-        """
+    """
+    Copies a file, keeping the data in the kernel whenever we can.
+    Strategies are tried in order, from cheapest to most expensive:
+     > reflink - The copy shares the blocks of the source, and costs nothing(Copy on write filesystems)
+     > copy_file_range - The kernel copies the data, possibly offloading it to the filesystem
+     > sendfile - The kernel copies the data, without it passing through userspace
+     > userspace - We read and write every byte ourselves
+    :param src: Path to the file to copy
+    :param dst: Path to copy the file to, replaced if it exists
+    :return: Name of the strategy that was used
+    """
 
-        # Iterating over the total number of iterations:
+    with tracer.span('copy') as span, open(src, 'rb') as source, open(dst, 'wb') as dest:
 
-        for i in range(total):
+        size = os.fstat(source.fileno()).st_size
+        strategy = None
 
-            # Yield i
+        for name, func in (('reflink', _copy_reflink), ('copy_file_range', _copy_range),
+                           ('sendfile', _copy_sendfile)):
 
-            yield i
+            try:
 
-            # Calculate number of '#' to render:
+                if func(source.fileno(), dest.fileno(), size):
 
-            x = int(size*(i+1)/total)
+                    strategy = name
 
-            # Rendering progress bar:
+                    break
 
-            if not args.quiet:
+            except OSError as e:
 
-                sys.stdout.write("{}[{}{}] {}/{}\r".format(prefix, prog_char*x, empty_char*(size-x),
-                                                           (i*step if i < total - 1 else end), end))
-                sys.stdout.flush()
+                if e.errno not in COPY_UNSUPPORTED:
 
-        # Writing newline, to continue execution
+                    raise
 
-        if not args.quiet:
+            # Not supported here, starting over with the next strategy
 
-            sys.stdout.write("\n")
-            sys.stdout.flush()
+            dest.seek(0)
+            dest.truncate()
 
-    def _url_report(self, point):
+        if strategy is None:
 
-        """
-        Reports an error during a request operation
-        :param point: Point of failure
-        :return:
-        """
+            # Nothing faster worked, copying it ourselves
 
-        print("\n+==================================================+")
-        print("> !ATTENTION! >")
-        print("An error occurred during a request operation.")
-        print("Fail Point: {}".format(point))
-        print("Your check/update operation will be canceled.")
-        print("Detailed error info below:")
+            source.seek(0)
+            shutil.copyfileobj(source, dest, 1048576)
 
-    def download(self, path, version, build_num='latest'):
+            strategy = 'userspace'
 
-        """
-        Gets file from Paper API, and displays a progress bar
-        Write to the file specified in chunks, as to not fill up the memory
-        :param version: Version to download
-        :param build_num: Build to download
-        :param path: Path to file to write to
-        :return: True on success, False on Failure
-        """
+        span.add(size)
+        span.tags['strategy'] = strategy
 
-        output("\n[ --== Starting Download: ==-- ]")
+    output("# Copied {} bytes with {}".format(size, strategy))
 
-        # Building URL here:
+    return strategy
 
-        url = self._base + '/' + str(version) + '/' + str(build_num) + '/download'
 
-        output("URL: {}".format(url))
+def _copy_reflink(src, dst, size):
 
-        # Creating request here:
+    """
+    Reflinks a file, so both files share the same blocks
+    :param src: Source file descriptor
+    :param dst: Destination file descriptor
+    :param size: Number of bytes to copy
+    :return: True if the file was copied, False if reflinks are not available
+    """
 
-        req = urllib.request.Request(url, headers=self._headers)
+    if not sys.platform.startswith('linux'):
 
-        # Sending request to Paper API
+        return False
 
-        try:
+    import fcntl
 
-            data = urllib.request.urlopen(req)
+    fcntl.ioctl(dst, FICLONE, src)
 
-        except URLError as e:
+    return True
 
-            self._url_report("File Download")
 
-            # Network error occurred
+def _copy_range(src, dst, size):
 
-            error_report(e, net=True)
+    """
+    Copies a file with copy_file_range()
+    :param src: Source file descriptor
+    :param dst: Destination file descriptor
+    :param size: Number of bytes to copy
+    :return: True if the file was copied, False if copy_file_range() is not available
+    """
 
-            return False
+    if not hasattr(os, 'copy_file_range'):
 
-        # Getting content length of download:
+        return False
 
-        length = int(data.getheader('content-length'))
-        blocksize = 4608
+    offset = 0
 
-        output("Download Size: {}".format(length))
+    while offset < size:
 
-        file = open(path, mode='ba')
+        num = os.copy_file_range(src, dst, size - offset, offset, offset)
 
-        # Using progress bar to visualise download:
+        if not num:
 
-        try:
+            # File shrunk under us, or nothing was copied
 
-            for i in self._progress_bar(ceil(length/blocksize) + 1, blocksize, length, prefix='Downloading:'):
+            return offset == size
 
-                # Getting blocksize data:
+        offset += num
 
-                byts = data.read(blocksize)
+    return True
 
-                # Writing data to file:
 
-                file.write(byts)
+def _copy_sendfile(src, dst, size):
 
-        except URLError as e:
+    """
+    Copies a file with sendfile()
+    :param src: Source file descriptor
+    :param dst: Destination file descriptor
+    :param size: Number of bytes to copy
+    :return: True if the file was copied, False if sendfile() is not available
+    """
 
-            self._url_report("File Download")
+    if not hasattr(os, 'sendfile') or not sys.platform.startswith('linux'):
 
-            # Report the error
+        # Other platforms only send files to sockets
 
-            error_report(e, net=True)
+        return False
 
-            file.close()
+    offset = 0
 
-            return False
+    while offset < size:
 
-        except Exception as e:
+        num = os.sendfile(dst, src, offset, size - offset)
 
-            self._url_report("File Download")
+        if not num:
 
-            # Report the error
+            return offset == size
 
-            error_report(e)
+        offset += num
 
-            file.close()
+    return True
 
-            return False
 
-        # Closing file:
+def traced(name, fail=False):
 
-        file.close()
+    """
+    Decorator that records each call of a function as a span.
+    Costs a single check when no exporters are configured.
+    :param name: Name of the span
+    :param fail: Return value that marks the call as failed(Like False or None)
+    :return: Decorator
+    """
 
-        # Done downloading
+    def decorator(func):
 
-        output("[ --== Download Complete! ==-- ]")
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
 
-        return True
+            if not tracer.exporters:
 
-    def _get(self, version=None, build_num=None):
+                # Not tracing, don't bother
 
-        """
-        Gets RAW data from the Paper API, version info only
-        :param version: Version to include in the URL
-        :param build_num: Build number to include in the URL
-        :return: urllib Request object
-        """
+                return func(*args, **kwargs)
 
-        # Building url:
+            with tracer.span(name) as span:
 
-        final = self._base
+                result = func(*args, **kwargs)
 
-        if version is not None:
+                span.error = span.error or result is fail
 
-            # Specific version requested:
+                return result
 
-            final = final + '/' + str(version)
+        return wrapper
 
-            if build_num is not None:
+    return decorator
 
-                # Specific build num requested:
 
-                final = final + '/' + str(build_num)
+class Span:
 
-        # Creating request here:
+    """
+    A timed operation.
+    Records the wall time, bytes transferred, and retries of the operation.
+    """
 
-        req = urllib.request.Request(final, headers=self._headers)
+    def __init__(self, tracer, name, parent=None, **tags):
 
-        # Getting data:
+        self.tracer = tracer  # Tracer we report to
+        self.name = name  # Name of the operation
+        self.parent = parent  # Span we were started under, if any
+        self.tags = tags  # Extra information about the operation
+        self.start = 0  # Time the span was started
+        self.seconds = 0  # Wall time of the span
+        self.bytes = 0  # Number of bytes transferred
+        self.retries = 0  # Number of retries
+        self.error = False  # Whether the operation failed
+        self._stamp = 0  # Monotonic time the span was started
 
-        try:
+    def add(self, num=0, retries=0):
 
-            data = urllib.request.urlopen(req)
+        """
+        Adds bytes and retries to the span
+        :param num: Number of bytes transferred
+        :param retries: Number of retries
+        :return:
+        """
 
-        except Exception as e:
+        self.bytes += num
+        self.retries += retries
 
-            self._url_report("API Fetch Operation")
+    def record(self):
 
-            # Exception occurred, handel it
+        """
+        Gets the span as a dictionary
+        :return: Dictionary of span data
+        """
 
-            error_report(e, net=True)
+        data = {'span': self.name, 'parent': (self.parent.name if self.parent is not None else None),
+                'start': round(self.start, 3), 'seconds': round(self.seconds, 6), 'bytes': self.bytes,
+                'retries': self.retries, 'error': self.error}
 
-            return None
+        data.update(self.tags)
 
         return data
 
-    def get_versions(self):
+    def __enter__(self):
 
-        """
-        Gets available versions of the server
-        :return: List of available versions
-        """
+        self.start = time.time()
+        self._stamp = time.monotonic()
 
-        # Getting raw data and converting it to JSON format
+        self.tracer._push(self)
 
-        output("  > Fetching and decoding version info...")
+        return self
 
-        data = self._get()
+    def __exit__(self, exc_type, exc, tb):
 
-        if data is None:
+        self.seconds = time.monotonic() - self._stamp
+        self.error = self.error or exc_type is not None
 
-            # Error occurred
+        self.tracer._pop(self)
+        self.tracer.export(self)
 
-            return None
 
-        data = json.loads(data.read())
+class Tracer:
 
-        # Returning version info
+    """
+    Creates spans, and hands finished spans to our exporters.
+    Spans are tracked per thread, so bytes and retries are added to the innermost span of the current thread.
+    """
 
-        output("  > Done fetching version information!")
+    def __init__(self, exporters=None):
 
-        return data['versions']
+        self.exporters = list(exporters or [])  # Exporters finished spans are handed to
+        self._local = threading.local()  # Per thread stack of open spans
+        self._lock = threading.Lock()  # Lock protecting the exporters
 
-    def get_buildnums(self, version):
+    def span(self, name, parent=None, **tags):
 
         """
-        Gets available build for a particular version
-        :param version: Version to get builds for
-        :return: List of builds
+        Creates a span, to be used as a context manager
+        :param name: Name of the operation
+        :param parent: Span to start under, defaults to the current span of this thread
+        :param tags: Extra information about the operation
+        :return: Span object
         """
 
-        # Getting raw data and converting it to JSON format
-
-        output("  > Fetching and decoding build info...")
+        return Span(self, name, parent=(parent if parent is not None else self.current()), **tags)
 
-        data = self._get(version=version)
+    def current(self):
 
-        if data is None:
+        """
+        Gets the innermost open span of this thread
+        :return: Span object, None if there is none
+        """
 
-            # Error occurred
+        stack = getattr(self._local, 'stack', None)
 
-            return None
+        return (stack[-1] if stack else None)
 
-        data = json.loads(data.read())
+    def add(self, num=0, retries=0):
 
-        output("  > Done fetching build info!")
+        """
+        Adds bytes and retries to the current span, if any
+        :param num: Number of bytes transferred
+        :param retries: Number of retries
+        :return:
+        """
 
-        return data['builds']['all']
+        if not self.exporters:
 
+            return
 
-class FileUtil:
+        span = self.current()
 
-    """
-    Class for managing the creating/deleting/moving of server files
-    """
+        if span is not None:
 
-    def __init__(self, path, config=None):
+            span.add(num, retries)
 
-        self.path = path  # Path to file being updated
-        self.temp = None  # Tempdir instance
-        self.config_default = 'version_history.json'  # Default name of paper versioning file
+    def _push(self, span):
 
-    def create_temp_dir(self):
+        if not hasattr(self._local, 'stack'):
 
-        """
-        Creates a temporary directory
-        :return: Temp file instance
-        """
+            self._local.stack = []
 
-        self.temp = tempfile.TemporaryDirectory()
+        self._local.stack.append(span)
 
-        return self.temp
+    def _pop(self, span):
 
-    def close_temp_dir(self):
+        stack = self._local.stack
 
-        """
-        Closes created temporary directory
-        :return:
-        """
+        if span in stack:
 
-        self.temp.close()
+            stack.remove(span)
 
-    def load_config(self, config):
+    def export(self, span):
 
         """
-        Loads configuration info from 'version.json' in the server directory
-        We only load version info if it's in the official format!
+        Hands a finished span to every exporter.
+        Exporters never break an update, errors are only reported.
+        :param span: Finished span
+        :return:
         """
 
-        config = (config if config is not None else os.path.join(os.path.dirname(self.path), self.config_default))
+        with self._lock:
 
-        output("# Checking configuration file at [{}] ...".format(config))
+            for exporter in self.exporters:
 
-        if os.path.isfile(config):
+                try:
 
-            # Exists and is file, read it
+                    exporter.export(span)
 
-            output("# Loading configuration data ...")
+                except Exception as e:
 
-            try:
+                    print("# Unable to export span [{}] to {}: {}".format(span.name, type(exporter).__name__, e))
 
-                file = open(config, 'r')
+    def flush(self):
 
-                data = json.load(file)
+        """
+        Flushes every exporter, so long running processes publish their spans as they go
+        :return:
+        """
 
-            except Exception as e:
+        with self._lock:
 
-                # Failed to load config data - not in JSON format
+            for exporter in self.exporters:
 
-                print("# Failed to load config data - Not in JSON format!")
+                try:
 
-                return '0', 0
+                    exporter.flush()
 
-            # Read the data, and attempt to pull some info out of it
+                except Exception as e:
 
-            current = data['currentVersion']
+                    print("# Unable to flush {}: {}".format(type(exporter).__name__, e))
 
-            if type(current) != str:
+    def close(self):
 
-                # We only accept strings:
+        """
+        Flushes and closes every exporter
+        :return:
+        """
 
-                print("# Failed to load config data - We want strings, not {}!".format(type(current)))
+        with self._lock:
 
-                return '0', 0
+            for exporter in self.exporters:
 
-            # Catch any exceptions due to weird format conventions:
+                try:
 
-            try:
+                    exporter.close()
 
-                # Splitting the data in two so we can pull some content out:
+                except Exception as e:
 
-                build, version = current.split(" ", 1)
+                    print("# Unable to close {}: {}".format(type(exporter).__name__, e))
 
-                # Getting build information:
 
-                build = int(build.split("-")[-1])
+class JsonlExporter:
 
-                # Getting version information:
+    """
+    Appends every span to a file, one JSON object per line.
+    """
 
-                version = version[5:-1]
+    def __init__(self, path):
 
-            except Exception as e:
+        self.path = path  # Path of the file to append to
+        self._file = open(path, 'a')  # File we append to
 
-                # Weird file content. Unable to get info.
+    def export(self, span):
 
-                print("# Unable to load config data - Invalid Format, we support official builds only!")
+        self._file.write(json.dumps(span.record()) + "\n")
 
-                return '0', 0
+    def flush(self):
 
-            # Returning version information:
+        self._file.flush()
 
-            output("# Done loading configuration data! ")
+    def close(self):
 
-            return version, build
+        self._file.close()
 
-        else:
 
-            print("# Unable to load config data from file at [{}] - Not found/Not a file!".format(config))
+class PrometheusExporter:
 
-            return '0', 0
+    """
+    Aggregates spans, and writes them as a Prometheus textfile collector file when flushed or closed.
+    The file is written to a temporary file and renamed, so the collector never reads a partial file.
+    """
 
-    def _fail_install(self, point):
+    def __init__(self, path, prefix='server_update'):
 
-        """
-        Shows where the error occurred during the installation
-        :param point: Point of failure
-        :return:
-        """
+        self.path = path  # Path of the .prom file to write
+        self.prefix = prefix  # Prefix of the metric names
+        self.totals = {}  # Totals per span name, [count, seconds, bytes, retries, errors]
 
-        print("\n+==================================================+")
-        print("> !ATTENTION! <")
-        print("An error occurred during the installation, and we can not continue.")
-        print("We will attempt to recover your previous installation(If applicable)")
-        print("Fail point: {}".format(point))
-        print("Detailed error info below:")
+    def export(self, span):
 
-        return
+        totals = self.totals.setdefault(span.name, [0, 0.0, 0, 0, 0])
 
-    def install(self):
+        totals[0] += 1
+        totals[1] += span.seconds
+        totals[2] += span.bytes
+        totals[3] += span.retries
+        totals[4] += int(span.error)
 
-        """
-        "Installs" the contents of the temporary file into the target in the root server directory.
-        :return:
-        """
+    def flush(self):
 
-        output("\n[ --== installation: ==-- ]")
+        lines = []
 
-        # Creating backup of old file:
+        for num, (metric, kind, text) in enumerate((('count', 'counter', 'Number of times a phase ran'),
+                                                   ('seconds', 'counter', 'Wall time spent in a phase'),
+                                                   ('bytes', 'counter', 'Bytes transferred in a phase'),
+                                                   ('retries', 'counter', 'Retries made in a phase'),
+                                                   ('errors', 'counter', 'Number of times a phase failed'))):
 
-        output("# Creating backup of previous installation...")
+            name = '{}_span_{}_total'.format(self.prefix, metric)
 
-        try:
+            lines.append('# HELP {} {}'.format(name, text))
+            lines.append('# TYPE {} {}'.format(name, kind))
 
-            shutil.copyfile(self.path, os.path.join(self.temp.name, 'backup'))
+            for span, totals in sorted(self.totals.items()):
 
-        except Exception as e:
+                lines.append('{}{{span="{}"}} {}'.format(name, span, round(totals[num], 6)))
 
-            # Show install error
+        lines.append('# HELP {}_last_run_timestamp_seconds Time the last run finished'.format(self.prefix))
+        lines.append('# TYPE {}_last_run_timestamp_seconds gauge'.format(self.prefix))
+        lines.append('{}_last_run_timestamp_seconds {}'.format(self.prefix, round(time.time(), 3)))
 
-            self._fail_install("File Backup")
+        with open(self.path + '.tmp', 'w') as file:
 
-            # Show error info
+            file.write("\n".join(lines) + "\n")
 
-            error_report(e)
+        os.replace(self.path + '.tmp', self.path)
 
-            return False
+    def close(self):
 
-        output("# Backup created at: {}".format(os.path.join(self.temp.name, 'backup')))
+        self.flush()
 
-        # Removing current file:
 
-        output("# Deleting current file at {}...".format(self.path))
+class StatsdExporter:
 
-        try:
+    """
+    Sends every span to a StatsD server over UDP.
+    Sends are fire and forget, a missing StatsD server never slows us down.
+    """
 
-            os.remove(self.path)
+    def __init__(self, host='127.0.0.1', port=8125, prefix='server_update'):
 
-        except Exception as e:
+        self.address = (host, port)  # Address of the StatsD server
+        self.prefix = prefix  # Prefix of the metric names
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)  # Socket we send metrics over
 
-            self._fail_install("Old File Deletion")
+    def export(self, span):
 
-            # Showing error
+        name = '{}.{}'.format(self.prefix, span.name)
+        lines = ['{}.time:{}|ms'.format(name, round(span.seconds * 1000, 3))]
 
-            error_report(e)
+        if span.bytes:
 
-            # Recovering backup
+            lines.append('{}.bytes:{}|c'.format(name, span.bytes))
 
-            self._recover_backup()
+        if span.retries:
 
-            return False
+            lines.append('{}.retries:{}|c'.format(name, span.retries))
 
-        output("# Removed original file!")
+        if span.error:
 
-        # Copying downloaded file to root:
+            lines.append('{}.errors:1|c'.format(name))
 
         try:
 
-            output("# Copying download data to root directory...")
-            output("# ({} > {})".format(os.path.join(self.temp.name, 'download_data'),
-                                        self.path))
+            self._sock.sendto("\n".join(lines).encode(), self.address)
 
-            shutil.copyfile(os.path.join(self.temp.name, 'download_data'), self.path)
+        except OSError:
 
-        except Exception as e:
+            # Nobody listening, or the network is down
 
-            # Install error
+            pass
 
-            self._fail_install("File Copy")
+    def flush(self):
 
-            # Show error
+        # Nothing is buffered
 
-            error_report(e)
+        pass
 
-            # Recover backup
+    def close(self):
 
-            self._recover_backup()
+        self._sock.close()
 
-            return False
 
-        output("# Done copying download data to root directory!")
+tracer = Tracer()  # Tracer used by every updater, has no exporters unless configured
 
-        # Cleaning up temporary directory:
 
-        output("# Cleaning up temporary directory...")
+class RetryPolicy:
 
-        self.temp.cleanup()
+    """
+    Decides when, and how long after, a failed request is tried again.
+    Server errors, resets and timeouts are retried with exponential backoff and some random jitter,
+    anything else(Like a 404, or a full disk) fails right away.
+    """
 
-        output("# Done cleaning temporary directory!")
+    def __init__(self, attempts=3, backoff=0.5, max_backoff=30, jitter=0.1, connect_timeout=10, read_timeout=30):
 
-        output("[ --== installation complete! ==-- ]")
+        self.attempts = max(1, attempts)  # Maximum number of attempts, including the first one
+        self.backoff = backoff  # Seconds to wait before the first retry, doubled for each retry after that
+        self.max_backoff = max_backoff  # Maximum seconds to wait between attempts
+        self.jitter = jitter  # Fraction of the delay to randomly add or remove
+        self.connect_timeout = connect_timeout  # Seconds to wait for a connection to be established
+        self.read_timeout = read_timeout  # Seconds to wait for data on an established connection
 
-        return True
+    @staticmethod
+    def retryable(exc):
 
+        """
+        Determines if an error is worth retrying
+        :param exc: Exception that occurred
+        :return: True if the request should be retried, False if not
+        """
+
+        if isinstance(exc, HTTPError):
+
+            # Server errors, and being told to slow down
+
+            return exc.code >= 500 or exc.code in (408, 429)
+
+        if isinstance(exc, URLError):
+
+            # Pulling the underlying error out
+
+            exc = exc.reason
+
+        if isinstance(exc, socket.gaierror):
+
+            # Only temporary DNS failures
+
+            return exc.errno == socket.EAI_AGAIN
+
+        return isinstance(exc, (socket.timeout, ConnectionError, http.client.HTTPException))
+
+    def delay(self, attempt):
+
+        """
+        Gets the number of seconds to wait before an attempt
+        :param attempt: Number of the retry, starting at 1
+        :return: Seconds to wait
+        """
+
+        return min(self.max_backoff, self.backoff * (2 ** (attempt - 1))) * \
+            random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def call(self, func, *args, **kwargs):
+
+        """
+        Calls a function, retrying it while it fails with a retryable error
+        :param func: Function to call
+        :param args: Arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: Return value of the function
+        """
+
+        attempt = 0
+
+        while True:
+
+            try:
+
+                return func(*args, **kwargs)
+
+            except Exception as e:
+
+                attempt += 1
+
+                if attempt >= self.attempts or not self.retryable(e):
+
+                    # Out of attempts, or not worth retrying
+
+                    raise
+
+                delay = self.delay(attempt)
+
+                tracer.add(retries=1)
+
+                output("# Request failed ({}), retrying in {} seconds [{}/{}]...".format(e, round(delay, 2), attempt,
+                                                                                       self.attempts - 1))
+
+                time.sleep(delay)
+
+    async def call_async(self, func, *args, **kwargs):
+
+        """
+        Awaits a coroutine function, retrying it while it fails with a retryable error.
+        Works like call(), without blocking the event loop between attempts.
+        :param func: Coroutine function to call
+        :param args: Arguments to pass to the function
+        :param kwargs: Keyword arguments to pass to the function
+        :return: Return value of the function
+        """
+
+        import asyncio
+
+        attempt = 0
+
+        while True:
+
+            try:
+
+                return await func(*args, **kwargs)
+
+            except Exception as e:
+
+                attempt += 1
+
+                if attempt >= self.attempts or not self.retryable(e):
+
+                    # Out of attempts, or not worth retrying
+
+                    raise
+
+                delay = self.delay(attempt)
+
+                tracer.add(retries=1)
+
+                output("# Request failed ({}), retrying in {} seconds [{}/{}]...".format(e, round(delay, 2), attempt,
+                                                                                       self.attempts - 1))
+
+                await asyncio.sleep(delay)
+
+
+class RateLimiter:
+
+    """
+    Token bucket limiting the rate data is transferred at.
+    One limiter can be shared by any number of threads and downloads, which then share its rate.
+    Tokens are reserved up front, so concurrent callers queue up behind each other instead of bursting together.
+    """
+
+    def __init__(self, rate, burst=None):
+
+        self.rate = rate  # Bytes per second we allow
+        self.burst = burst or max(16384, min(1048576, rate // 4))  # Bytes we allow at once after being idle
+        self.tokens = self.burst  # Bytes currently available
+        self._stamp = time.monotonic()  # Time the bucket was last refilled
+        self._lock = threading.Lock()  # Lock protecting the bucket
+
+    def reserve(self, num):
+
+        """
+        Takes bytes out of the bucket, going into debt if there are not enough
+        :param num: Number of bytes to take
+        :return: Seconds to wait before the bytes may be used
+        """
+
+        with self._lock:
+
+            now = time.monotonic()
+
+            # Refilling the bucket with what accumulated since last time:
+
+            self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+            self._stamp = now
+
+            self.tokens -= num
+
+            return max(0.0, -self.tokens / self.rate)
+
+    def consume(self, num):
+
+        """
+        Takes bytes out of the bucket, and waits until they may be used
+        :param num: Number of bytes to take
+        :return:
+        """
+
+        delay = self.reserve(num)
+
+        if delay:
+
+            time.sleep(delay)
+
+
+def parse_rate(text):
+
+    """
+    Parses a transfer rate, like '500K' or '2.5M', into bytes per second
+    :param text: Rate to parse, with an optional K, M or G suffix
+    :return: Bytes per second
+    """
+
+    text = text.strip().upper().rstrip('B/S')
+    scale = {'K': 1024, 'M': 1048576, 'G': 1073741824}.get(text[-1:], 1)
+
+    try:
+
+        return int(float(text.rstrip('KMG')) * scale)
+
+    except ValueError:
+
+        import argparse
+
+        raise argparse.ArgumentTypeError("invalid rate: '{}'".format(text))
+
+
+class PooledResponse:
+
+    """
+    Response object handed out by the ConnectionPool.
+    Once the body has been read to the end, the connection is handed back to the pool.
+    """
+
+    def __init__(self, pool, key, conn, resp):
+
+        self._pool = pool  # Pool that owns the connection
+        self._key = key  # Key of the host the connection is for
+        self._conn = conn  # Connection the response came in on
+        self._resp = resp  # Underlying http.client response
+        self.status = resp.status  # HTTP status code
+        self.headers = resp.headers  # Response headers
+
+    def getheader(self, name, default=None):
+
+        """
+        Gets a header from the response
+        :param name: Name of the header
+        :param default: Value to return if the header is not present
+        :return: Header value
+        """
+
+        return self._resp.getheader(name, default)
+
+    def read(self, amt=None):
+
+        """
+        Reads data from the response body
+        :param amt: Number of bytes to read, None for everything
+        :return: Bytes read
+        """
+
+        data = self._resp.read(amt)
+
+        self._done()
+
+        return data
+
+    def readinto(self, buf):
+
+        """
+        Reads data from the response body into a buffer
+        :param buf: Buffer to read into
+        :return: Number of bytes read
+        """
+
+        num = self._resp.readinto(buf)
+
+        self._done()
+
+        return num
+
+    def _done(self):
+
+        """
+        Hands the connection back to the pool if the body has been fully read
+        :return:
+        """
+
+        if self._conn is not None and self._resp.isclosed():
+
+            # Body is exhausted, connection can be reused
+
+            self._pool.release(self._key, self._conn, reuse=not self._resp.will_close)
+
+            self._conn = None
+
+    def close(self):
+
+        """
+        Closes the response.
+        If the body was not fully read, the connection can not be reused and is closed as well.
+        :return:
+        """
+
+        if self._conn is not None:
+
+            # Body was not exhausted, connection is in an unknown state
+
+            self._resp.close()
+            self._pool.release(self._key, self._conn, reuse=False)
+
+            self._conn = None
+
+    def __enter__(self):
+
+        return self
+
+    def __exit__(self, *exc):
+
+        self.close()
+
+
+class ConnectionPool:
+
+    """
+    Pool of persistent HTTP connections.
+    Connections are kept alive per host, and are reused until they sit idle for too long.
+    """
+
+    def __init__(self, size=4, idle_timeout=30, connect_timeout=None, read_timeout=None):
+
+        self.size = size  # Maximum number of idle connections to keep per host
+        self.idle_timeout = idle_timeout  # Seconds a connection may sit idle before we discard it
+        self.connect_timeout = connect_timeout  # Seconds to wait for a new connection, None to wait forever
+        self.read_timeout = read_timeout  # Seconds to wait for data once connected, None to wait forever
+        self.opened = 0  # Number of connections opened by this pool
+        self._idle = {}  # Idle connections, keyed by (scheme, host, port)
+        self._lock = threading.Lock()  # Lock protecting the idle connections
+
+    def _connect(self, key):
+
+        """
+        Opens a new connection to a host
+        :param key: (scheme, host, port) to connect to
+        :return: http.client connection
+        """
+
+        scheme, host, port = key
+
+        if scheme == 'https':
+
+            conn = http.client.HTTPSConnection(host, port, timeout=self.connect_timeout)
+
+        else:
+
+            conn = http.client.HTTPConnection(host, port, timeout=self.connect_timeout)
+
+        with self._lock:
+
+            self.opened += 1
+
+        return conn
+
+    def _open(self, conn, key):
+
+        """
+        Connects a new connection under the connect timeout, and switches it over to the read timeout.
+        The time spent on DNS, TCP and TLS shows up in its own span.
+        :param conn: Connection to open
+        :param key: (scheme, host, port) being connected to
+        :return:
+        """
+
+        if tracer.exporters:
+
+            with tracer.span('connect', host=key[1], scheme=key[0]):
+
+                conn.connect()
+
+        else:
+
+            conn.connect()
+
+        conn.sock.settimeout(self.read_timeout)
+
+    def acquire(self, key):
+
+        """
+        Gets a connection for a host, reusing an idle one if possible
+        :param key: (scheme, host, port) to connect to
+        :return: (connection, reused)
+        """
+
+        now = time.monotonic()
+
+        with self._lock:
+
+            idle = self._idle.get(key, [])
+
+            while idle:
+
+                conn, stamp = idle.pop()
+
+                if now - stamp < self.idle_timeout:
+
+                    # Connection is still fresh, use it
+
+                    return conn, True
+
+                # Connection has been idle for too long, discard it
+
+                conn.close()
+
+        return self._connect(key), False
+
+    def release(self, key, conn, reuse=True):
+
+        """
+        Hands a connection back to the pool
+        :param key: (scheme, host, port) the connection is for
+        :param conn: Connection to release
+        :param reuse: Whether the connection may be used again
+        :return:
+        """
+
+        with self._lock:
+
+            idle = self._idle.setdefault(key, [])
+
+            if reuse and len(idle) < self.size:
+
+                # Keep the connection around for next time
+
+                idle.append((conn, time.monotonic()))
+
+                return
+
+        conn.close()
+
+    def request(self, url, headers, method='GET', redirects=5):
+
+        """
+        Sends a request over a pooled connection.
+        Redirects are followed, and HTTP errors are raised as urllib HTTPErrors,
+        so callers can handle this exactly like urlopen().
+        :param url: URL to request
+        :param headers: Headers to send
+        :param method: HTTP method to use
+        :param redirects: Maximum number of redirects to follow
+        :return: PooledResponse object
+        """
+
+        for _ in range(redirects + 1):
+
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+            conn, reused = self.acquire(key)
+
+            try:
+
+                if not reused:
+
+                    self._open(conn, key)
+
+                conn.request(method, path, headers=headers)
+
+                resp = conn.getresponse()
+
+            except (http.client.HTTPException, OSError) as e:
+
+                conn.close()
+
+                if not reused:
+
+                    raise URLError(e)
+
+                # Server most likely closed our idle connection, try again on a fresh one
+
+                tracer.add(retries=1)
+
+                conn = self._connect(key)
+
+                try:
+
+                    self._open(conn, key)
+
+                    conn.request(method, path, headers=headers)
+
+                    resp = conn.getresponse()
+
+                except (http.client.HTTPException, OSError) as e:
+
+                    conn.close()
+
+                    raise URLError(e)
+
+            data = PooledResponse(self, key, conn, resp)
+
+            if resp.status in (301, 302, 303, 307, 308) and resp.getheader('location'):
+
+                # Redirected, drain the body and follow it
+
+                data.read()
+
+                url = urljoin(url, resp.getheader('location'))
+
+                continue
+
+            if resp.status >= 400:
+
+                # Server could not fulfill the request
+
+                data.read()
+
+                raise HTTPError(url, resp.status, resp.reason, resp.headers, None)
+
+            return data
+
+        raise URLError("Too many redirects")
+
+    def close(self):
+
+        """
+        Closes all idle connections
+        :return:
+        """
+
+        with self._lock:
+
+            for idle in self._idle.values():
+
+                for conn, stamp in idle:
+
+                    conn.close()
+
+            self._idle.clear()
+
+
+class DownloadState:
+
+    """
+    State of a partial download.
+    Kept as a JSON manifest next to the file being downloaded, so an interrupted download can be resumed.
+    """
+
+    def __init__(self, path, url, length, etag=None, modified=None):
+
+        self.path = path  # Path to the file being downloaded
+        self.url = url  # URL the file is downloaded from
+        self.length = length  # Expected length of the file
+        self.etag = etag  # ETag of the remote file
+        self.modified = modified  # Last-Modified date of the remote file
+        self.done = []  # Completed byte ranges, as sorted [start, end) pairs
+        self.save_every = 4194304  # Number of bytes to mark before we save the manifest again
+        self._unsaved = 0  # Number of bytes marked since the manifest was last saved
+        self._lock = threading.Lock()  # Lock protecting the completed ranges
+
+    @classmethod
+    def load(cls, path):
+
+        """
+        Loads the download state for a file, if any
+        :param path: Path to the file being downloaded
+        :return: DownloadState object, None if no usable state was found
+        """
+
+        try:
+
+            with open(path + '.json', 'r') as file:
+
+                data = json.load(file)
+
+            if os.path.getsize(path) != data['length']:
+
+                # File does not match the manifest, can't trust it
+
+                return None
+
+            state = cls(path, data['url'], data['length'], etag=data.get('etag'), modified=data.get('modified'))
+            state.done = [list(rng) for rng in data['done']]
+
+        except Exception:
+
+            # No manifest, or it's unreadable
+
+            return None
+
+        return state
+
+    @property
+    def validator(self):
+
+        """
+        Gets the validator to send with If-Range requests
+        :return: ETag or Last-Modified date, None if we have neither
+        """
+
+        return self.etag or self.modified
+
+    def mark(self, start, num):
+
+        """
+        Marks a byte range as written to disk
+        :param start: First byte of the range
+        :param num: Number of bytes written
+        :return:
+        """
+
+        end = start + num
+
+        with self._lock:
+
+            # Merging the range with any ranges it touches:
+
+            done = []
+
+            for rng in self.done:
+
+                if rng[1] < start or rng[0] > end:
+
+                    # Does not touch the new range
+
+                    done.append(rng)
+
+                else:
+
+                    start, end = min(start, rng[0]), max(end, rng[1])
+
+            done.append([start, end])
+            done.sort()
+
+            self.done = done
+            self._unsaved += num
+
+            save = self._unsaved >= self.save_every
+
+        if save:
+
+            self.save()
+
+    def missing(self):
+
+        """
+        Gets the byte ranges we still need
+        :return: List of (start, end) byte ranges
+        """
+
+        with self._lock:
+
+            missing = []
+            last = 0
+
+            for start, end in self.done:
+
+                if start > last:
+
+                    missing.append((last, start))
+
+                last = end
+
+            if last < self.length:
+
+                missing.append((last, self.length))
+
+        return missing
+
+    def save(self):
+
+        """
+        Writes the manifest to disk
+        :return:
+        """
+
+        with self._lock:
+
+            data = {'url': self.url, 'length': self.length, 'etag': self.etag, 'modified': self.modified,
+                    'done': self.done}
+
+            self._unsaved = 0
+
+            # Writing to a temporary file first, so a crash never leaves a half written manifest:
+
+            with open(self.path + '.json.tmp', 'w') as file:
+
+                json.dump(data, file)
+
+            os.replace(self.path + '.json.tmp', self.path + '.json')
+
+    def remove(self):
+
+        """
+        Removes the manifest from disk
+        :return:
+        """
+
+        try:
+
+            os.remove(self.path + '.json')
+
+        except FileNotFoundError:
+
+            pass
+
+
+class FileLock:
+
+    """
+    Exclusive lock shared by threads and processes, held while a shared index is read, changed, and written back.
+    Uses flock() on a lock file where we have it, elsewhere(Windows) it only keeps out the threads of this process.
+    """
+
+    def __init__(self, path):
+
+        self.path = path  # Path to the lock file
+        self._lock = threading.Lock()  # Lock keeping out the other threads of this process
+        self._file = None  # Open lock file while we hold the lock
+
+    def __enter__(self):
+
+        self._lock.acquire()
+
+        try:
+
+            import fcntl
+
+        except ImportError:
+
+            # No flock() here
+
+            return self
+
+        try:
+
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+            self._file = open(self.path, 'a')
+
+            fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+
+        except BaseException:
+
+            if self._file is not None:
+
+                self._file.close()
+
+                self._file = None
+
+            self._lock.release()
+
+            raise
+
+        return self
+
+    def __exit__(self, *exc):
+
+        if self._file is not None:
+
+            # Closing the file releases the flock()
+
+            self._file.close()
+
+            self._file = None
+
+        self._lock.release()
+
+
+class JarCache:
+
+    """
+    Content-addressed cache of downloaded server jars, shared by every server on the host.
+    Jars are stored under their SHA-256 hash, and indexed by version and build,
+    so a build we have downloaded once can be installed again without touching the network.
+    """
+
+    def __init__(self, path=None, max_size=536870912, max_age=2592000):
+
+        self.path = (path if path is not None else self.default_path())  # Root directory of the cache
+        self.jars = os.path.join(self.path, 'jars')  # Directory the jars are stored in
+        self.max_size = max_size  # Maximum size of all cached jars in bytes
+        self.max_age = max_age  # Seconds an unused jar is kept around for
+        self._lock = FileLock(os.path.join(self.jars, 'index.lock'))  # Lock protecting the index, across processes
+
+    @staticmethod
+    def default_path():
+
+        """
+        Gets the default location of the cache, in the users cache directory
+        :return: Path to the cache directory
+        """
+
+        base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+
+        return os.path.join(base, 'server_update')
+
+    def _load(self):
+
+        """
+        Loads the cache index
+        :return: Dictionary mapping 'version/build' to jar info
+        """
+
+        try:
+
+            with open(os.path.join(self.jars, 'index.json'), 'r') as file:
+
+                return json.load(file)
+
+        except Exception:
+
+            # No index yet, or it's unreadable
+
+            return {}
+
+    def _save(self, index):
+
+        """
+        Writes the cache index to disk
+        :param index: Index to write
+        :return:
+        """
+
+        temp = os.path.join(self.jars, 'index.json.{}.tmp'.format(os.getpid()))
+
+        with open(temp, 'w') as file:
+
+            json.dump(index, file)
+
+        os.replace(temp, os.path.join(self.jars, 'index.json'))
+
+    def jar_path(self, digest):
+
+        """
+        Gets the path of a cached jar
+        :param digest: SHA-256 hash of the jar
+        :return: Path to the jar
+        """
+
+        return os.path.join(self.jars, digest + '.jar')
+
+    def lookup(self, version, build):
+
+        """
+        Looks up a build in the cache
+        :param version: Version of the build
+        :param build: Build number
+        :return: Index entry of the build, None if not cached
+        """
+
+        key = '{}/{}'.format(version, build)
+
+        # The index is always replaced in one go, reading it needs no lock:
+
+        entry = self._load().get(key)
+
+        if entry is None:
+
+            return None
+
+        jar = self.jar_path(entry['hash'])
+
+        if not os.path.isfile(jar) or os.path.getsize(jar) != entry['size']:
+
+            # Jar is missing or damaged, forget about it
+
+            return None
+
+        # Marking the jar as used, so eviction keeps it around.
+        # Touching the jar instead of the index, so a lookup never has to rewrite the index:
+
+        try:
+
+            os.utime(jar)
+
+        except OSError:
+
+            pass
+
+        return entry
+
+    def _last_used(self, entry):
+
+        """
+        Gets the last time a cached jar was used
+        :param entry: Index entry of the jar
+        :return: Time the jar was added or last looked up
+        """
+
+        try:
+
+            return max(entry['used'], os.path.getmtime(self.jar_path(entry['hash'])))
+
+        except OSError:
+
+            return entry['used']
+
+    def identify(self, digest):
+
+        """
+        Finds out which build a jar is, from its hash
+        :param digest: SHA-256 hash of the jar
+        :return: (version, build) of the jar, None if we never cached it
+        """
+
+        for key, entry in self._load().items():
+
+            if entry['hash'] == digest:
+
+                version, build = key.rsplit('/', 1)
+
+                return version, build
+
+        return None
+
+    def link(self, version, build, dest):
+
+        """
+        Installs a cached build to a path, without copying it if we can help it
+        :param version: Version of the build
+        :param build: Build number
+        :param dest: Path to install the jar to
+        :return: True if the build was cached and installed, False if not
+        """
+
+        entry = self.lookup(version, build)
+
+        if entry is None:
+
+            return False
+
+        if os.path.lexists(dest):
+
+            # Removing the old file, never write through a link into the cache
+
+            os.remove(dest)
+
+        try:
+
+            os.link(self.jar_path(entry['hash']), dest)
+
+        except OSError:
+
+            # Hardlinks not supported here(Different filesystem?), copy it instead
+
+            fast_copy(self.jar_path(entry['hash']), dest)
+
+        return True
+
+    def add(self, path, version, build, digest=None):
+
+        """
+        Adds a downloaded jar to the cache
+        :param path: Path to the jar
+        :param version: Version of the build
+        :param build: Build number
+        :param digest: SHA-256 of the jar, computed here if not provided
+        :return: SHA-256 hash of the jar
+        """
+
+        if digest is None:
+
+            # Hashing the file so we can store it:
+
+            digest = hashlib.sha256()
+
+            with open(path, 'rb') as file:
+
+                for block in iter(lambda: file.read(1048576), b''):
+
+                    digest.update(block)
+
+            digest = digest.hexdigest()
+
+        os.makedirs(self.jars, exist_ok=True)
+
+        with self._lock:
+
+            jar = self.jar_path(digest)
+
+            if not os.path.isfile(jar):
+
+                try:
+
+                    os.link(path, jar)
+
+                except OSError:
+
+                    # Hardlinks not supported here, copy it instead
+
+                    fast_copy(path, jar + '.tmp')
+                    os.replace(jar + '.tmp', jar)
+
+            index = self._load()
+            index['{}/{}'.format(version, build)] = {'hash': digest, 'size': os.path.getsize(jar), 'used': time.time()}
+
+            self._save(index)
+
+        self.evict()
+
+        return digest
+
+    def evict(self):
+
+        """
+        Removes jars that are too old, and the least recently used jars if the cache is too large
+        :return:
+        """
+
+        now = time.time()
+
+        with self._lock:
+
+            index = self._load()
+
+            # Sorting entries by last use, oldest first:
+
+            used = {key: self._last_used(entry) for key, entry in index.items()}
+            entries = sorted(index.items(), key=lambda item: used[item[0]])
+            keep = {key: entry for key, entry in entries if now - used[key] <= self.max_age}
+
+            total = sum({entry['hash']: entry['size'] for entry in keep.values()}.values())
+
+            for key, entry in entries:
+
+                if total <= self.max_size:
+
+                    break
+
+                if key in keep:
+
+                    # Too large, dropping the least recently used jar
+
+                    del keep[key]
+
+                    if entry['hash'] not in [other['hash'] for other in keep.values()]:
+
+                        total -= entry['size']
+
+            if len(keep) == len(index):
+
+                # Nothing to evict
+
+                return
+
+            self._save(keep)
+
+            # Removing jars that are no longer referenced:
+
+            kept = set(entry['hash'] for entry in keep.values())
+
+            for digest in set(entry['hash'] for entry in index.values()) - kept:
+
+                try:
+
+                    os.remove(self.jar_path(digest))
+
+                except OSError:
+
+                    pass
+
+
+class BackupStore:
+
+    """
+    Retains the last few server jars that were replaced, so a bad build can be rolled back without a download.
+    Jars are stored under their SHA-256 hash, hardlinked to the live jar or the jar cache where possible,
+    so a backup usually costs no disk space at all.
+    The index lists the backups newest first, with their version, build and hash.
+    """
+
+    def __init__(self, path, keep=3, cache=None):
+
+        self.path = path  # Directory the backups are stored in
+        self.keep = keep  # Number of backups to retain
+        self.cache = cache  # JarCache to deduplicate backups against, if any
+        self._lock = threading.Lock()  # Lock protecting the index
+
+    def _load(self):
+
+        """
+        Loads the backup index
+        :return: List of backup entries, newest first
+        """
+
+        try:
+
+            with open(os.path.join(self.path, 'index.json'), 'r') as file:
+
+                return json.load(file)
+
+        except Exception:
+
+            # No backups yet, or the index is unreadable
+
+            return []
+
+    def _save(self, index):
+
+        """
+        Writes the backup index to disk
+        :param index: Index to write
+        :return:
+        """
+
+        temp = os.path.join(self.path, 'index.json.{}.tmp'.format(os.getpid()))
+
+        with open(temp, 'w') as file:
+
+            json.dump(index, file, indent=4)
+
+        os.replace(temp, os.path.join(self.path, 'index.json'))
+
+    def jar_path(self, digest):
+
+        """
+        Gets the path of a backed up jar
+        :param digest: SHA-256 hash of the jar
+        :return: Path to the jar
+        """
+
+        return os.path.join(self.path, digest + '.jar')
+
+    def digest(self, path, version=None, build=None):
+
+        """
+        Gets the SHA-256 hash of a jar.
+        If the jar is the cached copy of its build, we take the hash from the jar cache instead of reading the jar.
+        :param path: Path to the jar
+        :param version: Version of the jar, if known
+        :param build: Build of the jar, if known
+        :return: SHA-256 hash of the jar
+        """
+
+        if self.cache is not None and version is not None:
+
+            entry = self.cache.lookup(version, build)
+
+            try:
+
+                if entry is not None and os.path.samefile(self.cache.jar_path(entry['hash']), path):
+
+                    return entry['hash']
+
+            except OSError:
+
+                pass
+
+        digest = hashlib.sha256()
+
+        with open(path, 'rb') as file:
+
+            for block in iter(lambda: file.read(1048576), b''):
+
+                digest.update(block)
+
+        return digest.hexdigest()
+
+    def add(self, path, version, build, digest=None):
+
+        """
+        Backs up a jar, and drops the oldest backups over our limit
+        :param path: Path to the jar
+        :param version: Version of the jar
+        :param build: Build of the jar
+        :param digest: SHA-256 hash of the jar, computed here if not provided
+        :return: Backup entry
+        """
+
+        if digest is None:
+
+            digest = self.digest(path, version, build)
+
+        os.makedirs(self.path, exist_ok=True)
+
+        with self._lock:
+
+            jar = self.jar_path(digest)
+
+            if not os.path.isfile(jar):
+
+                # Linking the jar cache copy if there is one, so we share it, otherwise the jar itself:
+
+                sources = [path]
+
+                if self.cache is not None and os.path.isfile(self.cache.jar_path(digest)):
+
+                    sources.insert(0, self.cache.jar_path(digest))
+
+                for source in sources:
+
+                    try:
+
+                        os.link(source, jar)
+
+                        break
+
+                    except OSError:
+
+                        continue
+
+                else:
+
+                    # Hardlinks not supported here, copy it instead
+
+                    fast_copy(path, jar + '.tmp')
+                    os.replace(jar + '.tmp', jar)
+
+            entry = {'version': str(version), 'build': str(build), 'hash': digest, 'size': os.path.getsize(jar),
+                     'time': time.time()}
+
+            index = [entry] + [other for other in self._load() if other['hash'] != digest]
+
+            self._save(index[:self.keep])
+
+            # Removing jars that are no longer retained:
+
+            for digest in set(other['hash'] for other in index[self.keep:]):
+
+                try:
+
+                    os.remove(self.jar_path(digest))
+
+                except OSError:
+
+                    pass
+
+        return entry
+
+    def list(self):
+
+        """
+        Lists the retained backups
+        :return: List of backup entries, newest first
+        """
+
+        with self._lock:
+
+            return [entry for entry in self._load() if os.path.isfile(self.jar_path(entry['hash']))]
+
+    def find(self, build=None, exclude=None):
+
+        """
+        Finds a backup to roll back to
+        :param build: Build to find, None for the newest backup
+        :param exclude: Hash of a jar to skip(The live jar)
+        :return: Backup entry, None if there is no such backup
+        """
+
+        for entry in self.list():
+
+            if entry['hash'] != exclude and (build is None or entry['build'] == str(build)):
+
+                return entry
+
+        return None
+
+
+class MetadataCache:
+
+    """
+    On-disk cache of Paper API responses.
+    Responses are reused until they are older than the TTL,
+    after which they are revalidated with a conditional request.
+    """
+
+    def __init__(self, path=None, ttl=60):
+
+        self.path = os.path.join((path if path is not None else JarCache.default_path()), 'meta')  # Cache directory
+        self.ttl = ttl  # Seconds a cached response is used without revalidating it
+
+    def _file(self, url):
+
+        """
+        Gets the path of the cache file for a URL
+        :param url: URL of the response
+        :return: Path to the cache file
+        """
+
+        return os.path.join(self.path, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    def get(self, url):
+
+        """
+        Gets a cached response
+        :param url: URL of the response
+        :return: Cache entry, None if we have nothing cached
+        """
+
+        try:
+
+            with open(self._file(url), 'r') as file:
+
+                entry = json.load(file)
+
+        except Exception:
+
+            # Nothing cached, or it's unreadable
+
+            return None
+
+        return (entry if entry['url'] == url else None)
+
+    def fresh(self, entry):
+
+        """
+        Determines if a cache entry can be used without revalidating it
+        :param entry: Cache entry
+        :return: True if fresh, False if stale
+        """
+
+        return time.time() - entry['fetched'] < self.ttl
+
+    def put(self, url, body, etag=None, modified=None):
+
+        """
+        Stores a response in the cache
+        :param url: URL of the response
+        :param body: Response body
+        :param etag: ETag of the response
+        :param modified: Last-Modified date of the response
+        :return: Cache entry
+        """
+
+        entry = {'url': url, 'fetched': time.time(), 'etag': etag, 'modified': modified,
+                 'body': body.decode('utf-8')}
+
+        os.makedirs(self.path, exist_ok=True)
+
+        # Writing to a temporary file first, so readers never see a half written entry:
+
+        temp = self._file(url) + '.{}.tmp'.format(os.getpid())
+
+        with open(temp, 'w') as file:
+
+            json.dump(entry, file)
+
+        os.replace(temp, self._file(url))
+
+        return entry
+
+
+class BuildCatalog:
+
+    """
+    Sorted index of every version and build the Paper API has told us about.
+    Versions are kept ordered by their numeric parts, and builds as integers,
+    so queries like 'newest build of X', 'newest build >= N', or 'newest 1.16.x version' are answered
+    with a binary search, no matter what order the API listed them in.
+    The catalog is persisted next to the metadata cache, so it can be queried without fetching anything.
+    Each API backend and base gets a catalog file of its own, as they may not list the same builds.
+    """
+
+    def __init__(self, path=None):
+
+        self.path = path  # Path to the catalog file, None to keep it in memory only
+        self._keys = []  # Sort keys of the versions, oldest first
+        self._versions = []  # Versions, in the same order as their keys
+        self._builds = {}  # Build numbers of each version, oldest first
+        self._lock = threading.Lock()  # Lock protecting the catalog file
+
+        self._load()
+
+    @staticmethod
+    def version_key(version):
+
+        """
+        Gets the sort key of a version.
+        Pre-releases('1.17-pre1', '1.17-rc1') sort before the release they lead up to.
+        :param version: Version to get the key of
+        :return: Sort key
+        """
+
+        main, _, pre = str(version).partition('-')
+        nums = tuple(int(''.join(char for char in part if char.isdigit()) or 0) for part in main.split('.'))
+
+        if not pre:
+
+            return nums, 1, '', 0
+
+        return (nums, 0, ''.join(char for char in pre if not char.isdigit()),
+                int(''.join(char for char in pre if char.isdigit()) or 0))
+
+    @staticmethod
+    def build_key(build):
+
+        """
+        Gets the sort key of a build
+        :param build: Build number, as a string or an integer
+        :return: Build number as an integer, -1 if it isn't a number
+        """
+
+        try:
+
+            return int(build)
+
+        except (TypeError, ValueError):
+
+            return -1
+
+    def _load(self):
+
+        """
+        Loads the catalog file, if we have one
+        :return:
+        """
+
+        if self.path is None:
+
+            return
+
+        try:
+
+            with open(self.path, 'r') as file:
+
+                data = json.load(file)
+
+        except Exception:
+
+            # No catalog yet, or it's unreadable
+
+            return
+
+        self.set_versions(data['versions'], save=False)
+
+        for version, builds in data['builds'].items():
+
+            self.set_builds(version, builds, save=False)
+
+    def _save(self):
+
+        """
+        Writes the catalog to disk, if we have somewhere to write it
+        :return:
+        """
+
+        if self.path is None:
+
+            return
+
+        try:
+
+            with self._lock:
+
+                data = {'versions': self._versions, 'builds': dict(self._builds)}
+
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+                # Writing to a temporary file first, so readers never see a half written catalog:
+
+                temp = self.path + '.{}.tmp'.format(os.getpid())
+
+                with open(temp, 'w') as file:
+
+                    json.dump(data, file, separators=(',', ':'))
+
+                os.replace(temp, self.path)
+
+        except OSError as e:
+
+            # Not fatal, we just won't have it next time
+
+            output("# Unable to save build catalog: {}".format(e))
+
+    def set_versions(self, versions, save=True):
+
+        """
+        Replaces the known versions
+        :param versions: Versions, in any order
+        :param save: Whether to write the catalog to disk
+        :return: Versions, newest first
+        """
+
+        ordered = sorted((self.version_key(version), str(version)) for version in versions)
+
+        with self._lock:
+
+            self._keys, self._versions = [key for key, version in ordered], [version for key, version in ordered]
+
+        if save:
+
+            self._save()
+
+        return self._versions[::-1]
+
+    def set_builds(self, version, builds, save=True):
+
+        """
+        Replaces the known builds of a version
+        :param version: Version the builds belong to
+        :param builds: Build numbers, in any order
+        :param save: Whether to write the catalog to disk
+        :return: Build numbers as strings, newest first
+        """
+
+        with self._lock:
+
+            self._builds[str(version)] = sorted(build for build in map(self.build_key, builds) if build >= 0)
+
+        if save:
+
+            self._save()
+
+        return self.builds(version)
+
+    def versions(self):
+
+        """
+        Gets the known versions
+        :return: Versions, newest first
+        """
+
+        return self._versions[::-1]
+
+    def builds(self, version):
+
+        """
+        Gets the known builds of a version
+        :param version: Version to get builds for
+        :return: Build numbers as strings newest first, None if we know nothing about this version
+        """
+
+        builds = self._builds.get(str(version))
+
+        return ([str(build) for build in reversed(builds)] if builds is not None else None)
+
+    def has_version(self, version):
+
+        """
+        Determines if a version exists
+        :param version: Version to look for
+        :return: True if it exists, False if not
+        """
+
+        key = self.version_key(version)
+        index = bisect.bisect_left(self._keys, key)
+
+        while index < len(self._keys) and self._keys[index] == key:
+
+            # Different spellings can share a key, checking all of them
+
+            if self._versions[index] == str(version):
+
+                return True
+
+            index += 1
+
+        return False
+
+    def has_build(self, version, build):
+
+        """
+        Determines if a build of a version exists
+        :param version: Version of the build
+        :param build: Build number
+        :return: True if it exists, False if not
+        """
+
+        builds = self._builds.get(str(version), [])
+        build = self.build_key(build)
+        index = bisect.bisect_left(builds, build)
+
+        return build >= 0 and index < len(builds) and builds[index] == build
+
+    def latest_version(self, prefix=None):
+
+        """
+        Gets the newest version, optionally only out of a version line
+        :param prefix: Version line to pick from('1.16' for any 1.16.x version), None for any version
+        :return: Newest version, None if there is none
+        """
+
+        low, high = 0, len(self._versions)
+
+        if prefix is not None:
+
+            # Every version of the line sorts between the line itself, and the next line:
+
+            nums = self.version_key(prefix)[0]
+
+            low = bisect.bisect_left(self._keys, (nums,))
+            high = bisect.bisect_left(self._keys, (nums[:-1] + (nums[-1] + 1,),))
+
+        return (self._versions[high - 1] if high > low else None)
+
+    def latest_build(self, version, minimum=None):
+
+        """
+        Gets the newest build of a version
+        :param version: Version to get the newest build of
+        :param minimum: Oldest acceptable build, None for any build
+        :return: Newest build as a string, None if there is none(Or it's older than the minimum)
+        """
+
+        builds = self._builds.get(str(version))
+
+        if not builds or (minimum is not None and builds[-1] < self.build_key(minimum)):
+
+            return None
+
+        return str(builds[-1])
+
+    def resolve_version(self, spec):
+
+        """
+        Resolves a version spec to a version.
+        A spec is 'latest', a version line ending in '.x'('1.16.x' for the newest 1.16 version), or an exact version.
+        :param spec: Version spec
+        :return: Version, None if nothing matches
+        """
+
+        spec = str(spec)
+
+        if spec == 'latest':
+
+            return self.latest_version()
+
+        if spec.endswith('.x'):
+
+            return self.latest_version(prefix=spec[:-2])
+
+        return (spec if self.has_version(spec) else None)
+
+    def resolve_build(self, version, spec):
+
+        """
+        Resolves a build spec to a build of a version.
+        A spec is 'latest', a minimum build('>=150' for the newest build, if it's at least 150), or an exact build.
+        :param version: Version to pick a build of
+        :param spec: Build spec
+        :return: Build as a string, None if nothing matches
+        """
+
+        spec = str(spec)
+
+        if spec == 'latest':
+
+            return self.latest_build(version)
+
+        if spec.startswith('>='):
+
+            return self.latest_build(version, minimum=spec[2:])
+
+        return (str(self.build_key(spec)) if self.has_build(version, spec) else None)
+
+
+class StreamHasher:
+
+    """
+    Computes the hash of a file while it is being downloaded.
+    Data that arrives in order is hashed straight from the download buffers.
+    Data that arrives ahead of that(Other segments, or a resumed download) is read back
+    from the file once everything before it has been hashed.
+    """
+
+    def __init__(self, path, present=(), algorithm='sha256'):
+
+        self.path = path  # Path to the file being hashed
+        self.pos = 0  # Number of bytes hashed so far
+        self._hash = hashlib.new(algorithm)  # Hash object
+        self._pending = sorted([list(rng) for rng in present])  # Byte ranges on disk that are not hashed yet
+        self._file = None  # File used to read back pending ranges
+        self._lock = threading.Lock()  # Lock protecting the hash
+
+    def update(self, offset, data):
+
+        """
+        Adds data written to the file
+        :param offset: Offset the data was written to
+        :param data: Data that was written
+        :return:
+        """
+
+        with self._lock:
+
+            if offset == self.pos:
+
+                # Next bytes in order, hash them directly
+
+                self._hash.update(data)
+
+                self.pos += len(data)
+
+                self._catch_up()
+
+                return
+
+            # Ahead of what we have hashed, remember it for later:
+
+            for rng in self._pending:
+
+                if rng[1] == offset:
+
+                    rng[1] = offset + len(data)
+
+                    return
+
+            self._pending.append([offset, offset + len(data)])
+            self._pending.sort()
+
+    def _catch_up(self):
+
+        """
+        Hashes pending ranges that are now next in order, reading them back from the file
+        :return:
+        """
+
+        while self._pending and self._pending[0][0] <= self.pos:
+
+            start, end = self._pending.pop(0)
+
+            if self._file is None:
+
+                self._file = open(self.path, 'rb')
+
+            self._file.seek(self.pos)
+
+            while self.pos < end:
+
+                block = self._file.read(min(1048576, end - self.pos))
+
+                if not block:
+
+                    raise ValueError("File is shorter than the data written to it")
+
+                self._hash.update(block)
+
+                self.pos += len(block)
+
+    def finish(self):
+
+        """
+        Hashes anything still pending, and gets the final hash
+        :return: Hex digest of the file
+        """
+
+        with self._lock:
+
+            self._catch_up()
+
+            if self._file is not None:
+
+                self._file.close()
+
+                self._file = None
+
+            if self._pending:
+
+                # There is a gap we never received data for
+
+                raise ValueError("Download has a gap at byte {}".format(self.pos))
+
+            return self._hash.hexdigest()
+
+
+ZipEntry = namedtuple('ZipEntry', ['name', 'crc', 'csize', 'size', 'method', 'offset', 'time', 'date', 'flags',
+                                   'needed'], defaults=(0, 20))
+
+
+class ZipIndex:
+
+    """
+    Index of the entries in a zip archive(Server jars are zip archives).
+    Only the central directory is parsed, through mmap, so nothing is decompressed or read in full.
+    Remote archives can be indexed from just their tail, see from_tail().
+    Raises a ValueError if the archive structure is damaged.
+    """
+
+    def __init__(self, path=None):
+
+        self.path = path  # Path to the archive, None if it's not on disk
+        self.entries = []  # ZipEntry for each file, in central directory order
+        self.cd_offset = 0  # Offset of the central directory
+        self.cd_size = 0  # Size of the central directory
+        self.size = 0  # Size of the archive
+
+        if path is None:
+
+            return
+
+        with open(path, 'rb') as file:
+
+            if os.fstat(file.fileno()).st_size == 0:
+
+                raise ValueError("Archive is empty")
+
+            import mmap
+
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+
+                self._parse(view)
+
+    @classmethod
+    def from_tail(cls, tail, size):
+
+        """
+        Indexes an archive we only have the end of, like the last bytes of a remote jar
+        :param tail: Last bytes of the archive, must include the whole central directory
+        :param size: Size of the whole archive
+        :return: ZipIndex of the archive
+        """
+
+        index = cls()
+
+        index._parse(tail, start=size - len(tail))
+
+        return index
+
+    @staticmethod
+    def locate(view, start=0):
+
+        """
+        Finds the central directory of an archive
+        :param view: mmap of the archive, or at least its last 65557 bytes
+        :param start: Offset in the archive the view starts at
+        :return: (Number of entries, size of the central directory, offset of the central directory,
+        offset of the end of central directory record in the view)
+        """
+
+        # Finding the end of central directory record, it's followed by a comment of at most 65535 bytes:
+
+        eocd = view.rfind(b'PK\x05\x06', max(0, len(view) - 65557))
+
+        if eocd < 0:
+
+            raise ValueError("End of central directory not found")
+
+        count, cd_size, cd_offset = struct.unpack_from('<HII', view, eocd + 10)
+
+        if count == 0xFFFF or cd_size == 0xFFFFFFFF or cd_offset == 0xFFFFFFFF:
+
+            # Zip64 archive, real values are in the zip64 end of central directory record
+
+            locator = eocd - 20
+
+            if locator < 0 or view[locator:locator + 4] != b'PK\x06\x07':
+
+                raise ValueError("Zip64 end of central directory locator not found")
+
+            record = struct.unpack_from('<Q', view, locator + 8)[0] - start
+
+            if record < 0 or view[record:record + 4] != b'PK\x06\x06':
+
+                raise ValueError("Zip64 end of central directory not found")
+
+            count, cd_size, cd_offset = struct.unpack_from('<QQQ', view, record + 32)
+
+        return count, cd_size, cd_offset, eocd
+
+    def _parse(self, view, start=0):
+
+        """
+        Parses the central directory of the archive
+        :param view: mmap of the archive, or the bytes at the end of it
+        :param start: Offset in the archive the view starts at
+        :return:
+        """
+
+        self.size = start + len(view)
+
+        count, self.cd_size, self.cd_offset, eocd = self.locate(view, start)
+
+        if self.cd_offset + self.cd_size > start + eocd:
+
+            raise ValueError("Central directory is out of bounds")
+
+        if self.cd_offset < start:
+
+            raise ValueError("Central directory starts before the data we have")
+
+        # Walking the central directory, positions in the view are relative to its start:
+
+        pos = self.cd_offset - start
+        end = pos + self.cd_size
+
+        for _ in range(count):
+
+            if pos + 46 > end or view[pos:pos + 4] != b'PK\x01\x02':
+
+                raise ValueError("Damaged central directory entry at offset {}".format(pos))
+
+            (needed, flags, method, mtime, mdate, crc, csize, size, nlen,
+             xlen, clen, offset) = struct.unpack_from('<6xHHHHHIIIHHH8xI', view, pos)
+
+            name = bytes(view[pos + 46:pos + 46 + nlen]).decode('utf-8', 'replace')
+
+            if 0xFFFFFFFF in (csize, size, offset):
+
+                # Zip64 entry, real values are in the extra field
+
+                csize, size, offset = self._zip64_extra(view[pos + 46 + nlen:pos + 46 + nlen + xlen],
+                                                        csize, size, offset)
+
+            # Checking the local header, unless it's before the start of the view:
+
+            if offset >= self.cd_offset or (offset >= start and
+                                            view[offset - start:offset - start + 4] != b'PK\x03\x04'):
+
+                raise ValueError("Damaged local header for [{}]".format(name))
+
+            self.entries.append(ZipEntry(name, crc, csize, size, method, offset, mtime, mdate, flags, needed))
+
+            pos += 46 + nlen + xlen + clen
+
+        if pos > end:
+
+            raise ValueError("Central directory is larger than advertised")
+
+    def data_offsets(self, view):
+
+        """
+        Finds where the compressed data of each entry starts, by reading the local headers
+        :param view: mmap of the archive
+        :return: Dictionary mapping entry names to (ZipEntry, offset of its data)
+        """
+
+        offsets = {}
+
+        for entry in self.entries:
+
+            nlen, xlen = struct.unpack_from('<HH', view, entry.offset + 26)
+
+            offsets[entry.name] = (entry, entry.offset + 30 + nlen + xlen)
+
+        return offsets
+
+    @staticmethod
+    def _zip64_extra(extra, csize, size, offset):
+
+        """
+        Pulls the real sizes and offset of an entry out of its zip64 extra field
+        :param extra: Extra field of the entry
+        :param csize: Compressed size from the central directory
+        :param size: Uncompressed size from the central directory
+        :param offset: Local header offset from the central directory
+        :return: (csize, size, offset)
+        """
+
+        pos = 0
+
+        while pos + 4 <= len(extra):
+
+            tag, length = struct.unpack_from('<HH', extra, pos)
+
+            if tag == 0x0001:
+
+                # Values are only present for fields that overflowed, in this order
+
+                values = iter(struct.unpack_from('<{}Q'.format(length // 8), extra, pos + 4))
+
+                size = (next(values) if size == 0xFFFFFFFF else size)
+                csize = (next(values) if csize == 0xFFFFFFFF else csize)
+                offset = (next(values) if offset == 0xFFFFFFFF else offset)
+
+                return csize, size, offset
+
+            pos += 4 + length
+
+        raise ValueError("Zip64 extra field not found")
+
+
+class JarDelta:
+
+    """
+    Binary delta between two builds of a jar, made at the level of zip entries.
+    Consecutive builds share most of their entries byte for byte, so a delta is a list of
+    COPY operations(Take these bytes from the old jar) and LITERAL operations(Use these new bytes).
+    Unchanged entries are copied in their compressed form, nothing is decompressed or recompressed.
+    A delta names the hashes of both jars, so it is only ever applied to the jar it was made from.
+    """
+
+    MAGIC = b'SUDELTA1'  # Identifies a delta file
+    HEADER = struct.Struct('<8s32s32sQ')  # Magic, SHA-256 of the old jar, SHA-256 of the new jar, size of the new jar
+    COPY = struct.Struct('<cQQ')  # b'C', offset in the old jar, number of bytes
+    LITERAL = struct.Struct('<cQ')  # b'L', number of bytes, followed by the bytes themselves
+
+    @classmethod
+    def build(cls, old, new, path, old_digest, new_digest):
+
+        """
+        Builds a delta that turns one jar into another
+        :param old: Path to the old jar
+        :param new: Path to the new jar
+        :param path: Path to write the delta to
+        :param old_digest: SHA-256 of the old jar
+        :param new_digest: SHA-256 of the new jar
+        :return: (Bytes copied from the old jar, literal bytes in the delta)
+        """
+
+        import mmap
+
+        old_index, new_index = ZipIndex(old), ZipIndex(new)
+        temp = path + '.{}.tmp'.format(os.getpid())
+        stats = [0, 0]
+
+        with open(old, 'rb') as old_file, open(new, 'rb') as new_file, \
+                mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) as old_view, \
+                mmap.mmap(new_file.fileno(), 0, access=mmap.ACCESS_READ) as new_view, open(temp, 'wb') as out:
+
+            out.write(cls.HEADER.pack(cls.MAGIC, bytes.fromhex(old_digest), bytes.fromhex(new_digest), len(new_view)))
+
+            previous = old_index.data_offsets(old_view)
+            copy = None  # Pending copy as [offset, length], merged with the copies that follow it
+            pos = 0  # Everything in the new jar before this is covered by an operation
+
+            def flush(start, end):
+
+                # Writing the pending copy, then the literal bytes from pos to here
+
+                if copy is not None:
+
+                    out.write(cls.COPY.pack(b'C', *copy))
+
+                if end > start:
+
+                    out.write(cls.LITERAL.pack(b'L', end - start))
+                    out.write(new_view[start:end])
+
+                    stats[1] += end - start
+
+            for entry, start in sorted(new_index.data_offsets(new_view).values(), key=lambda item: item[1]):
+
+                match = previous.get(entry.name)
+
+                if match is None or match[0][1:5] != entry[1:5] or entry.csize < cls.COPY.size or \
+                        old_view[match[1]:match[1] + entry.csize] != new_view[start:start + entry.csize]:
+
+                    # New or changed entry, its bytes go into the delta
+
+                    continue
+
+                if copy is not None and pos == start and copy[0] + copy[1] == match[1]:
+
+                    # Directly follows the last copy in both jars
+
+                    copy[1] += entry.csize
+
+                else:
+
+                    flush(pos, start)
+
+                    copy = [match[1], entry.csize]
+
+                stats[0] += entry.csize
+                pos = start + entry.csize
+
+            flush(pos, len(new_view))
+
+        os.replace(temp, path)
+
+        return tuple(stats)
+
+    @classmethod
+    def apply(cls, old, stream, path, hasher=None, old_digest=None, new_digest=None, callback=None):
+
+        """
+        Rebuilds a jar from the old jar and a delta
+        :param old: Path to the old jar
+        :param stream: File like object to read the delta from, such as a response
+        :param path: Path to write the new jar to
+        :param hasher: StreamHasher to feed the new jar to
+        :param old_digest: SHA-256 the old jar must have, None to not check
+        :param new_digest: SHA-256 the new jar must have, None to not check
+        :param callback: Called with the number of delta bytes read, for progress reporting
+        :return: SHA-256 of the new jar, according to the delta
+        """
+
+        import mmap
+
+        def read(num):
+
+            # Reading exactly num bytes from the delta
+
+            data = bytearray()
+
+            while len(data) < num:
+
+                chunk = stream.read(num - len(data))
+
+                if not chunk:
+
+                    raise ValueError("Delta is truncated")
+
+                data += chunk
+
+                if callback is not None:
+
+                    callback(len(chunk))
+
+            return bytes(data)
+
+        magic, old_hash, new_hash, size = cls.HEADER.unpack(read(cls.HEADER.size))
+
+        if magic != cls.MAGIC:
+
+            raise ValueError("Not a delta")
+
+        if old_digest is not None and old_hash.hex() != old_digest.lower():
+
+            raise ValueError("Delta was made for another jar")
+
+        if new_digest is not None and new_hash.hex() != new_digest.lower():
+
+            raise ValueError("Delta does not lead to the expected build")
+
+        pos = 0
+
+        with open(old, 'rb') as old_file, mmap.mmap(old_file.fileno(), 0, access=mmap.ACCESS_READ) as view, \
+                open(path, 'wb') as out:
+
+            while pos < size:
+
+                kind = read(1)
+
+                if kind == b'C':
+
+                    offset, length = struct.unpack('<QQ', read(16))
+
+                    if offset + length > len(view):
+
+                        raise ValueError("Delta copies past the end of the old jar")
+
+                    blocks = (view[start:min(start + 1048576, offset + length)]
+                              for start in range(offset, offset + length, 1048576))
+
+                elif kind == b'L':
+
+                    length = struct.unpack('<Q', read(8))[0]
+
+                    blocks = (read(min(1048576, length - done)) for done in range(0, length, 1048576))
+
+                else:
+
+                    raise ValueError("Damaged delta operation at offset {}".format(pos))
+
+                if pos + length > size:
+
+                    raise ValueError("Delta writes past the end of the new jar")
+
+                for block in blocks:
+
+                    out.write(block)
+
+                    if hasher is not None:
+
+                        hasher.update(pos, block)
+
+                    pos += len(block)
+
+        return new_hash.hex()
+
+
+class IncrementalJar:
+
+    """
+    Plans how to rebuild a remote jar from a local jar of another build, fetching only the entries that changed.
+    The remote central directory tells us the name, CRC, sizes and offset of every entry.
+    Entries that match one in the local jar are copied from it in their compressed form(Nothing is recompressed),
+    and everything else is fetched with range requests, merged into as few requests as possible.
+    Local headers of copied entries are rebuilt from the central directory when they carry no extra data,
+    so an unchanged entry usually costs no transfer at all.
+    The result is only as good as its final hash check, which the caller must do.
+    """
+
+    LOCAL = struct.Struct('<4sHHHHHIIIHH')  # Local file header, without the name and extra data
+
+    def __init__(self, local, remote, gap=4096):
+
+        self.local = local  # Path to the local jar
+        self.remote = remote  # ZipIndex of the remote jar, see ZipIndex.from_tail()
+        self.gap = gap  # Copies shorter than this are fetched instead, if that saves a request
+        self.pieces = []  # How to build the remote jar, in order, see plan()
+
+    def plan(self):
+
+        """
+        Works out which parts of the remote jar to copy, rebuild, or fetch.
+        The plan is a list of pieces: ('copy', local offset, length, remote offset),
+        ('fetch', remote start, remote end), and ('bytes', data).
+        :return: (Bytes copied from the local jar, bytes to fetch, number of requests)
+        """
+
+        import mmap
+
+        with open(self.local, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+
+            local = ZipIndex(self.local).data_offsets(view)
+
+        entries = sorted(self.remote.entries, key=lambda item: item.offset)
+        bounds = [entry.offset for entry in entries[1:]] + [self.remote.cd_offset]
+
+        self.pieces = []
+
+        if entries and entries[0].offset > 0:
+
+            # Something before the first entry, like a launcher script
+
+            self._add('fetch', 0, entries[0].offset)
+
+        for entry, end in zip(entries, bounds):
+
+            name = entry.name.encode('utf-8')
+            header = end - entry.offset - entry.csize  # Length of the local header, if there's no data descriptor
+            match = local.get(entry.name)
+
+            if match is None or match[0][1:5] != entry[1:5] or entry.flags & 0x08 or header < 30 + len(name) or \
+                    '\ufffd' in entry.name:
+
+                # New or changed entry(Or one we can't take apart), fetching all of it
+
+                self._add('fetch', entry.offset, end)
+
+                continue
+
+            if header == 30 + len(name):
+
+                # No extra data, the local header is fully described by the central directory
+
+                self._add('bytes', self.LOCAL.pack(b'PK\x03\x04', entry.needed, entry.flags, entry.method, entry.time,
+                                                   entry.date, entry.crc, entry.csize, entry.size, len(name), 0) + name)
+
+            else:
+
+                self._add('fetch', entry.offset, entry.offset + header)
+
+            self._add('copy', match[1], entry.csize, end - entry.csize)
+
+        # The central directory and what follows it:
+
+        self._add('fetch', self.remote.cd_offset, self.remote.size)
+
+        self._merge()
+
+        copied = sum(piece[2] for piece in self.pieces if piece[0] == 'copy')
+        fetches = [piece for piece in self.pieces if piece[0] == 'fetch']
+
+        return copied, sum(piece[2] - piece[1] for piece in fetches), len(fetches)
+
+    def _add(self, kind, *args):
+
+        """
+        Adds a piece to the plan, extending the last one if they are contiguous
+        :param kind: 'copy', 'fetch', or 'bytes'
+        :param args: Arguments of the piece
+        :return:
+        """
+
+        last = (self.pieces[-1] if self.pieces else None)
+
+        if last is not None and last[0] == kind == 'fetch' and last[2] == args[0]:
+
+            self.pieces[-1] = ('fetch', last[1], args[1])
+
+        elif last is not None and last[0] == kind == 'copy' and last[1] + last[2] == args[0] and \
+                last[3] + last[2] == args[2]:
+
+            self.pieces[-1] = ('copy', last[1], last[2] + args[1], last[3])
+
+        elif last is not None and last[0] == kind == 'bytes':
+
+            self.pieces[-1] = ('bytes', last[1] + args[0])
+
+        else:
+
+            self.pieces.append((kind,) + args)
+
+    def _merge(self):
+
+        """
+        Fetches short copies that sit between two fetches, so the three become one request
+        :return:
+        """
+
+        pieces, self.pieces = self.pieces, []
+
+        for index, piece in enumerate(pieces):
+
+            if piece[0] == 'copy' and piece[2] < self.gap and 0 < index < len(pieces) - 1 and \
+                    self.pieces[-1][0] == 'fetch' and self.pieces[-1][2] == piece[3] and \
+                    pieces[index + 1][0] == 'fetch' and pieces[index + 1][1] == piece[3] + piece[2]:
+
+                piece = ('fetch', piece[3], piece[3] + piece[2])
+
+            self._add(*piece)
+
+
+class Progress:
+
+    """
+    Reports the progress of a download.
+    Terminal output is rate limited, and shows throughput and an ETA.
+    When stdout is not a terminal, periodic log lines are written instead of a redrawn bar.
+    A callback can be given to collect progress without any terminal output.
+    """
+
+    def __init__(self, total, prefix="", callback=None, quiet_mode=None, interval=0.1, log_interval=5, size=40,
+                 stream=None):
+
+        self.total = total  # Total number of bytes
+        self.done = 0  # Number of bytes done so far
+        self.prefix = prefix  # What to show before the progress bar
+        self.callback = callback  # Called with (done, total, rate, eta) on every report
+        self.quiet = (quiet() if quiet_mode is None else quiet_mode)  # Whether to skip terminal output
+        self.size = size  # Size of the progress bar
+        self.stream = (stream if stream is not None else sys.stdout)  # Stream to draw to
+        self.tty = hasattr(self.stream, 'isatty') and self.stream.isatty()  # Whether we are drawing to a terminal
+        self.interval = (interval if self.tty else log_interval)  # Minimum seconds between reports
+        self.start = time.monotonic()  # Time we started at
+        self._last = self.start  # Time of the last report
+
+    def update(self, num):
+
+        """
+        Adds progress, and reports it if enough time has passed since the last report
+        :param num: Number of bytes done
+        :return:
+        """
+
+        self.done += num
+
+        now = time.monotonic()
+
+        if now - self._last >= self.interval:
+
+            self._last = now
+
+            self._report(now)
+
+    def finish(self):
+
+        """
+        Reports the final progress, and ends the progress bar
+        :return:
+        """
+
+        self._report(time.monotonic(), final=True)
+
+    @staticmethod
+    def _human(num):
+
+        """
+        Formats a number of bytes for humans
+        :param num: Number of bytes
+        :return: Formatted string
+        """
+
+        for unit in ('B', 'KB', 'MB'):
+
+            if num < 1024:
+
+                return "{:.1f} {}".format(num, unit)
+
+            num /= 1024
+
+        return "{:.1f} GB".format(num)
+
+    def _report(self, now, final=False):
+
+        """
+        Reports the current progress
+        :param now: Current time
+        :param final: Whether this is the last report
+        :return:
+        """
+
+        elapsed = now - self.start
+        rate = (self.done / elapsed if elapsed > 0 else 0)
+        eta = ((self.total - self.done) / rate if rate > 0 and self.total else None)
+
+        if self.callback is not None:
+
+            self.callback(self.done, self.total, rate, eta)
+
+        if self.quiet:
+
+            return
+
+        percent = (100 * self.done // self.total if self.total else 100)
+        stats = "{}% {}/{} {}/s ETA {}".format(percent, self._human(self.done), self._human(self.total),
+                                             self._human(rate), ('{}s'.format(int(eta)) if eta is not None else '?'))
+
+        if self.tty:
+
+            # Redrawing the bar in place:
+
+            x = (self.size * self.done // self.total if self.total else self.size)
+
+            self.stream.write("\r{}[{}{}] {}\033[K{}".format(self.prefix, '#' * x, '.' * (self.size - x), stats,
+                                                           ('\n' if final else '')))
+
+        else:
+
+            # Not a terminal, writing a log line:
+
+            self.stream.write("{} {}\n".format(self.prefix, stats))
+
+        self.stream.flush()
+
+
+class PaperV1:
+
+    """
+    Paper API v1 backend, builds URLs for, and decodes the responses of, the v1 endpoints.
+    Build listings only contain build numbers, so we know nothing about a build until we download it.
+    """
+
+    name = 'v1'  # Name of the backend, as given on the command line
+    default_base = 'https://papermc.io/api/v1/paper'  # Base URL used if none is given
+    needs_info = False  # Whether download URLs need the build listing, instead of just the version and build
+
+    def __init__(self, base=None):
+
+        self.base = (base or self.default_base).rstrip('/')  # Base URL to build of off
+
+    def versions_url(self):
+
+        """
+        Builds the URL of the version listing
+        :return: URL
+        """
+
+        return self.base
+
+    def builds_url(self, version):
+
+        """
+        Builds the URL of the build listing of a version
+        :param version: Version to list builds for
+        :return: URL
+        """
+
+        return self.base + '/' + str(version)
+
+    def build_url(self, version, build):
+
+        """
+        Builds the URL of a single build
+        :param version: Version of the build
+        :param build: Build number
+        :return: URL
+        """
+
+        return self.builds_url(version) + '/' + str(build)
+
+    def download_url(self, version, build, info=None):
+
+        """
+        Builds the download URL of a build
+        :param version: Version of the build
+        :param build: Build number, or 'latest'
+        :param info: Build info from parse_builds(), None if we don't have it
+        :return: URL
+        """
+
+        return self.build_url(version, build) + '/download'
+
+    def delta_url(self, version, build, base):
+
+        """
+        Builds the URL of a delta that turns a jar we have into a build.
+        Only mirrors publish deltas.
+        :param version: Version of the build
+        :param build: Build number
+        :param base: SHA-256 of the jar we have
+        :return: URL, None if this API has no deltas
+        """
+
+        return self.build_url(version, build) + '/delta/' + base
+
+    def parse_versions(self, data):
+
+        """
+        Decodes the version listing
+        :param data: Raw response body
+        :return: List of versions, newest first
+        """
+
+        return json.loads(data)['versions']
+
+    def parse_builds(self, data):
+
+        """
+        Decodes the build listing of a version.
+        Each build is described by a dictionary with the keys 'build', 'name', 'sha256', 'size', 'channel' and 'time',
+        anything the API does not tell us is None.
+        :param data: Raw response body
+        :return: List of builds, newest first
+        """
+
+        return [dict(build=str(build), name=None, sha256=None, size=None, channel=None, time=None)
+                for build in json.loads(data)['builds']['all']]
+
+
+class PaperV2(PaperV1):
+
+    """
+    Paper API v2 backend.
+    The build listing of a version describes every build, including the name and hash of its jar,
+    so one request tells us everything we need to download and verify any build of that version.
+    """
+
+    name = 'v2'
+    default_base = 'https://api.papermc.io/v2/projects/paper'
+    needs_info = True  # Download URLs contain the name of the jar
+
+    def builds_url(self, version):
+
+        return self.base + '/versions/' + str(version) + '/builds'
+
+    def download_url(self, version, build, info=None):
+
+        if info is None or not info['name']:
+
+            raise ValueError("No jar listed for this build")
+
+        return self.build_url(version, build) + '/downloads/' + info['name']
+
+    def delta_url(self, version, build, base):
+
+        # Mirrors serve the v1 API, so there is nothing to find here
+
+        return None
+
+    def parse_versions(self, data):
+
+        # Listed oldest first
+
+        return json.loads(data)['versions'][::-1]
+
+    def parse_builds(self, data):
+
+        builds = []
+
+        for build in reversed(json.loads(data)['builds']):
+
+            # Listed oldest first, and the jar is the 'application' download
+
+            jar = build.get('downloads', {}).get('application') or {}
+
+            builds.append(dict(build=str(build['build']), name=jar.get('name'), sha256=jar.get('sha256'),
+                               size=jar.get('size'), channel=build.get('channel'), time=build.get('time')))
+
+        return builds
+
+
+API_BACKENDS = {'v1': PaperV1, 'v2': PaperV2}  # Paper API backends, by name
+
+
+class Update:
+
+    """
+    Server updater, handles checking, downloading, and installing.
+    """
+
+    def __init__(self, ver, pool_size=4, pool_idle=30, segments=1, cache=None, meta=None, offline=False,
+                 progress=None, base=None, retry=None, limiter=None, limit_each=False, max_downloads=None, api='v1',
+                 delta=False):
+
+        self.ver = ver  # Version of the minecraft server we are currently using.
+        self.limiter = limiter  # RateLimiter downloads are throttled with, None to not throttle them
+        self.limit_each = limit_each  # Whether each download gets its own bucket, instead of sharing the limiter's
+        self.slots = (threading.BoundedSemaphore(max_downloads) if max_downloads
+                      else None)  # Limits the number of simultaneous downloads, None for no limit
+        self.retry = (retry if retry is not None else RetryPolicy())  # When and how to retry failed requests
+        self.segments = max(1, segments)  # Number of concurrent byte ranges to download with
+        self.min_segment = 1048576  # Smallest byte range worth fetching on its own
+        self.min_block = 65536  # Block size downloads start out with
+        self.max_block = 1048576  # Largest block size downloads grow to
+        self.cache = cache  # JarCache to check before downloading, None to always download
+        self.meta = meta  # MetadataCache for API responses, None to always fetch them
+        self.offline = offline  # Whether to answer from the caches only, never touching the network
+        self.progress = progress  # Called with (done, total, rate, eta) while downloading, see Progress
+        self.delta = delta  # Whether to rebuild jars from the installed jar(Deltas, or changed entries) when we can
+        self.api = (API_BACKENDS[api](base) if isinstance(api, str) else api)  # API backend to talk to
+        self._info = {}  # Build info of every build we have listed, by (version, build)
+        self.catalog = BuildCatalog(os.path.join(meta.path, 'catalog-{}-{}.json'.format(
+            self.api.name, hashlib.sha256(self.api.versions_url().encode()).hexdigest()[:12])) if meta is not None
+            else None)  # Sorted index of every version and build we have listed, one per backend and base
+        self._headers = {
+             'Content-Type': 'application/json;charset=UTF-8',
+             'Accept': 'application/json, text/plain, */*',
+             'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.10; rv:43.0) Gecko/20100101 Firefox/43.0',
+             'Accept-Language': 'en-US,en;q=0.5',
+             'DNT': '1',
+         }  # Request headers for contacting Paper Download API, emulating a Google client
+        self._pool = ConnectionPool(size=max(pool_size, self.segments), idle_timeout=pool_idle,
+                                    connect_timeout=self.retry.connect_timeout,
+                                    read_timeout=self.retry.read_timeout)  # Keep-alive connections to the API
+
+    def _url_report(self, point):
+
+        """
+        Reports an error during a request operation
+        :param point: Point of failure
+        :return:
+        """
+
+        print("\n+==================================================+")
+        print("> !ATTENTION! >")
+        print("An error occurred during a request operation.")
+        print("Fail Point: {}".format(point))
+        print("Your check/update operation will be canceled.")
+        print("Detailed error info below:")
+
+    @traced('download')
+    def download(self, path, version, build_num='latest', digest=None, base=None):
+
+        """
+        Gets file from Paper API, and displays a progress bar
+        Write to the file specified in chunks, as to not fill up the memory.
+        Progress is tracked in a manifest next to the file,
+        so an interrupted download picks up where it left off on the next run.
+        The file is hashed as it is written, and checked before we report success.
+        :param version: Version to download
+        :param build_num: Build to download
+        :param path: Path to file to write to
+        :param digest: Expected SHA-256 of the file, None to skip the hash comparison
+        :param base: (path, SHA-256) of a jar to rebuild the build from in delta mode, usually the installed jar
+        :return: True on success, False on Failure
+        """
+
+        output("\n[ --== Starting Download: ==-- ]")
+
+        if self.api.needs_info and str(build_num) == 'latest':
+
+            # Resolving the latest build, the API has no shortcut for it
+
+            builds = self.get_buildnums(version)
+
+            if not builds:
+
+                return False
+
+            build_num = builds[0]
+
+        # Checking the jar cache:
+
+        cached = self._from_cache(path, version, build_num)
+
+        if cached is not None:
+
+            return cached
+
+        # Building URL here, the API might need the build listing for this:
+
+        info = self._info.get((str(version), str(build_num)))
+
+        if info is None and self.api.needs_info:
+
+            self.get_buildnums(version)
+
+            info = self._info.get((str(version), str(build_num)))
+
+        url = self._download_url(version, build_num, info)
+
+        if url is None:
+
+            return False
+
+        output("URL: {}".format(url))
+
+        if digest is None and info is not None:
+
+            # The API told us what the hash should be
+
+            digest = info['sha256']
+
+        size = (info['size'] if info is not None else None)
+
+        # Checking for a partial download we can resume:
+
+        state = DownloadState.load(path)
+
+        if self.delta and base is not None and state is None:
+
+            # Nothing to resume, trying to rebuild the jar from the one we have instead of downloading all of it:
+
+            self._wait_slot()
+
+            try:
+
+                actual = self._download_delta(path, version, build_num, base, digest)
+
+                if actual is None:
+
+                    # No delta, fetching only the entries that changed instead
+
+                    actual = self._download_entries(path, url, base, digest)
+
+            finally:
+
+                if self.slots is not None:
+
+                    self.slots.release()
+
+            if actual is not None:
+
+                self._cache_add(path, version, build_num, actual)
+
+                return True
+
+        data = None
+        ranges = []
+
+        try:
+
+            if state is not None and state.url == url and state.validator is not None:
+
+                # Partial download of the same file, only fetch the missing bytes
+
+                ranges = state.missing()
+
+                if not ranges:
+
+                    # Everything is already on disk, we were interrupted right at the end
+
+                    state.remove()
+
+                    output("[ --== Download Complete! ==-- ]")
+
+                    actual = self._verify(path, StreamHasher(path, state.done), digest)
+
+                    if actual is None:
+
+                        # File is damaged
+
+                        return False
+
+                    self._cache_add(path, version, build_num, actual)
+
+                    return True
+
+                output("# Resuming partial download - [{}/{} bytes present]...".format(
+                    state.length - sum(end - start for start, end in ranges), state.length))
+
+                headers = dict(self._headers)
+                headers['Range'] = 'bytes={}-{}'.format(ranges[0][0], ranges[0][1] - 1)
+                headers['If-Range'] = state.validator
+
+                data = self.retry.call(self._pool.request, url, headers)
+
+                if data.status != 206:
+
+                    # Remote file has changed, we got the whole thing back
+
+                    output("# Remote file has changed, restarting download...")
+
+                    state = None
+
+            else:
+
+                state = None
+
+            if state is None and data is None and self.segments > 1:
+
+                # Segmented download requested, see if the server supports range requests:
+
+                head = self.retry.call(self._pool.request, url, self._headers, method='HEAD')
+                head.read()
+
+                length = int(head.getheader('content-length') or size or 0)
+
+                if (head.getheader('accept-ranges') or '').lower() == 'bytes' and length >= self.min_segment * 2:
+
+                    # Server supports ranges, and the file is large enough to split up
+
+                    state = DownloadState(path, url, length, etag=head.getheader('etag'),
+                                          modified=head.getheader('last-modified'))
+                    ranges = [(0, length)]
+
+                else:
+
+                    output("# Server does not support range requests, falling back to a single stream...")
+
+            if state is None:
+
+                # Sending request to Paper API
+
+                if data is None:
+
+                    data = self.retry.call(self._pool.request, url, self._headers)
+
+                length = int(data.getheader('content-length') or size or 0)
+
+                if not length:
+
+                    # Neither the server nor the API told us the size, so there is nothing to preallocate or resume.
+                    # Reading the one response to its end instead:
+
+                    if os.path.lexists(path):
+
+                        # Removing the old file, it might be linked into the jar cache
+
+                        os.remove(path)
+
+                    return self._download_stream(path, version, build_num, data, digest)
+
+                state = DownloadState(path, url, length, etag=data.getheader('etag'),
+                                      modified=data.getheader('last-modified'))
+                ranges = [(0, state.length)]
+
+            if not state.done:
+
+                # Fresh download, preallocating file so each range can write to its own offset:
+
+                if os.path.lexists(path):
+
+                    # Removing the old file, it might be linked into the jar cache
+
+                    os.remove(path)
+
+                with open(path, mode='wb') as file:
+
+                    file.truncate(state.length)
+
+                state.save()
+
+        except (URLError, OSError) as e:
+
+            self._url_report("File Download")
+
+            # Network or file error occurred
+
+            error_report(e, net=True)
+
+            return False
+
+        # Splitting the work up, the range we already have a response for stays as-is:
+
+        if data is None:
+
+            ranges = self._split(ranges, self.segments)
+
+        else:
+
+            ranges = ranges[:1] + self._split(ranges[1:], self.segments - 1)
+
+        # Hashing the data as it arrives, anything already on disk is read back once:
+
+        hasher = StreamHasher(path, state.done)
+
+        self._wait_slot()
+
+        try:
+
+            fetched = self._fetch_ranges(state, ranges, data, hasher)
+
+        finally:
+
+            if self.slots is not None:
+
+                self.slots.release()
+
+        if not fetched:
+
+            # Download failed
+
+            return False
+
+        actual = self._verify(path, hasher, digest)
+
+        if actual is None:
+
+            # File is damaged
+
+            return False
+
+        self._cache_add(path, version, build_num, actual)
+
+        return True
+
+    def _download_stream(self, path, version, build_num, data, digest=None):
+
+        """
+        Downloads a file of unknown length, reading the response until the server ends it.
+        Without a length the file can't be split up or resumed, so no manifest is kept,
+        and an interrupted download starts over on the next run.
+        :param path: Path to write the file to
+        :param version: Version being downloaded
+        :param build_num: Build being downloaded
+        :param data: Response to read the file from
+        :param digest: Expected SHA-256 of the file, None to skip the hash comparison
+        :return: True on success, False on failure
+        """
+
+        output("Download Size: Unknown")
+
+        hasher = StreamHasher(path)
+        bar = Progress(0, prefix='Downloading:', callback=self.progress)
+        buffer = memoryview(bytearray(self.max_block))
+
+        # Never reading more at once than the limiter allows in a burst:
+
+        largest = (min(self.max_block, self.limiter.burst) if self.limiter is not None else self.max_block)
+
+        self._wait_slot()
+
+        try:
+
+            with data, open(path, mode='wb', buffering=0) as file:
+
+                while True:
+
+                    num = data.readinto(buffer[:largest])
+
+                    if not num:
+
+                        # Server ended the body, we have all of it
+
+                        break
+
+                    block = buffer[:num]
+
+                    self._write_at(file, block, bar.done)
+
+                    hasher.update(bar.done, block)
+                    bar.update(num)
+                    tracer.add(num)
+
+                    if self.limiter is not None:
+
+                        self.limiter.consume(num)
+
+        except Exception as e:
+
+            bar.finish()
+
+            self._url_report("File Download")
+
+            # Report the error
+
+            error_report(e, net=isinstance(e, (URLError, http.client.HTTPException)))
+
+            return False
+
+        finally:
+
+            if self.slots is not None:
+
+                self.slots.release()
+
+        bar.finish()
+
+        output("[ --== Download Complete! ==-- ]")
+
+        actual = self._verify(path, hasher, digest)
+
+        if actual is None:
+
+            # File is damaged
+
+            return False
+
+        self._cache_add(path, version, build_num, actual)
+
+        return True
+
+    def _wait_slot(self):
+
+        """
+        Takes a download slot, waiting for one to free up if too many downloads are running.
+        Release it with self.slots.release() once the download is over.
+        :return:
+        """
+
+        if self.slots is not None and not self.slots.acquire(blocking=False):
+
+            # Too many downloads running, wait for one to finish
+
+            output("# Waiting for a download slot...")
+
+            self.slots.acquire()
+
+    @traced('delta', fail=None)
+    def _download_delta(self, path, version, build_num, base, digest=None):
+
+        """
+        Rebuilds a build from a jar we already have, and a delta published by the API(A mirror).
+        Any failure here is not fatal, the caller simply downloads the full jar instead.
+        :param path: Path to write the jar to
+        :param version: Version to download
+        :param build_num: Build to download
+        :param base: (path, SHA-256) of the jar to rebuild from
+        :param digest: Expected SHA-256 of the jar, None to trust the hash named by the delta
+        :return: SHA-256 of the rebuilt jar, None if the full jar should be downloaded
+        """
+
+        url = self.api.delta_url(version, build_num, base[1])
+
+        if url is None:
+
+            return None
+
+        output("# Fetching delta: {}".format(url))
+
+        try:
+
+            data = self.retry.call(self._pool.request, url, self._headers)
+
+        except Exception as e:
+
+            output("# No delta available, downloading the full jar - {}".format(e))
+
+            return None
+
+        bar = Progress(int(data.getheader('content-length') or 0), prefix='Delta:', callback=self.progress)
+        hasher = StreamHasher(path)
+
+        def received(num):
+
+            # Counting delta bytes, they are what we are saving on
+
+            tracer.add(num)
+            bar.update(num)
+
+            if self.limiter is not None:
+
+                self.limiter.consume(num)
+
+        try:
+
+            if os.path.lexists(path):
+
+                # Removing the old file, it might be linked into the jar cache
+
+                os.remove(path)
+
+            expected = JarDelta.apply(base[0], data, path, hasher, old_digest=base[1], new_digest=digest,
+                                      callback=received)
+
+        except Exception as e:
+
+            data.close()
+
+            output("# Unable to apply delta, downloading the full jar - {}".format(e))
+
+            return None
+
+        finally:
+
+            bar.finish()
+
+        output("# Rebuilt jar from delta - [{} bytes transferred]".format(bar.done))
+        output("[ --== Download Complete! ==-- ]")
+
+        return self._verify(path, hasher, expected)
+
+    @traced('entries', fail=None)
+    def _download_entries(self, path, url, base, digest=None):
+
+        """
+        Rebuilds a build from a jar we already have, fetching only the zip entries that changed, see IncrementalJar.
+        The central directory of the new jar is read with a range request for the end of it.
+        Needs a server with range support, and a hash to check the result against(Mirrors send it as the ETag).
+        Any failure here is not fatal, the caller simply downloads the full jar instead.
+        :param path: Path to write the jar to
+        :param url: Download URL of the build
+        :param base: (path, SHA-256) of the jar to rebuild from
+        :param digest: Expected SHA-256 of the jar, None to take it from the ETag
+        :return: SHA-256 of the rebuilt jar, None if the full jar should be downloaded
+        """
+
+        output("# Fetching the central directory of the new jar...")
+
+        try:
+
+            # The end of central directory record is in the last 65557 bytes, and tells us where the directory is:
+
+            data = self._request_range(url, 'bytes=-65557')
+
+            if data is None:
+
+                output("# Server does not support range requests, downloading the full jar...")
+
+                return None
+
+            tail = data.read()
+            size = int(data.getheader('content-range').rpartition('/')[2])
+            validator = data.getheader('etag') or data.getheader('last-modified')
+            offset = ZipIndex.locate(tail, size - len(tail))[2]
+
+            if offset < size - len(tail):
+
+                # Central directory is larger than what we have, fetching the rest of it
+
+                data = self._request_range(url, 'bytes={}-{}'.format(offset, size - len(tail) - 1), validator)
+
+                if data is None:
+
+                    output("# Remote jar changed, downloading the full jar...")
+
+                    return None
+
+                tail = data.read() + tail
+
+            jar = IncrementalJar(base[0], ZipIndex.from_tail(tail, size))
+            copied, fetch, requests = jar.plan()
+
+        except Exception as e:
+
+            output("# Unable to read the central directory, downloading the full jar - {}".format(e))
+
+            return None
+
+        expected = (digest or (validator or '').strip('"')).lower()
+
+        if len(expected) != 64 or any(char not in '0123456789abcdef' for char in expected):
+
+            # We can't tell if the rebuilt jar is right
+
+            output("# No hash to check a rebuilt jar against, downloading the full jar...")
+
+            return None
+
+        if fetch * 2 >= size:
+
+            output("# Most of the jar has changed, downloading the full jar...")
+
+            return None
+
+        output("# Rebuilding jar - [{} bytes copied from the installed jar, {} bytes fetched in {} requests]".format(
+            copied, fetch, requests))
+
+        import mmap
+
+        bar = Progress(fetch, prefix='Entries:', callback=self.progress)
+        hasher = StreamHasher(path)
+        pos = 0
+
+        try:
+
+            if os.path.lexists(path):
+
+                # Removing the old file, it might be linked into the jar cache
+
+                os.remove(path)
+
+            with open(base[0], 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view, \
+                    open(path, 'wb') as out:
+
+                for piece in jar.pieces:
+
+                    for block in self._piece_blocks(piece, url, validator, view, tail, size - len(tail), bar):
+
+                        out.write(block)
+                        hasher.update(pos, block)
+
+                        pos += len(block)
+
+        except Exception as e:
+
+            output("# Unable to rebuild jar, downloading the full jar - {}".format(e))
+
+            return None
+
+        finally:
+
+            bar.finish()
+
+        output("[ --== Download Complete! ==-- ]")
+
+        return self._verify(path, hasher, expected)
+
+    def _piece_blocks(self, piece, url, validator, view, tail, tail_start, bar):
+
+        """
+        Gets the data of a piece of an IncrementalJar plan
+        :param piece: Piece of the plan
+        :param url: Download URL of the remote jar
+        :param validator: ETag or date the remote jar must still have
+        :param view: mmap of the local jar
+        :param tail: Bytes we already have from the end of the remote jar
+        :param tail_start: Offset of the tail in the remote jar
+        :param bar: Progress to report fetched bytes to
+        :return: Generator of blocks of data
+        """
+
+        if piece[0] == 'bytes':
+
+            yield piece[1]
+
+            return
+
+        if piece[0] == 'copy':
+
+            # Unchanged entry, straight from the local jar
+
+            for start in range(piece[1], piece[1] + piece[2], 1048576):
+
+                yield view[start:min(start + 1048576, piece[1] + piece[2])]
+
+            return
+
+        start, end = piece[1], piece[2]
+
+        if start < tail_start:
+
+            # Fetching what we don't already have:
+
+            stop = min(end, tail_start)
+            data = self._request_range(url, 'bytes={}-{}'.format(start, stop - 1), validator)
+
+            if data is None:
+
+                raise ValueError("Remote jar changed")
+
+            while start < stop:
+
+                block = data.read(min(1048576, stop - start))
+
+                if not block:
+
+                    raise http.client.IncompleteRead(b'', stop - start)
+
+                tracer.add(len(block))
+                bar.update(len(block))
+
+                if self.limiter is not None:
+
+                    self.limiter.consume(len(block))
+
+                start += len(block)
+
+                yield block
+
+        if end > start:
+
+            # The rest is in the tail we fetched earlier
+
+            bar.update(end - start)
+
+            yield tail[start - tail_start:end - tail_start]
+
+    def _request_range(self, url, spec, validator=None):
+
+        """
+        Requests a range of a file
+        :param url: URL of the file
+        :param spec: Value of the Range header
+        :param validator: ETag or date the file must still have, None to not check
+        :return: Response, None if the server sent anything but the range
+        """
+
+        headers = dict(self._headers)
+        headers['Range'] = spec
+
+        if validator is not None:
+
+            headers['If-Range'] = validator
+
+        data = self.retry.call(self._pool.request, url, headers)
+
+        if data.status != 206:
+
+            # No range support, or the file has changed
+
+            data.close()
+
+            return None
+
+        return data
+
+    def _from_cache(self, path, version, build_num):
+
+        """
+        Installs a build from the jar cache instead of downloading it, if we can
+        :param path: Path to install the jar to
+        :param version: Version of the build
+        :param build_num: Build number
+        :return: True if installed from the cache, False if we can't continue(Offline), None to download it
+        """
+
+        if self.cache is not None and str(build_num) != 'latest':
+
+            # Checking if we already have this build:
+
+            try:
+
+                if self.cache.link(version, build_num, path):
+
+                    output("# Found build in jar cache, skipping download!")
+                    output("[ --== Download Complete! ==-- ]")
+
+                    return True
+
+            except Exception as e:
+
+                # Cache is broken, we can still download the file
+
+                output("# Unable to use jar cache: {}".format(e))
+
+        if self.offline:
+
+            # Not allowed to touch the network
+
+            print("# Build not found in jar cache - Can't download it in offline mode!")
+
+            return False
+
+        return None
+
+    def _verify(self, path, hasher, digest=None):
+
+        """
+        Checks the integrity of a finished download.
+        Compares its hash against the expected one(If we have it),
+        and makes sure the zip structure of the jar is readable.
+        If the file is damaged, it is removed so the next run starts over.
+        :param path: Path to the downloaded file
+        :param hasher: StreamHasher that saw the download
+        :param digest: Expected SHA-256 of the file, None to skip the hash comparison
+        :return: SHA-256 of the file, None if it is damaged
+        """
+
+        output("# Verifying download...")
+
+        try:
+
+            actual = hasher.finish()
+
+            if hasher.pos != os.path.getsize(path):
+
+                raise ValueError("Download is incomplete - Hashed {} bytes of {}".format(hasher.pos,
+                                                                                       os.path.getsize(path)))
+
+            if digest is not None and actual != digest.lower():
+
+                raise ValueError("Hash mismatch - Expected {}, got {}".format(digest.lower(), actual))
+
+            # Making sure the jar structure is intact:
+
+            ZipIndex(path)
+
+        except Exception as e:
+
+            print("\n+==================================================+")
+            print("> !ATTENTION! >")
+            print("The downloaded file failed the integrity check, and will not be installed.")
+            print("Fail Point: Integrity Check")
+            print("Detailed error info below:")
+
+            error_report(e)
+
+            # Removing the damaged file, so the next run downloads it again:
+
+            for name in (path, path + '.json'):
+
+                try:
+
+                    os.remove(name)
+
+                except OSError:
+
+                    pass
+
+            return None
+
+        output("# Download verified - [SHA-256: {}]".format(actual))
+
+        return actual
+
+    def _cache_add(self, path, version, build_num, digest=None):
+
+        """
+        Adds a finished download to the jar cache, if we have one
+        :param path: Path to the downloaded file
+        :param version: Version of the download
+        :param build_num: Build of the download
+        :param digest: SHA-256 of the download, if we already know it
+        :return:
+        """
+
+        if self.cache is None or str(build_num) == 'latest':
+
+            # Nothing to add to, or we don't know what build this is
+
+            return
+
+        try:
+
+            self.cache.add(path, version, build_num, digest=digest)
+
+        except Exception as e:
+
+            # Not fatal, we just won't have it cached
+
+            output("# Unable to add download to jar cache: {}".format(e))
+
+    def _split(self, ranges, count):
+
+        """
+        Splits byte ranges in half until we have the requested number of them.
+        Ranges are never split below the minimum segment size.
+        :param ranges: List of (start, end) byte ranges
+        :param count: Number of ranges we want
+        :return: New list of ranges
+        """
+
+        ranges = list(ranges)
+
+        while ranges and len(ranges) < count:
+
+            # Finding the largest range:
+
+            start, end = max(ranges, key=lambda rng: rng[1] - rng[0])
+
+            if end - start < self.min_segment * 2:
+
+                # Nothing left that is worth splitting
+
+                break
+
+            middle = start + (end - start) // 2
+
+            ranges[ranges.index((start, end)):ranges.index((start, end)) + 1] = [(start, middle), (middle, end)]
+
+        return ranges
+
+    def _fetch_range(self, state, start, end, progress, cancel, data=None, hasher=None, parent=None, limiter=None):
+
+        """
+        Downloads a single byte range, and writes it to its offset in the file.
+        Data is read into one reused buffer, and written from it without any intermediate copies.
+        The block size grows while reads complete quickly, and shrinks again when they stall.
+        Reports each block written to the progress queue.
+        :param state: DownloadState of the file
+        :param start: First byte of the range
+        :param end: End of the range(exclusive)
+        :param progress: Queue to report progress and errors to
+        :param cancel: Event that is set when the download is aborted
+        :param data: Response already opened for this range, if any
+        :param hasher: StreamHasher to feed the data to, if any
+        :param parent: Span of the download, if we are tracing
+        :param limiter: RateLimiter to throttle the range with, if any
+        :return:
+        """
+
+        if parent is not None:
+
+            # Recording this range as its own span, under the download
+
+            with tracer.span('segment', parent=parent, first=start, last=end - 1):
+
+                return self._fetch_range(state, start, end, progress, cancel, data, hasher, limiter=limiter)
+
+        try:
+
+            if data is None:
+
+                headers = dict(self._headers)
+                headers['Range'] = 'bytes={}-{}'.format(start, end - 1)
+
+                if state.validator is not None:
+
+                    headers['If-Range'] = state.validator
+
+                data = self._pool.request(state.url, headers)
+
+            skip = 0
+
+            if data.status != 206 and start > 0:
+
+                if data.status != 200 or (state.validator is not None and state.validator not in (
+                        data.getheader('etag'), data.getheader('last-modified'))):
+
+                    # Server ignored our range request, and the file changed under us
+
+                    data.close()
+
+                    raise URLError("Server did not honor range request for bytes {}-{}".format(start, end - 1))
+
+                # Server does not support ranges, but sent the same file again, skipping what we already have
+
+                skip = start
+
+            buffer = memoryview(bytearray(self.max_block))
+            blocksize = self.min_block
+
+            while skip:
+
+                num = data.readinto(buffer[:min(skip, len(buffer))])
+
+                if not num:
+
+                    raise http.client.IncompleteRead(b'', skip)
+
+                skip -= num
+
+            # Never reading more at once than the limiter allows in a burst:
+
+            largest = (min(self.max_block, limiter.burst) if limiter is not None else self.max_block)
+
+            with data, open(state.path, mode='r+b', buffering=0) as file:
+
+                offset = start
+
+                while offset < end and not cancel.is_set():
+
+                    # Reading straight into our buffer:
+
+                    stamp = time.monotonic()
+                    num = data.readinto(buffer[:min(blocksize, largest, end - offset)])
+
+                    if not num:
+
+                        # Connection closed before the range was complete
+
+                        raise http.client.IncompleteRead(b'', end - offset)
+
+                    # Adjusting block size to how fast data arrives:
+
+                    elapsed = time.monotonic() - stamp
+
+                    if elapsed < 0.05 and blocksize < largest:
+
+                        blocksize *= 2
+
+                    elif elapsed > 0.5 and blocksize > self.min_block:
+
+                        blocksize //= 2
+
+                    # Writing data to its offset in the file:
+
+                    block = buffer[:num]
+
+                    self._write_at(file, block, offset)
+
+                    state.mark(offset, num)
+
+                    if hasher is not None:
+
+                        hasher.update(offset, block)
+
+                    offset += num
+
+                    progress.put(num)
+                    tracer.add(num)
+
+                    if limiter is not None:
+
+                        limiter.consume(num)
+
+        except Exception as e:
+
+            # Hand the error to the main thread
+
+            progress.put(e)
+
+    @staticmethod
+    def _write_at(file, view, offset):
+
+        """
+        Writes a buffer to an offset in an unbuffered file.
+        Uses pwrite() where the platform has it, so no seek is needed.
+        :param file: Unbuffered file object
+        :param view: memoryview of the data to write
+        :param offset: Offset to write to
+        :return:
+        """
+
+        if hasattr(os, 'pwrite'):
+
+            while view:
+
+                num = os.pwrite(file.fileno(), view, offset)
+
+                view = view[num:]
+                offset += num
+
+            return
+
+        file.seek(offset)
+
+        while view:
+
+            view = view[file.write(view):]
+
+    def _fetch_ranges(self, state, ranges, data=None, hasher=None):
+
+        """
+        Downloads byte ranges of a file over concurrent connections.
+        On failure, the download state is saved so we can resume later.
+        :param state: DownloadState of the file
+        :param ranges: List of (start, end) byte ranges to fetch
+        :param data: Response already opened for the first range, if any
+        :param hasher: StreamHasher to feed the data to, if any
+        :return: True on success, False on failure
+        """
+
+        import queue
+        from concurrent.futures import ThreadPoolExecutor
+
+        size = sum(end - start for start, end in ranges)
+
+        output("Download Size: {}".format(state.length))
+
+        if len(ranges) > 1:
+
+            output("# Downloading in {} segments...".format(len(ranges)))
+
+        # Using progress bar to visualise download:
+
+        bar = Progress(size, prefix='Downloading:', callback=self.progress)
+        complete = False
+        attempt = 0
+
+        limiter = self.limiter
+
+        if limiter is not None and self.limit_each:
+
+            # This download gets a bucket of its own
+
+            limiter = RateLimiter(limiter.rate, limiter.burst)
+
+        while True:
+
+            progress = queue.Queue()
+            cancel = threading.Event()
+            retry = False
+
+            with ThreadPoolExecutor(max_workers=max(1, len(ranges))) as pool:
+
+                for num, (start, end) in enumerate(ranges):
+
+                    pool.submit(self._fetch_range, state, start, end, progress, cancel,
+                                data if num == 0 else None, hasher, tracer.current() if tracer.exporters else None,
+                                limiter)
+
+                try:
+
+                    while bar.done < size:
+
+                        item = progress.get()
+
+                        if isinstance(item, Exception):
+
+                            # A range failed, abort the whole download
+
+                            raise item
+
+                        bar.update(item)
+                        tracer.add(item)
+
+                    bar.finish()
+
+                    complete = True
+
+                except Exception as e:
+
+                    cancel.set()
+
+                    attempt += 1
+
+                    if attempt < self.retry.attempts and self.retry.retryable(e):
+
+                        # Worth another try, once every range has stopped
+
+                        retry = e
+
+                    else:
+
+                        bar.finish()
+
+                        self._url_report("File Download")
+
+                        # Report the error
+
+                        error_report(e, net=isinstance(e, URLError))
+
+            if not retry:
+
+                break
+
+            # Counting what the stopped ranges wrote before they noticed:
+
+            while not progress.empty():
+
+                item = progress.get_nowait()
+
+                if not isinstance(item, Exception):
+
+                    bar.update(item)
+                    tracer.add(item)
+
+            # Resuming from the last good byte of each range:
+
+            ranges = self._split(state.missing(), self.segments)
+            data = None
+
+            delay = self.retry.delay(attempt)
+
+            tracer.add(retries=1)
+
+            output("\n# Download interrupted ({}), resuming {} missing bytes in {} seconds [{}/{}]...".format(
+                retry, sum(end - start for start, end in ranges), round(delay, 2), attempt, self.retry.attempts - 1))
+
+            time.sleep(delay)
+
+        if not complete:
+
+            # Saving progress, so the next run can resume
+
+            state.save()
+
+            output("# Partial download saved at: {}".format(state.path))
+
+            return False
+
+        # Download finished, we no longer need the manifest
+
+        state.remove()
+
+        # Done downloading
+
+        output("[ --== Download Complete! ==-- ]")
+
+        return True
+
+    def _api_url(self, version=None, build_num=None):
+
+        """
+        Builds a Paper API URL
+        :param version: Version to include in the URL
+        :param build_num: Build number to include in the URL
+        :return: URL
+        """
+
+        if version is None:
+
+            return self.api.versions_url()
+
+        if build_num is None:
+
+            return self.api.builds_url(version)
+
+        return self.api.build_url(version, build_num)
+
+    def _download_url(self, version, build_num, info=None):
+
+        """
+        Builds the download URL of a build
+        :param version: Version of the build
+        :param build_num: Build number
+        :param info: Build info from the build listing, None if we don't have it
+        :return: URL, None if the API does not tell us where to find the build
+        """
+
+        try:
+
+            return self.api.download_url(version, build_num, info)
+
+        except ValueError as e:
+
+            print("# Unable to find a download for build [{}] of version [{}] - {}".format(build_num, version, e))
+
+            return None
+
+    def _parse_versions(self, data):
+
+        """
+        Decodes a version listing, and adds it to the build catalog
+        :param data: Raw response body
+        :return: List of versions, newest first
+        """
+
+        return self.catalog.set_versions(self.api.parse_versions(data))
+
+    def _parse_builds(self, version, data):
+
+        """
+        Decodes a build listing, adding it to the build catalog,
+        and remembering the info of each build for downloads later on
+        :param version: Version the builds belong to
+        :param data: Raw response body
+        :return: List of build numbers, newest first
+        """
+
+        builds = self.api.parse_builds(data)
+
+        for info in builds:
+
+            self._info[(str(version), info['build'])] = info
+
+        return self.catalog.set_builds(version, [info['build'] for info in builds])
+
+    def _cached(self, url):
+
+        """
+        Checks the metadata cache before an API request
+        :param url: URL we are about to request
+        :return: (data, entry, headers) - If headers is None, data is the final answer(None on failure).
+        Otherwise, the request should be sent with the given headers, and the result handed to _store()
+        """
+
+        entry = (self.meta.get(url) if self.meta is not None else None)
+
+        if entry is not None and (self.offline or self.meta.fresh(entry)):
+
+            # Cached data is good enough
+
+            return entry['body'].encode('utf-8'), entry, None
+
+        if self.offline:
+
+            # Not allowed to touch the network
+
+            print("# No cached API data for [{}] - Can't fetch it in offline mode!".format(url))
+
+            return None, None, None
+
+        headers = self._headers
+
+        if entry is not None:
+
+            # Revalidating our stale data, the server only sends the body if it changed
+
+            headers = dict(self._headers)
+
+            if entry['etag']:
+
+                headers['If-None-Match'] = entry['etag']
+
+            if entry['modified']:
+
+                headers['If-Modified-Since'] = entry['modified']
+
+        return None, entry, headers
+
+    def _store(self, url, entry, status, data, etag=None, modified=None):
+
+        """
+        Stores the result of an API request in the metadata cache
+        :param url: URL that was requested
+        :param entry: Cache entry returned by _cached()
+        :param status: HTTP status of the response
+        :param data: Response body
+        :param etag: ETag of the response
+        :param modified: Last-Modified date of the response
+        :return: Response body, taken from the cache if the server said it was not modified
+        """
+
+        if self.meta is None:
+
+            return data
+
+        if status == 304 and entry is not None:
+
+            # Not modified, our cached data is still good
+
+            data = entry['body'].encode('utf-8')
+
+            # A 304 may leave out the validators, keeping the ones we have so we can keep revalidating:
+
+            etag = etag or entry['etag']
+            modified = modified or entry['modified']
+
+        self.meta.put(url, data, etag=etag, modified=modified)
+
+        return data
+
+    @traced('get', fail=None)
+    def _get(self, version=None, build_num=None, report=True):
+
+        """
+        Gets RAW data from the Paper API, version info only
+        :param version: Version to include in the URL
+        :param build_num: Build number to include in the URL
+        :param report: Whether to report errors, False for speculative requests
+        :return: Raw response body, None on failure
+        """
+
+        # Building url:
+
+        final = self._api_url(version, build_num)
+
+        # Checking the metadata cache:
+
+        data, entry, headers = self._cached(final)
+
+        if headers is None:
+
+            # Answered by the cache
+
+            return data
+
+        # Getting data, reading the body so the connection goes straight back into the pool:
+
+        try:
+
+            resp, body = self.retry.call(self._fetch, final, headers)
+
+            tracer.add(len(body))
+
+            data = self._store(final, entry, resp.status, body, etag=resp.getheader('etag'),
+                               modified=resp.getheader('last-modified'))
+
+        except Exception as e:
+
+            if report:
+
+                self._url_report("API Fetch Operation")
+
+                # Exception occurred, handel it
+
+                error_report(e, net=True)
+
+            return None
+
+        return data
+
+    def _fetch(self, url, headers):
+
+        """
+        Sends a request, and reads the whole body
+        :param url: URL to request
+        :param headers: Headers to send
+        :return: (response, body)
+        """
+
+        resp = self._pool.request(url, headers)
+
+        return resp, resp.read()
+
+    def latest_hint(self, spec='latest'):
+
+        """
+        Guesses what a version spec resolves to from the build catalog, even if the catalog is stale.
+        Used to decide what to prefetch, never to decide what to install.
+        :param spec: Version spec, see BuildCatalog.resolve_version()
+        :return: Version we expect, None if we can't tell
+        """
+
+        hint = self.catalog.resolve_version(spec)
+
+        if hint is None and spec != 'latest' and not str(spec).endswith('.x'):
+
+            # Exact version we have not seen yet
+
+            return spec
+
+        return hint
+
+    def get_versions(self):
+
+        """
+        Gets available versions of the server
+        :return: List of available versions
+        """
+
+        # Getting raw data and converting it to JSON format
+
+        output("  > Fetching and decoding version info...")
+
+        data = self._get()
+
+        if data is None:
+
+            # Error occurred
+
+            return None
+
+        # Returning version info
+
+        output("  > Done fetching version information!")
+
+        return self._parse_versions(data)
+
+    def get_buildnums(self, version, report=True):
+
+        """
+        Gets available build for a particular version
+        :param version: Version to get builds for
+        :param report: Whether to report errors, False for speculative requests
+        :return: List of builds
+        """
+
+        # Getting raw data and converting it to JSON format
+
+        output("  > Fetching and decoding build info...")
+
+        data = self._get(version=version, report=report)
+
+        if data is None:
+
+            # Error occurred
+
+            return None
+
+        builds = self._parse_builds(version, data)
+
+        output("  > Done fetching build info!")
+
+        return builds
+
+
+class AsyncResponse:
+
+    """
+    Response object handed out by the AsyncConnectionPool.
+    Once the body has been read to the end, the connection is handed back to the pool.
+    """
+
+    def __init__(self, pool, key, conn, status, reason, headers, method='GET'):
+
+        self._pool = pool  # Pool that owns the connection
+        self._key = key  # Key of the host the connection is for
+        self._conn = conn  # (reader, writer) the response came in on
+        self.status = status  # HTTP status code
+        self.reason = reason  # HTTP reason phrase
+        self.headers = headers  # Response headers
+        self._chunked = 'chunked' in (headers.get('transfer-encoding') or '').lower()  # Whether the body is chunked
+        self._remaining = None  # Bytes left in the body(Or current chunk, if chunked), None if unknown
+        self._reuse = (headers.get('connection') or '').lower() != 'close'  # Whether the connection can be reused
+
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+
+            # No body
+
+            self._remaining = 0
+            self._chunked = False
+
+        elif not self._chunked:
+
+            length = headers.get('content-length')
+
+            if length is not None:
+
+                self._remaining = int(length)
+
+            else:
+
+                # Body ends when the server closes the connection
+
+                self._reuse = False
+
+        if self._remaining == 0:
+
+            self._done()
+
+    def getheader(self, name, default=None):
+
+        """
+        Gets a header from the response
+        :param name: Name of the header
+        :param default: Value to return if the header is not present
+        :return: Header value
+        """
+
+        return self.headers.get(name, default)
+
+    async def _read_some(self, amt):
+
+        """
+        Reads up to amt bytes of the body
+        :param amt: Maximum number of bytes to read
+        :return: Bytes read, empty at the end of the body
+        """
+
+        reader = self._conn[0]
+
+        if self._chunked:
+
+            if not self._remaining:
+
+                # Start of a new chunk, reading its size
+
+                if self._remaining == 0:
+
+                    # Skipping the CRLF after the previous chunk
+
+                    await reader.readline()
+
+                self._remaining = int((await reader.readline()).split(b';')[0], 16)
+
+                if self._remaining == 0:
+
+                    # Last chunk, skipping the trailers
+
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+
+                        pass
+
+                    self._done()
+
+                    return b''
+
+            data = await reader.read(min(amt, self._remaining))
+
+        elif self._remaining is None:
+
+            data = await reader.read(amt)
+
+            if not data:
+
+                self._done()
+
+            return data
+
+        else:
+
+            data = await reader.read(min(amt, self._remaining))
+
+        if not data:
+
+            raise http.client.IncompleteRead(b'', self._remaining)
+
+        self._remaining -= len(data)
+
+        if self._remaining == 0 and not self._chunked:
+
+            self._done()
+
+        return data
+
+    async def read(self, amt=None):
+
+        """
+        Reads data from the response body
+        :param amt: Number of bytes to read, None for everything
+        :return: Bytes read, fewer than amt only at the end of the body
+        """
+
+        data = bytearray()
+
+        while self._conn is not None and (amt is None or len(data) < amt):
+
+            block = await self._pool.wait(self._read_some(65536 if amt is None else amt - len(data)),
+                                          self._pool.read_timeout)
+
+            if not block:
+
+                break
+
+            data += block
+
+        return bytes(data)
+
+    def _done(self):
+
+        """
+        Hands the connection back to the pool, the body has been fully read
+        :return:
+        """
+
+        if self._conn is not None:
+
+            self._pool.release(self._key, self._conn, reuse=self._reuse)
+
+            self._conn = None
+
+    def close(self):
+
+        """
+        Closes the response.
+        If the body was not fully read, the connection can not be reused and is closed as well.
+        :return:
+        """
+
+        if self._conn is not None:
+
+            self._pool.release(self._key, self._conn, reuse=False)
+
+            self._conn = None
+
+
+class AsyncConnectionPool:
+
+    """
+    Pool of persistent HTTP connections built on asyncio streams.
+    Works like ConnectionPool, but many requests can be in flight in one event loop, without a thread each.
+    """
+
+    def __init__(self, size=4, idle_timeout=30, limit=16, connect_timeout=None, read_timeout=None):
+
+        self.size = size  # Maximum number of idle connections to keep per host
+        self.idle_timeout = idle_timeout  # Seconds a connection may sit idle before we discard it
+        self.limit = limit  # Maximum number of connections in use per host, extra requests wait for a free one
+        self.connect_timeout = connect_timeout  # Seconds to wait for a new connection, None to wait forever
+        self.read_timeout = read_timeout  # Seconds to wait for data once connected, None to wait forever
+        self.opened = 0  # Number of connections opened by this pool
+        self._idle = {}  # Idle connections, keyed by (scheme, host, port)
+        self._slots = {}  # Semaphores limiting the connections in use, keyed by (scheme, host, port)
+        self._ssl = None  # SSL context shared by all HTTPS connections
+
+    @staticmethod
+    async def wait(aw, timeout):
+
+        """
+        Awaits something, giving up after a timeout.
+        Timeouts are raised as socket.timeout, just like the blocking pool raises them.
+        :param aw: Awaitable to wait for
+        :param timeout: Seconds to wait, None to wait forever
+        :return: Result of the awaitable
+        """
+
+        import asyncio
+
+        try:
+
+            return await asyncio.wait_for(aw, timeout)
+
+        except asyncio.TimeoutError:
+
+            raise socket.timeout("timed out")
+
+    async def _connect(self, key):
+
+        """
+        Opens a new connection to a host, under the connect timeout
+        :param key: (scheme, host, port) to connect to
+        :return: (reader, writer)
+        """
+
+        import asyncio
+
+        scheme, host, port = key
+
+        if scheme == 'https':
+
+            if self._ssl is None:
+
+                self._ssl = ssl.create_default_context()
+
+            conn = await self.wait(asyncio.open_connection(host, port, ssl=self._ssl, server_hostname=host),
+                                   self.connect_timeout)
+
+        else:
+
+            conn = await self.wait(asyncio.open_connection(host, port), self.connect_timeout)
+
+        self.opened += 1
+
+        return conn
+
+    async def acquire(self, key):
+
+        """
+        Gets a connection for a host, reusing an idle one if possible
+        :param key: (scheme, host, port) to connect to
+        :return: ((reader, writer), reused)
+        """
+
+        import asyncio
+
+        # Waiting for a free slot for this host:
+
+        await self._slots.setdefault(key, asyncio.Semaphore(self.limit)).acquire()
+
+        now = time.monotonic()
+        idle = self._idle.get(key, [])
+
+        while idle:
+
+            conn, stamp = idle.pop()
+
+            if now - stamp < self.idle_timeout and not conn[0].at_eof():
+
+                # Connection is still fresh, use it
+
+                return conn, True
+
+            # Connection has been idle for too long, discard it
+
+            conn[1].close()
+
+        try:
+
+            return await self._connect(key), False
+
+        except BaseException:
+
+            self._slots[key].release()
+
+            raise
+
+    def release(self, key, conn, reuse=True):
+
+        """
+        Hands a connection back to the pool
+        :param key: (scheme, host, port) the connection is for
+        :param conn: (reader, writer) to release
+        :param reuse: Whether the connection may be used again
+        :return:
+        """
+
+        self._slots[key].release()
+
+        idle = self._idle.setdefault(key, [])
+
+        if reuse and len(idle) < self.size:
+
+            # Keep the connection around for next time
+
+            idle.append((conn, time.monotonic()))
+
+            return
+
+        conn[1].close()
+
+    async def _send(self, conn, method, host, path, headers):
+
+        """
+        Sends a request, and reads the status line and headers of the response
+        :param conn: (reader, writer) to send the request on
+        :param method: HTTP method to use
+        :param host: Value of the Host header
+        :param path: Path to request
+        :param headers: Headers to send
+        :return: (status, reason, headers)
+        """
+
+        reader, writer = conn
+
+        lines = ['{} {} HTTP/1.1'.format(method, path), 'Host: {}'.format(host)]
+        lines.extend('{}: {}'.format(name, value) for name, value in headers.items())
+
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        await writer.drain()
+
+        status = (await reader.readline()).decode('latin-1').split(None, 2)
+
+        if len(status) < 2:
+
+            raise http.client.RemoteDisconnected("Remote end closed connection without response")
+
+        message = http.client.HTTPMessage()
+
+        while True:
+
+            line = await reader.readline()
+
+            if line in (b'\r\n', b'\n', b''):
+
+                break
+
+            name, value = line.decode('latin-1').split(':', 1)
+
+            message[name.strip()] = value.strip()
+
+        return int(status[1]), (status[2].strip() if len(status) > 2 else ''), message
+
+    async def request(self, url, headers, method='GET', redirects=5):
+
+        """
+        Sends a request over a pooled connection.
+        Redirects are followed, and HTTP errors are raised as urllib HTTPErrors.
+        :param url: URL to request
+        :param headers: Headers to send
+        :param method: HTTP method to use
+        :param redirects: Maximum number of redirects to follow
+        :return: AsyncResponse object
+        """
+
+        for _ in range(redirects + 1):
+
+            parts = urlsplit(url)
+            key = (parts.scheme, parts.hostname, parts.port or (443 if parts.scheme == 'https' else 80))
+            path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+            try:
+
+                conn, reused = await self.acquire(key)
+
+            except OSError as e:
+
+                raise URLError(e)
+
+            try:
+
+                status, reason, message = await self.wait(self._send(conn, method, parts.netloc, path, headers),
+                                                          self.read_timeout)
+
+            except (http.client.HTTPException, OSError, ValueError) as e:
+
+                if not reused:
+
+                    self.release(key, conn, reuse=False)
+
+                    raise URLError(e)
+
+                # Server most likely closed our idle connection, try again on a fresh one
+
+                conn[1].close()
+
+                try:
+
+                    conn = await self._connect(key)
+
+                    status, reason, message = await self.wait(self._send(conn, method, parts.netloc, path, headers),
+                                                              self.read_timeout)
+
+                except (http.client.HTTPException, OSError, ValueError) as e:
+
+                    self.release(key, conn, reuse=False)
+
+                    raise URLError(e)
+
+            data = AsyncResponse(self, key, conn, status, reason, message, method=method)
+
+            if status in (301, 302, 303, 307, 308) and message.get('location'):
+
+                # Redirected, drain the body and follow it
+
+                await data.read()
+
+                url = urljoin(url, message.get('location'))
+
+                continue
+
+            if status >= 400:
+
+                # Server could not fulfill the request
+
+                await data.read()
+
+                raise HTTPError(url, status, reason, message, None)
+
+            return data
+
+        raise URLError("Too many redirects")
+
+    def close(self):
+
+        """
+        Closes all idle connections
+        :return:
+        """
+
+        for idle in self._idle.values():
+
+            for conn, stamp in idle:
+
+                conn[1].close()
+
+        self._idle.clear()
+
+
+class AsyncUpdate(Update):
+
+    """
+    asyncio counterpart of Update.
+    get_versions(), get_buildnums() and download() are coroutines with the same return values as the blocking versions,
+    so many servers and versions can be checked concurrently in one event loop.
+    Blocking code(Like ServerUpdater) can drive them with run(), which uses an event loop of our own.
+    Configuration, caches and verification are shared with Update.
+    """
+
+    def __init__(self, ver, pool_size=16, pool_idle=30, cache=None, meta=None, offline=False, progress=None,
+                 base=None, retry=None, limiter=None, api='v1'):
+
+        super().__init__(ver, pool_size=pool_size, pool_idle=pool_idle, cache=cache, meta=meta, offline=offline,
+                         progress=progress, base=base, retry=retry, limiter=limiter, api=api)
+
+        self._pool = AsyncConnectionPool(size=pool_size, idle_timeout=pool_idle, limit=pool_size,
+                                         connect_timeout=self.retry.connect_timeout,
+                                         read_timeout=self.retry.read_timeout)  # Keep-alive connections to the API
+        self._loop = None  # Event loop run() drives our coroutines on, started when first needed
+        self._loop_lock = threading.Lock()  # Lock protecting the creation of the event loop
+
+    def run(self, coro):
+
+        """
+        Runs one of our coroutines from blocking code, and waits for its result.
+        The event loop runs in a thread of its own, so our pooled connections always stay on the same loop,
+        and any number of threads can call us at once, their coroutines running concurrently.
+        :param coro: Coroutine to run
+        :return: Result of the coroutine
+        """
+
+        import asyncio
+
+        with self._loop_lock:
+
+            if self._loop is None:
+
+                self._loop = asyncio.new_event_loop()
+
+                threading.Thread(target=self._loop.run_forever, name='AsyncUpdate', daemon=True).start()
+
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    async def download(self, path, version, build_num='latest', digest=None, base=None):
+
+        """
+        Gets file from Paper API, and displays a progress bar.
+        The file is hashed as it is written, and checked before we report success.
+        Failed reads are retried through our retry policy, resuming from the last good byte.
+        :param version: Version to download
+        :param build_num: Build to download
+        :param path: Path to file to write to
+        :param digest: Expected SHA-256 of the file, None to skip the hash comparison
+        :param base: Accepted for compatibility with Update.download(), we don't rebuild jars from deltas
+        :return: True on success, False on Failure
+        """
+
+        output("\n[ --== Starting Download: ==-- ]")
+
+        if self.api.needs_info and str(build_num) == 'latest':
+
+            # Resolving the latest build, the API has no shortcut for it
+
+            builds = await self.get_buildnums(version)
+
+            if not builds:
+
+                return False
+
+            build_num = builds[0]
+
+        # Checking the jar cache:
+
+        cached = self._from_cache(path, version, build_num)
+
+        if cached is not None:
+
+            return cached
+
+        # Building URL here, the API might need the build listing for this:
+
+        info = self._info.get((str(version), str(build_num)))
+
+        if info is None and self.api.needs_info:
+
+            await self.get_buildnums(version)
+
+            info = self._info.get((str(version), str(build_num)))
+
+        url = self._download_url(version, build_num, info)
+
+        if url is None:
+
+            return False
+
+        output("URL: {}".format(url))
+
+        if digest is None and info is not None:
+
+            # The API told us what the hash should be
+
+            digest = info['sha256']
+
+        # Sending request to Paper API, failed requests are retried through our retry policy:
+
+        try:
+
+            data = await self.retry.call_async(self._pool.request, url, self._headers)
+
+        except URLError as e:
+
+            self._url_report("File Download")
+
+            # Network error occurred
+
+            error_report(e, net=True)
+
+            return False
+
+        # Getting content length of download, 0 if neither the server nor the API told us:
+
+        length = int(data.getheader('content-length') or (info['size'] if info is not None else None) or 0)
+        validator = data.getheader('etag') or data.getheader('last-modified')
+        blocksize = 65536
+        hasher = StreamHasher(path)
+        attempt = 0
+
+        output("Download Size: {}".format(length or 'Unknown'))
+
+        import asyncio
+
+        try:
+
+            if os.path.lexists(path):
+
+                # Removing the old file, it might be linked into the jar cache
+
+                os.remove(path)
+
+            with open(path, mode='wb') as file:
+
+                # Using progress bar to visualise download:
+
+                bar = Progress(length, prefix='Downloading:', callback=self.progress)
+
+                while not length or bar.done < length:
+
+                    try:
+
+                        if data is None:
+
+                            # Resuming from the last good byte, unless the file changed in the meantime
+
+                            headers = dict(self._headers)
+                            headers['Range'] = 'bytes={}-'.format(bar.done)
+
+                            if validator is not None:
+
+                                headers['If-Range'] = validator
+
+                            data = await self._pool.request(url, headers)
+
+                            if data.status != 206:
+
+                                # We got the whole file back, starting over
+
+                                output("# Remote file has changed, restarting download...")
+
+                                file.seek(0)
+                                file.truncate()
+
+                                hasher = StreamHasher(path)
+                                bar.done = 0
+
+                        # Getting blocksize data:
+
+                        byts = await data.read(blocksize)
+
+                        if not byts and not length:
+
+                            # Length unknown, the body ends when the server says so
+
+                            data = None
+
+                            break
+
+                        if not byts:
+
+                            # Connection closed before the file was complete
+
+                            raise http.client.IncompleteRead(b'', length - bar.done)
+
+                    except Exception as e:
+
+                        if data is not None:
+
+                            data.close()
+
+                            data = None
+
+                        attempt += 1
+
+                        if attempt >= self.retry.attempts or not self.retry.retryable(e):
+
+                            # Out of attempts, or not worth retrying
+
+                            bar.finish()
+
+                            raise
+
+                        delay = self.retry.delay(attempt)
+
+                        tracer.add(retries=1)
+
+                        output("# Download failed ({}), resuming in {} seconds [{}/{}]...".format(
+                            e, round(delay, 2), attempt, self.retry.attempts - 1))
+
+                        await asyncio.sleep(delay)
+
+                        continue
+
+                    # Hashing and writing data to file:
+
+                    hasher.update(bar.done, byts)
+
+                    file.write(byts)
+
+                    bar.update(len(byts))
+
+                    if self.limiter is not None:
+
+                        # Throttling, without blocking the event loop
+
+                        await asyncio.sleep(self.limiter.reserve(len(byts)))
+
+                bar.finish()
+
+        except (URLError, http.client.HTTPException) as e:
+
+            if data is not None:
+
+                data.close()
+
+            self._url_report("File Download")
+
+            # Report the error
+
+            error_report(e, net=True)
+
+            return False
+
+        except Exception as e:
+
+            if data is not None:
+
+                data.close()
+
+            self._url_report("File Download")
+
+            # Report the error
+
+            error_report(e)
+
+            return False
+
+        # Done downloading
+
+        output("[ --== Download Complete! ==-- ]")
+
+        actual = self._verify(path, hasher, digest)
+
+        if actual is None:
+
+            # File is damaged
+
+            return False
+
+        self._cache_add(path, version, build_num, actual)
+
+        return True
+
+    async def _get(self, version=None, build_num=None, report=True):
+
+        """
+        Gets RAW data from the Paper API, version info only
+        :param version: Version to include in the URL
+        :param build_num: Build number to include in the URL
+        :param report: Whether to report errors, False for speculative requests
+        :return: Raw response body, None on failure
+        """
+
+        # Building url:
+
+        final = self._api_url(version, build_num)
+
+        # Checking the metadata cache:
+
+        data, entry, headers = self._cached(final)
+
+        if headers is None:
+
+            # Answered by the cache
+
+            return data
+
+        # Getting data, reading the body so the connection goes straight back into the pool:
+
+        try:
+
+            resp, body = await self.retry.call_async(self._fetch, final, headers)
+
+            data = self._store(final, entry, resp.status, body, etag=resp.getheader('etag'),
+                               modified=resp.getheader('last-modified'))
+
+        except Exception as e:
+
+            if report:
+
+                self._url_report("API Fetch Operation")
+
+                # Exception occurred, handel it
+
+                error_report(e, net=True)
+
+            return None
+
+        return data
+
+    async def _fetch(self, url, headers):
+
+        """
+        Sends a request, and reads the whole body
+        :param url: URL to request
+        :param headers: Headers to send
+        :return: (response, body)
+        """
+
+        resp = await self._pool.request(url, headers)
+
+        return resp, await resp.read()
+
+    async def get_versions(self):
+
+        """
+        Gets available versions of the server
+        :return: List of available versions
+        """
+
+        # Getting raw data and converting it to JSON format
+
+        output("  > Fetching and decoding version info...")
+
+        data = await self._get()
+
+        if data is None:
+
+            # Error occurred
+
+            return None
+
+        # Returning version info
+
+        output("  > Done fetching version information!")
+
+        return self._parse_versions(data)
+
+    async def get_buildnums(self, version, report=True):
+
+        """
+        Gets available build for a particular version
+        :param version: Version to get builds for
+        :param report: Whether to report errors, False for speculative requests
+        :return: List of builds
+        """
+
+        # Getting raw data and converting it to JSON format
+
+        output("  > Fetching and decoding build info...")
+
+        data = await self._get(version=version, report=report)
+
+        if data is None:
+
+            # Error occurred
+
+            return None
+
+        builds = self._parse_builds(version, data)
+
+        output("  > Done fetching build info!")
+
+        return builds
+
+    def close(self):
+
+        """
+        Closes all idle connections, and stops our event loop if we started one
+        :return:
+        """
+
+        if self._loop is None:
+
+            self._pool.close()
+
+            return
+
+        # The connections belong to the loop, closing them from its own thread:
+
+        self._loop.call_soon_threadsafe(self._pool.close)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+        self._loop = None
+
+
+def call_update(update, method, *args, **kwargs):
+
+    """
+    Calls a method of an updater from blocking code.
+    The methods of an AsyncUpdate are coroutines, we drive those on its event loop and wait for them,
+    so either kind of updater can be used by ServerUpdater and Fleet.
+    :param update: Update or AsyncUpdate the method belongs to
+    :param method: Method to call
+    :return: Result of the method
+    """
+
+    if isinstance(update, AsyncUpdate):
+
+        return update.run(method(*args, **kwargs))
+
+    return method(*args, **kwargs)
+
+
+class FileUtil:
+
+    """
+    Class for managing the creating/deleting/moving of server files
+    """
+
+    def __init__(self, path, config=None):
+
+        self.path = path  # Path to file being updated
+        self.temp = None  # Tempdir instance
+        self.config_default = 'version_history.json'  # Default name of paper versioning file
+        self.state_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.server_update')  # Persistent state
+        self.backups = BackupStore(os.path.join(self.state_dir, 'backups',
+                                                os.path.basename(path)))  # Jars replaced by previous installations
+        self.record = os.path.join(self.state_dir, 'installed.json')  # Hash, version and build of the jar we installed
+
+    def create_temp_dir(self):
+
+        """
+        Creates a temporary directory
+        :return: Temp file instance
+        """
+
+        self.temp = tempfile.TemporaryDirectory()
+
+        return self.temp
+
+    def close_temp_dir(self):
+
+        """
+        Closes created temporary directory
+        :return:
+        """
+
+        self.temp.close()
+
+    def staging_path(self):
+
+        """
+        Gets the path downloads are staged at, creating the state directory if necessary.
+        Staged downloads survive between runs, so interrupted downloads can be resumed.
+        :return: Path to the staged download
+        """
+
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        return os.path.join(self.state_dir, 'download_data')
+
+    @traced('load_config')
+    def load_config(self, config):
+
+        """
+        Loads configuration info from 'version.json' in the server directory
+        We only load version info if it's in the official format!
+        """
+
+        config = (config if config is not None else os.path.join(os.path.dirname(self.path), self.config_default))
+
+        output("# Checking configuration file at [{}] ...".format(config))
+
+        if os.path.isfile(config):
+
+            # Exists and is file, read it
+
+            output("# Loading configuration data ...")
+
+            try:
+
+                file = open(config, 'r')
+
+                data = json.load(file)
+
+            except Exception as e:
+
+                # Failed to load config data - not in JSON format
+
+                print("# Failed to load config data - Not in JSON format!")
+
+                return '0', 0
+
+            # Read the data, and attempt to pull some info out of it
+
+            current = data['currentVersion']
+
+            if type(current) != str:
+
+                # We only accept strings:
+
+                print("# Failed to load config data - We want strings, not {}!".format(type(current)))
+
+                return '0', 0
+
+            # Catch any exceptions due to weird format conventions:
+
+            try:
+
+                # Splitting the data in two so we can pull some content out:
+
+                build, version = current.split(" ", 1)
+
+                # Getting build information:
+
+                build = int(build.split("-")[-1])
+
+                # Getting version information:
+
+                version = version[5:-1]
+
+            except Exception as e:
+
+                # Weird file content. Unable to get info.
+
+                print("# Unable to load config data - Invalid Format, we support official builds only!")
+
+                return '0', 0
+
+            # Returning version information:
+
+            output("# Done loading configuration data! ")
+
+            return version, build
+
+        else:
+
+            print("# Unable to load config data from file at [{}] - Not found/Not a file!".format(config))
+
+            return '0', 0
+
+    def identify(self, digest, current=None):
+
+        """
+        Finds out which build a jar is, so backups are labelled correctly.
+        The version history file is only rewritten when the server starts,
+        so it is stale between an installation and the next restart.
+        We check what we last installed, then the jar cache and the backups, and only then fall back to it.
+        :param digest: SHA-256 hash of the jar
+        :param current: (version, build) from the version history file, if known
+        :return: (version, build) of the jar
+        """
+
+        try:
+
+            with open(self.record, 'r') as file:
+
+                record = json.load(file)
+
+            if record['hash'] == digest:
+
+                return record['version'], record['build']
+
+        except Exception:
+
+            # Nothing installed by us yet, or the record is unreadable
+
+            pass
+
+        found = (self.backups.cache.identify(digest) if self.backups.cache is not None else None)
+
+        if found is not None:
+
+            return found
+
+        for entry in self.backups.list():
+
+            if entry['hash'] == digest:
+
+                return entry['version'], entry['build']
+
+        return (current if current is not None else ('0', 0))
+
+    def _record_install(self, digest, version, build):
+
+        """
+        Records which build the live jar is
+        :param digest: SHA-256 hash of the live jar
+        :param version: Version of the live jar
+        :param build: Build of the live jar
+        :return:
+        """
+
+        os.makedirs(self.state_dir, exist_ok=True)
+
+        temp = self.record + '.{}.tmp'.format(os.getpid())
+
+        with open(temp, 'w') as file:
+
+            json.dump({'hash': digest, 'version': str(version), 'build': str(build)}, file)
+
+        os.replace(temp, self.record)
+
+    def _fail_install(self, point):
+
+        """
+        Shows where the error occurred during the installation
+        :param point: Point of failure
+        :return:
+        """
+
+        print("\n+==================================================+")
+        print("> !ATTENTION! <")
+        print("An error occurred during the installation, and we can not continue.")
+        print("We will attempt to recover your previous installation(If applicable)")
+        print("Fail point: {}".format(point))
+        print("Detailed error info below:")
+
+        return
+
+    def _sync(self, path, directory=False):
+
+        """
+        Flushes a file or directory to disk, so a rename involving it survives a crash.
+        Directories can't be synced on every platform, so errors there are ignored.
+        :param path: Path to sync
+        :param directory: Whether the path is a directory
+        :return:
+        """
+
+        try:
+
+            fd = os.open(path, (os.O_RDONLY if directory else os.O_RDWR))
+
+        except OSError:
+
+            if directory:
+
+                return
+
+            raise
+
+        try:
+
+            os.fsync(fd)
+
+        except OSError:
+
+            if not directory:
+
+                raise
+
+        finally:
+
+            os.close(fd)
+
+    @traced('install')
+    def install(self, download=None, current=None, target=None):
+
+        """
+        "Installs" the downloaded file into the target in the root server directory.
+        The download is staged next to the target, and swapped in with a single rename,
+        so there is never a moment where no server jar exists.
+        The replaced jar is kept in the backup store, so it can be rolled back to later.
+        :param download: Path to the downloaded file, defaults to the staged download
+        :param current: (version, build) of the jar being replaced, from the version history file, if known
+        :param target: (version, build) of the download, if known
+        :return:
+        """
+
+        if download is None:
+
+            download = (os.path.join(self.temp.name, 'download_data') if self.temp is not None
+                        else os.path.join(self.state_dir, 'download_data'))
+
+        output("\n[ --== installation: ==-- ]")
+
+        # Making sure the download is on the same filesystem as the target:
+
+        try:
+
+            os.makedirs(self.state_dir, exist_ok=True)
+
+            if os.stat(download).st_dev != os.stat(self.state_dir).st_dev:
+
+                # Can't rename across filesystems, copy it next to the target first
+
+                output("# Copying download data next to the target...")
+
+                staged = os.path.join(self.state_dir, 'download_data')
+
+                fast_copy(download, staged + '.tmp')
+                os.replace(staged + '.tmp', staged)
+
+                download = staged
+
+            # Flushing the download to disk before it goes live:
+
+            self._sync(download)
+
+        except Exception as e:
+
+            # Show install error
+
+            self._fail_install("Download Staging")
+
+            # Show error info
+
+            error_report(e)
+
+            return False
+
+        # Keeping the old file as a backup:
+
+        output("# Creating backup of previous installation...")
+
+        backup = os.path.join(self.state_dir, 'backup')
+        start = time.monotonic()
+
+        try:
+
+            if os.path.lexists(backup):
+
+                os.remove(backup)
+
+            try:
+
+                # Hardlinking the old file, this costs nothing and leaves it in place
+
+                os.link(self.path, backup)
+
+            except OSError:
+
+                # Hardlinks not supported here, copy it instead
+
+                fast_copy(self.path, backup)
+
+        except Exception as e:
+
+            # Show install error
+
+            self._fail_install("File Backup")
+
+            # Show error info
+
+            error_report(e)
+
+            return False
+
+        output("# Backup created at: {}".format(backup))
+
+        emit('backup', path=backup, seconds=round(time.monotonic() - start, 3))
+
+        # Swapping the download in:
+
+        try:
+
+            output("# Moving download data into place...")
+            output("# ({} > {})".format(download, self.path))
+
+            os.replace(download, self.path)
+
+            self._sync(os.path.dirname(os.path.abspath(self.path)), directory=True)
+
+        except Exception as e:
+
+            # Install error
+
+            self._fail_install("File Replace")
+
+            # Show error
+
+            error_report(e)
+
+            # Recover backup
+
+            self._recover_backup()
+
+            return False
+
+        output("# Done moving download data into place!")
+
+        # Retaining the backup, so we can roll back to it later:
+
+        try:
+
+            digest = self.backups.digest(backup, *(current if current is not None else ()))
+            entry = self.backups.add(backup, *self.identify(digest, current), digest=digest)
+
+            output("# Retained previous installation [{}/{}] for rollback".format(entry['version'], entry['build']))
+
+        except Exception as e:
+
+            # Not fatal, we just can't roll back to it
+
+            output("# Unable to retain previous installation: {}".format(e))
+
+        if target is not None:
+
+            # Remembering what we installed, the version history file won't say until the server restarts:
+
+            try:
+
+                self._record_install(self.backups.digest(self.path, *target), *target)
+
+            except Exception as e:
+
+                output("# Unable to record the installed build: {}".format(e))
+
+        try:
+
+            os.remove(backup)
+
+        except OSError:
+
+            # Not a big deal, it gets replaced by the next installation
+
+            pass
+
+        if self.temp is not None:
+
+            # Cleaning up temporary directory:
+
+            output("# Cleaning up temporary directory...")
+
+            self.temp.cleanup()
+
+            output("# Done cleaning temporary directory!")
+
+        output("[ --== installation complete! ==-- ]")
+
+        return True
+
+    @traced('rollback')
+    def rollback(self, build=None, current=None):
+
+        """
+        Switches the live jar back to a retained backup, with a single rename.
+        The live jar is retained in turn, so a rollback can itself be rolled back.
+        :param build: Build to roll back to, None for the most recent backup
+        :param current: (version, build) of the live jar from the version history file, if known
+        :return: Backup entry we rolled back to, None on failure
+        """
+
+        output("\n[ --== Rollback: ==-- ]")
+
+        try:
+
+            live = self.backups.digest(self.path, *(current if current is not None else ()))
+            current = self.identify(live, current)
+            entry = self.backups.find(build, exclude=live)
+
+            if entry is None:
+
+                print("# No retained backup{} to roll back to!".format(
+                    ' of build [{}]'.format(build) if build is not None else ''))
+
+                return None
+
+            output("# Rolling back to [{}/{}]...".format(entry['version'], entry['build']))
+
+            # Staging the backup next to the live jar:
+
+            staged = os.path.join(self.state_dir, 'rollback')
+
+            if os.path.lexists(staged):
+
+                os.remove(staged)
+
+            try:
+
+                os.link(self.backups.jar_path(entry['hash']), staged)
+
+            except OSError:
+
+                fast_copy(self.backups.jar_path(entry['hash']), staged)
+
+            # Retaining the live jar, then swapping the backup in:
+
+            self.backups.add(self.path, *current, digest=live)
+
+            os.replace(staged, self.path)
+
+            self._sync(os.path.dirname(os.path.abspath(self.path)), directory=True)
+
+            self._record_install(entry['hash'], entry['version'], entry['build'])
+
+        except Exception as e:
+
+            self._fail_install("Rollback")
+
+            error_report(e)
+
+            return None
+
+        output("[ --== Rollback complete! ==-- ]")
+
+        return entry
+
+    @traced('recover_backup')
     def _recover_backup(self):
 
         """
-        Recovers the backup of the old server jar file
-        :return:
+        Recovers the backup of the old server jar file
+        :return:
+        """
+
+        print("+==================================================+")
+        print("\n> !ATTENTION! <")
+        print("A failure has occurred during the installation process.")
+        print("I'm sure you can see the error information above.")
+        print("This script will attempt to recover your old installation.")
+        print("If this operation fails, check the github page for more info: "
+              "https://github.com/Owen-Cochell/PaperMC-Update")
+
+        backup = os.path.join(self.state_dir, 'backup')
+
+        # Renaming the backup over the file in the root directory:
+
+        print("# Moving backup file[{}] to server root directory[{}]...".format(backup, self.path))
+
+        try:
+
+            os.replace(backup, self.path)
+
+        except Exception as e:
+
+            print("# Critical error during recovery process!")
+            print("# Displaying error information:")
+
+            error_report(e)
+
+            print("Your previous installation could not be recovered.")
+
+            return False
+
+        print("\nRecovery process complete!")
+        print("Your file has been successfully recovered.")
+        print("Please debug the situation, and figure out why the problem occurred,")
+        print("Before re-trying the update process.")
+
+        return True
+
+
+class ServerUpdater:
+
+    """
+    Class that binds all server updater classes together
+    """
+
+    def __init__(self, path, config_file=None, version=None, build=None, config=True, prompt=True, segments=1,
+                 cache=None, meta=None, offline=False, update=None, base=None, retry=None, api='v1'):
+
+        self.version = version  # Version of minecraft server we are running
+        self.fileutil = FileUtil(path)  # Fileutility instance
+        self.buildnum = build  # Buildnum of the current server
+        self._available_versions = []  # List of available versions
+        self._builds = {}  # Available builds, memoized per version
+        self.prompt = prompt  # Whether to prompt the user for version selection
+        self.config_file = config_file  # Name of the config file we pull version info from
+        self.failed = False  # Whether an operation has failed
+
+        # Starting object
+
+        self._start(config)
+
+        self.update = (update if update is not None else
+                       Update(self.version, segments=segments, cache=cache, meta=meta,
+                              offline=offline, base=base, retry=retry, api=api))  # Updater Instance, may be shared
+
+        self.fileutil.backups.cache = self.update.cache
+
+    def _start(self, config):
+
+        """
+        Starts the object, loads configuration
+        :return:
+        """
+
+        temp_version = '0'
+        temp_build = 0
+        start = time.monotonic()
+
+        if config:
+
+            # Allowed to use configuration file
+
+            temp_version, temp_build = self.fileutil.load_config(self.config_file)
+
+        else:
+
+            # Skipping config file
+
+            output("# Skipping configuration file!")
+
+        self.version = (self.version if self.version != '0' else temp_version)
+        self.buildnum = (self.buildnum if self.buildnum != 0 else temp_build)
+
+        output("\nServer Version Information:")
+        output("  > Version: [{}]".format(self.version))
+        output("  > Build: [{}]".format(self.buildnum))
+
+        emit('config', path=self.fileutil.path, version=self.version, build=str(self.buildnum),
+             seconds=round(time.monotonic() - start, 3))
+
+        return
+
+    def check(self):
+
+        """
+        Checks if a new version is available
+        :return: True is new version, False if not/error
+        """
+
+        start = time.monotonic()
+        failed = self.failed
+
+        self.failed = False
+
+        new = self._check()
+
+        emit('check', version=self.version, build=str(self.buildnum), update_available=new, error=self.failed,
+             seconds=round(time.monotonic() - start, 3))
+
+        self.failed = self.failed or failed
+
+        return new
+
+    def _check(self):
+
+        """
+        Compares the installed version and build to the latest ones
+        :return: True is new version, False if not/error
+        """
+
+        output("\n[ --== Checking For New Version: ==-- ]")
+
+        # Forgetting what we fetched last time, then fetching everything we might need at once:
+
+        self._available_versions = []
+        self._builds = {}
+
+        self.prefetch(self.version, self.update.latest_hint())
+
+        # Checking for new server version
+
+        output("# Comparing local <> remote server versions...")
+
+        ver = self.versions()
+
+        if ver is None:
+
+            # Error occurred
+
+            self.failed = True
+
+            return False
+
+        latest = self.update.catalog.latest_version()
+
+        if BuildCatalog.version_key(latest) > BuildCatalog.version_key(self.version):
+
+            # New version available!
+
+            output("# New Version available! - [Version: {}]".format(latest))
+            output("[ --== Version check complete! ==-- ]\n")
+
+            return True
+
+        output("# No new version available.")
+
+        # Checking builds
+
+        output("# Comparing local <> remote builds...")
+
+        build = self.builds(self.version)
+
+        if build is None:
+
+            # Error occurred
+
+            self.failed = True
+
+            return False
+
+        latest = self.update.catalog.latest_build(self.version, minimum=BuildCatalog.build_key(self.buildnum) + 1)
+
+        if latest is not None:
+
+            # New build available!
+
+            output("# New build available! - [Build: {}]".format(latest))
+            output("[ --== Version check complete! ==-- ]\n")
+
+            return True
+
+        output("# No new builds found.")
+        output("[ --== Version check complete! ==-- ]\n")
+
+        return False
+
+    def versions(self):
+
+        """
+        Gets the available versions, fetching them only once
+        :return: List of versions, None on failure
+        """
+
+        if not self._available_versions:
+
+            data = call_update(self.update, self.update.get_versions)
+
+            if data is None:
+
+                # Error occurred, we will try again next time
+
+                return None
+
+            self._available_versions = data
+
+        return self._available_versions
+
+    def builds(self, version):
+
+        """
+        Gets the available builds of a version, fetching them only once
+        :param version: Version to get builds for
+        :return: List of builds, None on failure
+        """
+
+        if version not in self._builds:
+
+            data = call_update(self.update, self.update.get_buildnums, version)
+
+            if data is None:
+
+                # Error occurred, we will try again next time
+
+                return None
+
+            self._builds[version] = data
+
+        return self._builds[version]
+
+    def prefetch(self, *versions):
+
+        """
+        Fetches the version list, and the builds of the given versions, all at once.
+        The builds are speculative, we might not need them, so their errors are not reported.
+        Anything that fails is simply fetched again when it's asked for.
+        :param versions: Versions to prefetch the builds of
+        :return:
+        """
+
+        wanted = [version for version in dict.fromkeys(versions)
+                  if version not in (None, '0', 'latest') and version not in self._builds]
+
+        if self.update.offline or (self._available_versions and not wanted):
+
+            # Everything is local, or already fetched
+
+            return
+
+        # Plain threads, concurrent.futures costs more to import than the check it would speed up:
+
+        results = {}
+
+        def fetch(key, method, *args):
+
+            results[key] = call_update(self.update, method, *args)
+
+        threads = [threading.Thread(target=fetch, args=(version, self.update.get_buildnums, version, False))
+                   for version in wanted]
+
+        if not self._available_versions:
+
+            # Version list goes under None, which is never a version we prefetch
+
+            threads.append(threading.Thread(target=fetch, args=(None, self.update.get_versions)))
+
+        for thread in threads:
+
+            thread.start()
+
+        for thread in threads:
+
+            thread.join()
+
+        if results.get(None) is not None:
+
+            self._available_versions = results[None]
+
+        for version in wanted:
+
+            if results.get(version) is not None:
+
+                self._builds[version] = results[version]
+
+    def _select(self, val, default, name, version=None):
+
+        """
+        Selects a version, or a build of a version, using the build catalog.
+        Supports updater keywords, and the specs understood by BuildCatalog('1.16.x', '>=150')
+        :param val: Value entered
+        :param default: Default value
+        :param name: Name of value we are choosing
+        :param version: Version to select a build of, None to select a version
+        :return: True if valid, false if invalid
+        """
+
+        if val == '':
+
+            # User wants default value:
+
+            val = default
+
+        catalog = self.update.catalog
+        found = (catalog.resolve_version(val) if version is None else catalog.resolve_build(version, val))
+
+        if found is None:
+
+            # User selected invalid option
+
+            output("\n# Error: Invalid {} selected!".format(name))
+
+            return False, ''
+
+        if found != str(val):
+
+            # User selected a keyword or spec, like 'latest'
+
+            output("# Selecting {} {} - [{}]...".format(val, name, found))
+
+            return True, found
+
+        # Option selected is valid. Continue
+
+        output("# Selecting {}: [{}]...".format(name, val))
+
+        return True, found
+
+    def version_select(self, default_version='latest', default_build='latest'):
+
+        """
+        Prompts the user to select a version to download
+        Checks input against values from Paper API
+        Default value is recommended values
+        :param default_build: Default build number
+        :param default_version: Default version
+        :return: (version, build)
+        """
+
+        start = time.monotonic()
+
+        ver, build = self._version_select(default_version, default_build)
+
+        if ver is None or build is None:
+
+            self.failed = True
+
+        emit('select', version=ver, build=(str(build) if build is not None else None),
+             error=ver is None or build is None, seconds=round(time.monotonic() - start, 3))
+
+        return ver, build
+
+    def _version_select(self, default_version, default_build):
+
+        """
+        Selects the version and build to download
+        :param default_build: Default build number
+        :param default_version: Default version
+        :return: (version, build)
+        """
+
+        # Checking if we have version information:
+
+        output("# Checking version information...")
+
+        if not self._available_versions:
+
+            # Version information is empty, reloading along with the builds we will most likely want
+
+            output("# Loading version information...")
+
+            self.prefetch(self.update.latest_hint(default_version))
+
+            if self.versions() is None:
+
+                # Error occurred
+
+                return None, None
+
+        if self.prompt:
+
+            print("\n[ --== Version Select: ==-- ] ")
+
+            print("\nPlease enter the version you would like to download:")
+            print("Example: 14.4.4")
+            print("(Tip: The value enclosed in brackets is the default option. Leave the prompt blank to accept it.)")
+            print("(Tip: Enter 'latest' to select the latest version.)")
+            print("(Tip: Enter a version line, like '1.16.x', to select the latest version of it.)")
+
+            print("\nAvailable versions:")
+
+            # Displaying available versions
+
+            for i in self._available_versions:
+
+                print("  > Version: [{}]".format(i))
+
+            while True:
+
+                ver = input("\nEnter Version[{}]: ".format(default_version))
+
+                stat, ver = self._select(ver, default_version, "version")
+
+                if stat:
+
+                    # User selected okay value
+
+                    break
+
+        else:
+
+            # Just select default version
+
+            stat, ver = self._select('', default_version, "version")
+
+            if not stat:
+
+                # Invalid version selected
+
+                print("# Aborting installation!")
+
+                return None, None
+
+        # Getting build info
+
+        output("# Loading build information...")
+
+        nums = self.builds(ver)
+
+        if nums is None:
+
+            # Error occurred:
+
+            return None, None
+
+        if self.prompt:
+
+            print("\nPlease enter the build you would like to download:")
+            print("Example: 205")
+            print("(Tip: The value enclosed in brackets is the default option. Leave the prompt blank to accept it.)")
+            print("(Tip: Enter 'latest' to select the latest build.)")
+            print("(Tip: Enter '>=N' to select the latest build, as long as it is at least N.)")
+
+            print("\nAvailable Builds:")
+
+            # Displaying available builds
+
+            for i in nums:
+
+                print("  > Build Num: [{}]".format(i))
+
+            while True:
+
+                # Prompting user for build info
+
+                build = input("\nEnter Build[{}]: ".format(default_build))
+
+                stat, build = self._select(build, default_build, "build", version=ver)
+
+                if stat:
+
+                    # User selected okay value
+
+                    break
+
+        else:
+
+            # Select default build
+
+            stat, build = self._select('', default_build, "build", version=ver)
+
+            if not stat:
+
+                # Invalid build selected!
+
+                output("# Aborting installation!")
+
+                return None, None
+
+        output("\nYou have selected:")
+        output("   > Version: [{}]".format(ver))
+        output("   > Build: [{}]".format(build))
+
+        output("\n[ --== Version Selection Complete! ==-- ]")
+
+        return ver, build
+
+    def get_new(self, default_version='latest', default_build='latest'):
+
+        """
+        Downloads and installs the new version
+        Prompts the user to select a specific version
+        :return: True if the new version was installed, False if not
+        """
+
+        # Prompting user for version info:
+
+        ver, build = self.version_select(default_version=default_version, default_build=default_build)
+
+        if ver is None or build is None:
+
+            # Error occurred, cancel installation
+
+            return False
+
+        # Checking if user wants to continue with installation
+
+        if self.prompt:
+
+            print("\nDo you want to continue with the installation?")
+
+            inp = input("(Y/N):").lower()
+
+            if inp in ['n', 'no']:
+                # User does not want to continue, exit
+
+                output("Canceling installation...")
+
+                return False
+
+        # Starting download process, staging the file so an interrupted download can be resumed:
+
+        staged = self.fileutil.staging_path()
+        start = time.monotonic()
+
+        val = call_update(self.update, self.update.download, staged, ver, build_num=build, base=self.delta_base())
+
+        seconds = time.monotonic() - start
+        size = (os.path.getsize(staged) if val else 0)
+
+        emit('download', version=ver, build=str(build), bytes=size, seconds=round(seconds, 3),
+             bytes_per_second=(round(size / seconds) if seconds > 0 else None), error=not val)
+
+        if not val:
+
+            # Download process failed
+
+            self.failed = True
+
+            return False
+
+        # Download process complete!
+
+        # Installing downloaded data:
+
+        start = time.monotonic()
+
+        val = self.fileutil.install(staged, current=(self.version, self.buildnum), target=(ver, build))
+
+        emit('install', path=self.fileutil.path, version=ver, build=str(build), error=not val,
+             seconds=round(time.monotonic() - start, 3))
+
+        if not val:
+
+            # Install process failed
+
+            self.failed = True
+
+            return False
+
+        output("\nUpdate complete!")
+
+        # Updating values
+
+        self.version = ver
+        self.buildnum = build
+
+        return True
+
+    def delta_base(self):
+
+        """
+        Gets the jar new builds can be rebuilt from in delta mode, which is the installed jar
+        :return: (path, SHA-256) of the installed jar, None if we are not in delta mode or have no jar
         """
 
-        print("+==================================================+")
-        print("\n> !ATTENTION! <")
-        print("A failure has occurred during the installation process.")
-        print("I'm sure you can see the error information above.")
-        print("This script will attempt to recover your old installation.")
-        print("If this operation fails, check the github page for more info: "
-              "https://github.com/Owen-Cochell/PaperMC-Update")
-
-        # Deleting file in root directory:
+        if not self.update.delta or not os.path.isfile(self.fileutil.path):
 
-        print("# Deleting Corrupted temporary File...")
+            return None
 
         try:
 
-            os.remove(self.path)
+            return self.fileutil.path, self.fileutil.backups.digest(self.fileutil.path, self.version, self.buildnum)
 
-        except FileNotFoundError:
+        except OSError as e:
 
-            # File was not found. Continuing...
+            output("# Unable to hash the installed jar, downloading the full jar - {}".format(e))
 
-            print("# File not found. Continuing operation...")
+            return None
 
-        except Exception as e:
+    def rollback(self, build=None):
 
-            print("# Critical error during recovery process!")
-            print("# Displaying error information:")
+        """
+        Rolls the server back to a retained backup
+        :param build: Build to roll back to, None for the most recent backup
+        :return: True on success, False on failure
+        """
 
-            error_report(e)
+        start = time.monotonic()
 
-            print("Your previous installation could not be recovered.")
+        entry = self.fileutil.rollback(build, current=(self.version, self.buildnum))
+
+        emit('rollback', path=self.fileutil.path, version=(entry['version'] if entry else None),
+             build=(entry['build'] if entry else None), error=entry is None, seconds=round(time.monotonic() - start, 3))
+
+        if entry is None:
+
+            self.failed = True
 
             return False
 
-        # Copying file to root directory:
+        self.version = entry['version']
+        self.buildnum = entry['build']
 
-        print("# Copying backup file[{}] to server root directory[{}]...".format(os.path.join(self.temp.name, 'backup'),
-                                                                                 self.path))
+        return True
 
-        try:
 
-            shutil.copyfile(os.path.join(self.temp.name, 'backup'), self.path)
+class Fleet:
 
-        except Exception as e:
+    """
+    Updates many servers from one invocation.
+    Version and build info is fetched once, servers are grouped by the build they need,
+    each distinct jar is downloaded once, and the servers are installed concurrently.
+    """
 
-            print("# Critical error during recovery process!")
-            print("# Displaying error information:")
+    def __init__(self, servers, update, workers=4, config=True, keep_backups=3):
 
-            error_report(e)
+        self.servers = servers  # List of server entries(path, config_file, version, build)
+        self.update = update  # Updater instance shared by every server
+        self.workers = max(1, workers)  # Maximum number of concurrent downloads/installations
+        self.config = config  # Whether to load the config file of each server
+        self.keep_backups = keep_backups  # Number of replaced jars each server retains for rollback
+        self.results = []  # Per server results of the last run
+        self.updaters = {}  # ServerUpdater of each server by path, kept between runs so they know what they installed
 
-            print("Your previous installation could not be recovered.")
+    @classmethod
+    def load(cls, path, update, workers=4, config=True, version='latest', build='latest', keep_backups=3):
+
+        """
+        Loads a fleet manifest.
+        The manifest is a JSON list of servers, each an object with a 'path',
+        and optionally a 'config_file', and the 'version' and 'build' to install.
+        Versions and builds can be pinned with the specs understood by BuildCatalog('1.16.x', '>=150').
+        :param path: Path to the manifest
+        :param update: Updater instance shared by every server
+        :param workers: Maximum number of concurrent downloads/installations
+        :param config: Whether to load the config file of each server
+        :param version: Default version to install
+        :param build: Default build to install
+        :param keep_backups: Number of replaced jars each server retains for rollback
+        :return: Fleet object
+        """
+
+        with open(path, 'r') as file:
+
+            data = json.load(file)
+
+        servers = []
+
+        for entry in (data['servers'] if isinstance(data, dict) else data):
+
+            if isinstance(entry, str):
+
+                # Just a path
+
+                entry = {'path': entry}
+
+            servers.append({'path': entry['path'], 'config_file': entry.get('config_file'),
+                            'version': str(entry.get('version', version)), 'build': str(entry.get('build', build))})
+
+        return cls(servers, update, workers=workers, config=config, keep_backups=keep_backups)
+
+    def run(self, check=True, install=True):
+
+        """
+        Checks and updates every server in the fleet
+        :param check: Whether to skip servers that are already on the target build
+        :param install: Whether to install updates, False to only check for them
+        :return: List of per server results
+        """
+
+        output("\n[ --== Fleet Update: {} Servers ==-- ]".format(len(self.servers)))
+
+        self.results = []
+
+        # Loading the servers, they all share our updater instance:
+
+        servers = []
+
+        for entry in self.servers:
+
+            result = {'path': entry['path'], 'current': None, 'target': None, 'status': None, 'error': None}
+
+            serv = self.updaters.get(entry['path'])
+
+            if serv is None:
+
+                # First run, the config file tells us what is installed.
+                # It's only rewritten when the server restarts, so later runs go by what we installed instead.
+
+                serv = ServerUpdater(entry['path'], config_file=entry['config_file'], config=self.config,
+                                     prompt=False, version='0', build=0, update=self.update)
+
+                serv.fileutil.backups.keep = self.keep_backups
+
+                self.updaters[entry['path']] = serv
+
+            result['current'] = '{}/{}'.format(serv.version, serv.buildnum)
+
+            self.results.append(result)
+            servers.append((serv, entry, result))
+
+        # Fetching version info once for the whole fleet:
+
+        output("\n# Fetching version information for the fleet...")
+
+        versions = call_update(self.update, self.update.get_versions)
+
+        if versions is None:
+
+            # Error occurred, nothing we can do
+
+            for serv, entry, result in servers:
+
+                result['status'] = 'failed'
+                result['error'] = 'Unable to fetch version information'
+
+            return self.results
+
+        builds = {}
+        groups = {}
+
+        for serv, entry, result in servers:
+
+            # Resolving the target version and build:
+
+            version = self.update.catalog.resolve_version(entry['version'])
+
+            if version is None:
+
+                result['status'] = 'failed'
+                result['error'] = 'Invalid version [{}]'.format(entry['version'])
+
+                continue
+
+            if version not in builds:
+
+                builds[version] = call_update(self.update, self.update.get_buildnums, version)
+
+            if builds[version] is None:
+
+                result['status'] = 'failed'
+                result['error'] = 'Unable to fetch build information for [{}]'.format(version)
+
+                continue
+
+            build = self.update.catalog.resolve_build(version, entry['build'])
+
+            if build is None:
+
+                result['status'] = 'failed'
+                result['error'] = 'Invalid build [{}]'.format(entry['build'])
+
+                continue
+
+            result['target'] = '{}/{}'.format(version, build)
+
+            if check and serv.version == version and str(serv.buildnum) == build:
+
+                # Already on the target build
+
+                result['status'] = 'up-to-date'
+
+                continue
+
+            if not install:
+
+                result['status'] = 'update-available'
+
+                continue
+
+            groups.setdefault((version, build), []).append((serv, result))
+
+        output("# {} servers need {} distinct builds".format(sum(len(group) for group in groups.values()),
+                                                             len(groups)))
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+
+            # Downloading each distinct jar once:
+
+            downloads = {target: pool.submit(self._download, target, group) for target, group in groups.items()}
+
+            # Installing the servers as their jar becomes available:
+
+            installs = []
+
+            for target, group in groups.items():
+
+                if not downloads[target].result():
+
+                    for serv, result in group:
+
+                        result['status'] = 'failed'
+                        result['error'] = 'Download failed'
+
+                    continue
+
+                for serv, result in group:
+
+                    installs.append(pool.submit(self._install, serv, target, result))
+
+            for future in installs:
+
+                future.result()
+
+        output("\n[ --== Fleet Update Complete! ==-- ]")
+
+        for result in self.results:
+
+            emit('server', **result)
+
+            output("  > [{}] {} ({} > {}){}".format(result['status'], result['path'], result['current'],
+                                                    result['target'], (' - ' + result['error'] if result['error']
+                                                                       else '')))
+
+        return self.results
+
+    def _download(self, target, group):
+
+        """
+        Downloads a jar once, and stages it for every server that needs it
+        :param target: (version, build) to download
+        :param group: List of (ServerUpdater, result) that need this jar
+        :return: True on success, False on failure
+        """
+
+        version, build = target
+
+        first = group[0][0].fileutil.staging_path()
+
+        if not call_update(self.update, self.update.download, first, version, build_num=build,
+                           base=group[0][0].delta_base()):
 
             return False
 
-        print("\nRecovery process complete!")
-        print("Your file has been successfully recovered.")
-        print("Please debug the situation, and figure out why the problem occurred,")
-        print("Before re-trying the update process.")
+        for serv, result in group[1:]:
+
+            # Staging the same jar for the other servers, on their own filesystem:
+
+            staged = serv.fileutil.staging_path()
+
+            try:
+
+                if os.path.lexists(staged):
+
+                    os.remove(staged)
+
+                try:
+
+                    os.link(first, staged)
+
+                except OSError:
+
+                    # Different filesystem, copy it instead
+
+                    fast_copy(first, staged)
+
+            except Exception as e:
+
+                result['status'] = 'failed'
+                result['error'] = 'Unable to stage download: {}'.format(e)
 
         return True
 
+    def _install(self, serv, target, result):
 
-class ServerUpdater:
+        """
+        Installs a staged jar for one server
+        :param serv: ServerUpdater of the server
+        :param target: (version, build) being installed
+        :param result: Result entry of the server
+        :return:
+        """
+
+        if result['status'] is not None:
+
+            # Staging already failed
+
+            return
+
+        start = time.monotonic()
+
+        if serv.fileutil.install(serv.fileutil.staging_path(), current=(serv.version, serv.buildnum), target=target):
+
+            serv.version, serv.buildnum = target
+
+            result['status'] = 'updated'
+
+        else:
+
+            result['status'] = 'failed'
+            result['error'] = 'Installation failed'
+
+        result['seconds'] = round(time.monotonic() - start, 3)
+
+    def write_summary(self, path):
+
+        """
+        Writes the results of the last run to a JSON file
+        :param path: Path to write the summary to
+        :return:
+        """
+
+        with open(path, 'w') as file:
+
+            json.dump({'servers': self.results}, file, indent=4)
+
+
+class Watcher:
 
     """
-    Class that binds all server updater classes together
+    Keeps a server, or a fleet of servers, up to date from a single long running process.
+    The updater, its caches, and its connections stay warm between polls.
+    Polls happen on an interval with some random jitter, so many nodes don't poll in lockstep,
+    and back off exponentially while polls keep failing.
     """
 
-    def __init__(self, path, config_file=None, version=None, build=None, config=True, prompt=True):
+    def __init__(self, target, interval=300, jitter=0.1, max_backoff=3600, install=True,
+                 default_version='latest', default_build='latest'):
 
-        self.version = version  # Version of minecraft server we are running
-        self.fileutil = FileUtil(path)  # Fileutility instance
-        self.buildnum = build  # Buildnum of the current server
-        self._available_versions = []  # List of available versions
-        self.prompt = prompt  # Whether to prompt the user for version selection
-        self.config_file = config_file  # Name of the config file we pull version info from
+        self.target = target  # ServerUpdater or Fleet to keep up to date
+        self.interval = interval  # Seconds between polls
+        self.jitter = jitter  # Fraction of the delay to randomly add or remove
+        self.max_backoff = max_backoff  # Maximum seconds between polls while failing
+        self.install = install  # Whether to install new builds, False to only report them
+        self.default_version = default_version  # Version to install
+        self.default_build = default_build  # Build to install
+        self.failures = 0  # Number of polls that have failed in a row
+        self.polls = 0  # Number of polls made
+        self.stop = threading.Event()  # Event that is set when we should stop watching
 
-        # Starting object
+    def delay(self):
 
-        self._start(config)
+        """
+        Gets the number of seconds to wait before the next poll
+        :return: Seconds to wait
+        """
 
-        self.update = Update(self.version)  # Updater Instance
+        base = min(self.max_backoff, self.interval * (2 ** self.failures)) if self.failures else self.interval
 
-    def _start(self, config):
+        return max(0.0, base * random.uniform(1 - self.jitter, 1 + self.jitter))
+
+    def poll(self):
 
         """
-        Starts the object, loads configuration
+        Checks for a new build, and installs it if there is one
+        :return: True on success, False on failure
+        """
+
+        self.polls += 1
+
+        if isinstance(self.target, Fleet):
+
+            # Fleet only installs the servers that need it
+
+            results = self.target.run(check=True, install=self.install)
+
+            return not any(result['status'] == 'failed' for result in results)
+
+        serv = self.target
+        serv.failed = False
+
+        if serv.check() and self.install:
+
+            # New build found, install it
+
+            serv.get_new(default_version=self.default_version, default_build=self.default_build)
+
+        return not serv.failed
+
+    def run(self, polls=None):
+
+        """
+        Polls until we are stopped
+        :param polls: Maximum number of polls to make, None to poll forever
         :return:
         """
 
-        temp_version = '0'
-        temp_build = 0
+        output("\n[ --== Watching For New Builds Every {} Seconds: ==-- ]".format(self.interval))
 
-        if config:
+        while not self.stop.is_set() and (polls is None or self.polls < polls):
 
-            # Allowed to use configuration file
+            ok = self.poll()
+
+            self.failures = (0 if ok else self.failures + 1)
+
+            delay = self.delay()
+
+            emit('poll', poll=self.polls, error=not ok, failures=self.failures, next=round(delay, 3))
+
+            if not ok:
+
+                print("# Poll failed {} time(s) in a row, backing off for {} seconds".format(self.failures,
+                                                                                            round(delay)))
+
+            # Publishing our spans, we don't exit for a while
+
+            tracer.flush()
+
+            if polls is not None and self.polls >= polls:
+
+                break
+
+            output("# Next poll in {} seconds...".format(round(delay)))
+
+            self.stop.wait(delay)
+
+        output("[ --== Done Watching! ==-- ]")
+
+
+class MirrorHandler:
+
+    """
+    Handles requests to a Mirror.
+    Serves the same paths as the Paper v1 API, with or without the '/api/v1' prefix,
+    and deltas between builds at /paper/{version}/{build}/delta/{SHA-256 of the jar the client has}.
+    Mixed into http.server's request handler when the mirror starts, so http.server is only imported by mirrors.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+
+        self._handle(body=True)
+
+    def do_HEAD(self):
+
+        self._handle(body=False)
+
+    def _handle(self, body=True):
+
+        """
+        Routes a request to the metadata or jar we are mirroring
+        :param body: Whether to send the body
+        :return:
+        """
+
+        path = urlsplit(self.path).path.rstrip('/')
+
+        if path.startswith('/api/v1/'):
+
+            path = path[7:]
+
+        parts = path.split('/')[1:]
+
+        if not parts or parts[0] != 'paper' or len(parts) not in (1, 2, 4, 5) or \
+                (len(parts) == 4 and parts[3] != 'download') or (len(parts) == 5 and parts[3] != 'delta') or \
+                any(part in ('', '.', '..') for part in parts[1:]):
 
-            temp_version, temp_build = self.fileutil.load_config(self.config_file)
+            return self._error(404, 'Not Found')
 
-        else:
+        if len(parts) == 4:
 
-            # Skipping config file
+            # Request for a jar
 
-            output("# Skipping configuration file!")
+            path = self.server.mirror.jar(parts[1], parts[2])
 
-        self.version = (self.version if self.version != '0' else temp_version)
-        self.buildnum = (self.buildnum if self.buildnum != 0 else temp_build)
+            if path is None:
 
-        output("\nServer Version Information:")
-        output("  > Version: [{}]".format(self.version))
-        output("  > Build: [{}]".format(self.buildnum))
+                return self._error(502, 'Unable to fetch build [{}/{}]'.format(parts[1], parts[2]))
 
-        return
+            return self._send_file(path, 'application/java-archive', body)
 
-    def check(self):
+        if len(parts) == 5:
 
-        """
-        Checks if a new version is available
-        :return: True is new version, False if not/error
-        """
+            # Request for a delta from the jar the client has
 
-        output("\n[ --== Checking For New Version: ==-- ]")
+            path = self.server.mirror.delta(parts[1], parts[2], parts[4])
 
-        # Checking for new server version
+            if path is None:
 
-        output("# Comparing local <> remote server versions...")
+                return self._error(404, 'No delta from [{}] to build [{}/{}]'.format(parts[4], parts[1], parts[2]))
 
-        ver = self.update.get_versions()
+            return self._send_file(path, 'application/octet-stream', body)
 
-        if ver is None:
+        data = self.server.mirror.metadata(parts[1] if len(parts) == 2 else None)
 
-            # Error occurred
+        if data is None:
 
-            return False
+            return self._error(502, 'Unable to fetch version information')
 
-        if ver[0] != self.version:
+        etag = '"{}"'.format(hashlib.sha256(data).hexdigest()[:32])
 
-            # New version available!
+        if self.headers.get('If-None-Match') == etag:
 
-            output("# New Version available! - [Version: {}]".format(ver[0]))
-            output("[ --== Version check complete! ==-- ]\n")
+            # Client already has this
 
-            return True
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
 
-        output("# No new version available.")
+            return
 
-        # Checking builds
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('ETag', etag)
+        self.end_headers()
 
-        output("# Comparing local <> remote builds...")
+        if body:
 
-        build = self.update.get_buildnums(self.version)
+            self.wfile.write(data)
 
-        if build is None:
+    def _send_file(self, path, kind, body=True):
 
-            # Error occurred
+        """
+        Sends a jar or delta, or the requested range of it
+        :param path: Path to the file, named after its hash
+        :param kind: Content type of the file
+        :param body: Whether to send the body
+        :return:
+        """
 
-            return False
+        with open(path, 'rb') as file:
 
-        if build[0] != str(self.buildnum):
+            size = os.fstat(file.fileno()).st_size
+            etag = '"{}"'.format(os.path.basename(path).split('.')[0])
+            start, end = 0, size
+            status = 200
 
-            # New build available!
+            wanted = self.headers.get('Range')
+            validator = self.headers.get('If-Range')
 
-            output("# New build available! - [Build: {}]".format(build[0]))
-            output("[ --== Version check complete! ==-- ]\n")
+            if wanted is not None and wanted.startswith('bytes=') and ',' not in wanted and \
+                    (validator is None or validator == etag):
 
-            return True
+                # Client wants part of the file
 
-        output("# No new builds found.")
-        output("[ --== Version check complete! ==-- ]\n")
+                first, _, last = wanted[6:].strip().partition('-')
 
-        return False
+                try:
 
-    def _select(self, val, choice, default, name):
+                    if first:
 
-        """
-        Selects a value from the choices.
-        Support updater keywords
-        :param val: Value entered
-        :param choice: Choices to choose from
-        :param default: Default value
-        :param name: Name of value we are choosing
-        :return: True if valid, false if invalid
-        """
+                        start, end = int(first), (min(int(last) + 1, size) if last else size)
 
-        if val == '':
+                    else:
 
-            # User wants default value:
+                        start, end = max(0, size - int(last)), size
 
-            val = default
+                except ValueError:
 
-        if val == 'latest':
+                    return self._error(400, 'Invalid range')
 
-            # User wants latest
+                if start >= end:
 
-            output("# Selecting latest {} - [{}]...".format(name, self._available_versions[0]))
+                    self.send_response(416)
+                    self.send_header('Content-Range', 'bytes */{}'.format(size))
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
 
-            val = choice[0]
+                    return
 
-            return True, val
+                status = 206
 
-        if val not in choice:
+            self.send_response(status)
+            self.send_header('Content-Type', kind)
+            self.send_header('Content-Length', str(end - start))
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('ETag', etag)
 
-            # User selected invalid option
+            if status == 206:
 
-            output("\n# Error: Invalid {} selected!".format(name))
+                self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end - 1, size))
 
-            return False, ''
+            self.end_headers()
 
-        # Option selected is valid. Continue
+            if body:
 
-        output("# Selecting {}: [{}]...".format(name, val))
+                # Letting the kernel send the file, straight from the page cache
 
-        return True, val
+                self.connection.sendfile(file, start, end - start)
 
-    def version_select(self, default_version='latest', default_build='latest'):
+    def _error(self, code, message):
 
         """
-        Prompts the user to select a version to download
-        Checks input against values from Paper API
-        Default value is recommended values
-        :param default_build: Default build number
-        :param default_version: Default version
-        :return: (version, build)
+        Sends an error response
+        :param code: HTTP status code
+        :param message: Message to include in the body
+        :return:
         """
 
-        # Checking if we have version information:
+        data = json.dumps({'error': message}).encode()
 
-        output("# Checking version information...")
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
 
-        if not self._available_versions:
+        if self.command != 'HEAD':
 
-            # Version information is empty, reloading
+            self.wfile.write(data)
 
-            output("# Loading version information...")
+    def log_message(self, format, *args):
 
-            data = self.update.get_versions()
+        output("# [{}] {}".format(self.address_string(), format % args))
 
-            if data is None:
 
-                # Error occurred
+class Mirror:
 
-                return None, None
+    """
+    Local mirror of the Paper API.
+    Serves API data from the metadata cache, and jars from the jar cache,
+    and only contacts the Paper API when something is missing or out of date.
+    Other updaters can point their API base at us, so one machine absorbs all traffic to the Paper API.
+    """
 
-            self._available_versions = data
+    def __init__(self, update, host='0.0.0.0', port=8080):
 
-        if self.prompt:
+        self.update = update  # Updater used to fetch anything we don't have, must have a jar cache
+        self.address = (host, port)  # Address to listen on
+        self.server = None  # HTTP server, created when we start serving
+        self._locks = {}  # Lock per build, so a build is only fetched once
+        self._lock = threading.Lock()  # Lock protecting the build locks
 
-            print("\n[ --== Version Select: ==-- ] ")
+        if update.cache is None:
 
-            print("\nPlease enter the version you would like to download:")
-            print("Example: 14.4.4")
-            print("(Tip: The value enclosed in brackets is the default option. Leave the prompt blank to accept it.)")
-            print("(Tip: Enter 'latest' to select the latest version.)")
+            raise ValueError("Mirror requires a jar cache")
 
-            print("\nAvailable versions:")
+    def metadata(self, version=None):
 
-            # Displaying available versions
+        """
+        Gets the API data of all versions, or the builds of a version
+        :param version: Version to get builds for, None for the version list
+        :return: Raw API data, None on failure
+        """
 
-            for i in self._available_versions:
+        data = self.update._get(version=version)
 
-                print("  > Version: [{}]".format(i))
+        if data is None or self.update.api.name == 'v1':
 
-            while True:
+            # Already in the shape we serve
 
-                ver = input("\nEnter Version[{}]: ".format(default_version))
+            return data
 
-                stat, ver = self._select(ver, self._available_versions, default_version, "version")
+        # Upstream is another API version, translating its answer:
 
-                if stat:
+        if version is None:
 
-                    # User selected okay value
+            return json.dumps({'project': 'paper', 'versions': self.update._parse_versions(data)}).encode('utf-8')
 
-                    break
+        builds = self.update._parse_builds(version, data)
 
-        else:
+        return json.dumps({'project': 'paper', 'version': version,
+                           'builds': {'latest': (builds[0] if builds else None), 'all': builds}}).encode('utf-8')
 
-            # Just select default version
+    def jar(self, version, build):
 
-            stat, ver = self._select('', self._available_versions, default_version, "version")
+        """
+        Gets the path of a jar in the jar cache, fetching it if we don't have it
+        :param version: Version of the jar
+        :param build: Build of the jar, may be 'latest'
+        :return: Path to the cached jar, None on failure
+        """
 
-            if not stat:
+        if build == 'latest':
 
-                # Invalid version selected
+            # Resolving the latest build, so it can be cached
 
-                print("# Aborting installation!")
+            builds = self.update.get_buildnums(version)
 
-                return None, None
+            if not builds:
 
-        # Getting build info
+                return None
 
-        output("# Loading build information...")
+            build = builds[0]
 
-        nums = self.update.get_buildnums(ver)
+        with self._lock:
 
-        if nums is None:
+            lock = self._locks.setdefault((version, build), threading.Lock())
 
-            # Error occurred:
+        with lock:
 
-            return None, None
+            entry = self.update.cache.lookup(version, build)
 
-        if self.prompt:
+            if entry is None:
 
-            print("\nPlease enter the build you would like to download:")
-            print("Example: 205")
-            print("(Tip: The value enclosed in brackets is the default option. Leave the prompt blank to accept it.)")
-            print("(Tip: Enter 'latest' to select the latest build.)")
+                # Not cached, fetching it from upstream
 
-            print("\nAvailable Builds:")
+                staged = os.path.join(self.update.cache.path, 'mirror', '{}-{}.jar'.format(version, build))
 
-            # Displaying available builds
+                os.makedirs(os.path.dirname(staged), exist_ok=True)
 
-            for i in nums:
+                if not self.update.download(staged, version, build_num=build):
 
-                print("  > Build Num: [{}]".format(i))
+                    return None
 
-            while True:
+                # The download now lives in the jar cache
 
-                # Prompting user for build info
+                os.remove(staged)
 
-                build = input("\nEnter Build[{}]: ".format(default_build))
+                entry = self.update.cache.lookup(version, build)
 
-                stat, build = self._select(build, nums, default_build, "build")
+                if entry is None:
 
-                if stat:
+                    return None
 
-                    # User selected okay value
+        return self.update.cache.jar_path(entry['hash'])
 
-                    break
+    def delta(self, version, build, base):
 
-        else:
+        """
+        Gets the path of a delta from a jar in the jar cache to a build, building it if we don't have it
+        :param version: Version of the build
+        :param build: Build, may be 'latest'
+        :param base: SHA-256 of the jar the client has
+        :return: Path to the delta, None if we don't have the client's jar, or can't get the build
+        """
 
-            # Select default build
+        old = self.update.cache.jar_path(base)
 
-            stat, build = self._select('', nums, default_build, "build")
+        if len(base) != 64 or any(char not in '0123456789abcdef' for char in base) or not os.path.isfile(old):
 
-            if not stat:
+            # We never had the jar the client has, it has to download the full jar
 
-                # Invalid build selected!
+            return None
 
-                output("# Aborting installation!")
+        new = self.jar(version, build)
 
-                return None, None
+        if new is None:
 
-        output("\nYou have selected:")
-        output("   > Version: [{}]".format(ver))
-        output("   > Build: [{}]".format(build))
+            return None
 
-        output("\n[ --== Version Selection Complete! ==-- ]")
+        target = os.path.basename(new).split('.')[0]
+        path = os.path.join(self.update.cache.path, 'deltas', '{}-{}.delta'.format(base, target))
 
-        return ver, build
+        with self._lock:
 
-    def get_new(self, default_version='latest', default_build='latest'):
+            lock = self._locks.setdefault((base, target), threading.Lock())
 
-        """
-        Downloads and installs the new version
-        Prompts the user to select a specific version
-        :return:
-        """
+        with lock:
 
-        # Prompting user for version info:
+            if not os.path.isfile(path):
 
-        ver, build = self.version_select(default_version=default_version, default_build=default_build)
+                # Building the delta once, every client on the same build gets the same one
 
-        if ver is None or build is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
 
-            # Error occurred, cancel installation
+                try:
 
-            return
+                    copied, literal = JarDelta.build(old, new, path, base, target)
 
-        # Checking if user wants to continue with installation
+                except Exception as e:
 
-        if self.prompt:
+                    output("# Unable to build delta for [{}/{}]: {}".format(version, build, e))
 
-            print("\nDo you want to continue with the installation?")
+                    return None
 
-            inp = input("(Y/N):").lower()
+                output("# Built delta for [{}/{}] - [{} bytes copied, {} bytes sent]".format(version, build, copied,
+                                                                                             literal))
 
-            if inp in ['n', 'no']:
-                # User does not want to continue, exit
+                self._prune_deltas()
 
-                output("Canceling installation...")
+        return path
 
-                return
+    def _prune_deltas(self):
 
-        # Creating temporary directory to store assets:
+        """
+        Removes deltas from or to jars that have left the jar cache
+        :return:
+        """
 
-        output("# Creating temporary directory...")
+        folder = os.path.join(self.update.cache.path, 'deltas')
 
-        self.fileutil.create_temp_dir()
+        for name in os.listdir(folder):
 
-        output("# Temporary directory created at: {}".format(self.fileutil.temp.name))
+            if not name.endswith('.delta'):
 
-        # Starting download process:
+                continue
 
-        val = self.update.download(os.path.join(self.fileutil.temp.name, 'download_data'), ver, build_num=build)
+            if not all(os.path.isfile(self.update.cache.jar_path(digest)) for digest in name[:-6].split('-')):
 
-        if not val:
+                try:
 
-            # Download process failed
+                    os.remove(os.path.join(folder, name))
 
-            return
+                except OSError:
 
-        # Download process complete!
+                    pass
 
-        # Installing downloaded data:
+    def serve(self):
 
-        val = self.fileutil.install()
+        """
+        Serves requests until we are closed
+        :return:
+        """
 
-        if not val:
+        import http.server
 
-            # Install process failed
+        handler = type('MirrorHandler', (MirrorHandler, http.server.BaseHTTPRequestHandler), {})
 
-            return
+        self.server = http.server.ThreadingHTTPServer(self.address, handler)
+        self.server.daemon_threads = True
+        self.server.mirror = self
 
-        output("\nUpdate complete!")
+        output("\n[ --== Serving Mirror at http://{}:{}/paper ==-- ]".format(*self.server.server_address[:2]))
 
-        # Updating values
+        self.server.serve_forever()
 
-        self.version = ver
-        self.buildnum = build
+    def close(self):
 
-        return
+        """
+        Stops serving requests
+        :return:
+        """
+
+        if self.server is not None:
+
+            self.server.shutdown()
+            self.server.server_close()
 
 
 if __name__ == '__main__':
 
     # Ran as script
 
+    import argparse
+    import atexit
+    import signal
+
     parser = argparse.ArgumentParser(description='PaperMC Server Updater.',
                                      epilog="Please check the github page for more info: "
                                             "https://github.com/Owen-Cochell/PaperMC-Update.")
 
-    parser.add_argument('path', help='Path to file to be updated')
+    parser.add_argument('path', help='Path to file to be updated', nargs='?')
     parser.add_argument('-v', '--version', help='Server version to install(Sets default value)', default='latest')
     parser.add_argument('-b', '--build', help='Server build to install(Sets default value)', default='latest')
     parser.add_argument('-iv', help='Sets the currently installed server version, ignores config', default='0')
@@ -1021,6 +7450,60 @@ if __name__ == '__main__':
                                                      '(Defaults to [SERVER_JAR_DIR]/version_history.json)')
     parser.add_argument('-q', '--quiet', help="Will only output errors and interactive questions to the terminal",
                         action='store_true')
+    parser.add_argument('-s', '--segments', help='Downloads the server jar in N concurrent segments, '
+                                                 'if the server supports range requests', type=int, default=1)
+    parser.add_argument('-cd', '--cache-dir', help='Directory to cache downloaded jars in, shared between servers'
+                                                   '(Defaults to ~/.cache/server_update)')
+    parser.add_argument('-cs', '--cache-size', help='Maximum size of the jar cache in megabytes', type=int, default=512)
+    parser.add_argument('-ca', '--cache-age', help='Days an unused jar is kept in the jar cache', type=int, default=30)
+    parser.add_argument('-ct', '--cache-ttl', help='Seconds cached API data is used before it is revalidated',
+                        type=int, default=60)
+    parser.add_argument('-ncc', '--no-cache', help='Will not use the jar and API data caches', action='store_true')
+    parser.add_argument('-o', '--offline', help='Only uses cached data, never contacts the Paper API',
+                        action='store_true')
+    parser.add_argument('-f', '--fleet', help='Path to a JSON manifest of servers to update, instead of a single path')
+    parser.add_argument('-w', '--workers', help='Maximum number of concurrent downloads/installations in fleet mode',
+                        type=int, default=4)
+    parser.add_argument('-fs', '--fleet-summary', help='Path to write the per server results of a fleet update to')
+    parser.add_argument('-j', '--json', help='Writes structured JSON events to stdout instead of the normal output, '
+                                             'and exits non-zero on failure', action='store_true')
+    parser.add_argument('-tf', '--trace-file', help='Path to append timing spans of each phase to, as JSON lines')
+    parser.add_argument('-pf', '--prometheus-file', help='Path to write phase timings to, '
+                                                         'in the Prometheus textfile collector format')
+    parser.add_argument('-sd', '--statsd', help='HOST:PORT of a StatsD server to send phase timings to')
+    parser.add_argument('-ab', '--api-base', help='Base URL of the Paper API, or of a mirror of it, '
+                                                  'defaults to the official API of the chosen version')
+    parser.add_argument('-av', '--api', help='Version of the Paper API to use, v2 lists the hash of each build',
+                        choices=sorted(API_BACKENDS), default='v1')
+    parser.add_argument('-ra', '--retry-attempts', help='Maximum number of attempts for each request and download',
+                        type=int, default=3)
+    parser.add_argument('-rb', '--retry-backoff', help='Seconds to wait before the first retry, doubled for each retry',
+                        type=float, default=0.5)
+    parser.add_argument('-rc', '--connect-timeout', help='Seconds to wait for a connection to the API',
+                        type=float, default=10)
+    parser.add_argument('-rr', '--read-timeout', help='Seconds to wait for data from the API before giving up on it',
+                        type=float, default=30)
+    parser.add_argument('-lr', '--limit-rate', help='Maximum download rate in bytes per second, '
+                                                    'with an optional K, M or G suffix(Like 500K)', type=parse_rate)
+    parser.add_argument('-le', '--limit-each', help='Applies the rate limit to each download, '
+                                                    'instead of sharing it between all downloads', action='store_true')
+    parser.add_argument('-md', '--max-downloads', help='Maximum number of simultaneous downloads', type=int)
+    parser.add_argument('-kb', '--keep-backups', help='Number of replaced jars to retain for rollback',
+                        type=int, default=3)
+    parser.add_argument('-rbk', '--rollback', help='Rolls back to a retained build, '
+                                                   'or the most recent one if none is given', nargs='?', const='previous')
+    parser.add_argument('-m', '--mirror', help='Serves a mirror of the Paper API on [HOST:]PORT, '
+                                               'using the jar and API data caches')
+    parser.add_argument('-dl', '--delta', help='Rebuilds new builds from the installed jar, using a delta from '
+                                               'a mirror or fetching only the changed entries, '
+                                               'instead of downloading the full jar', action='store_true')
+    parser.add_argument('-W', '--watch', help='Keeps running, and installs new builds as they are released',
+                        action='store_true')
+    parser.add_argument('-wi', '--watch-interval', help='Seconds between polls in watch mode', type=float, default=300)
+    parser.add_argument('-wj', '--watch-jitter', help='Fraction of the poll interval to randomly vary it by',
+                        type=float, default=0.1)
+    parser.add_argument('-wm', '--watch-max-backoff', help='Maximum seconds between polls while polls are failing',
+                        type=float, default=3600)
 
     # Deprecated arguments - Included for compatibility, but do nothing
 
@@ -1030,6 +7513,65 @@ if __name__ == '__main__':
 
     args = parser.parse_args()
 
+    if args.path is None and args.fleet is None and args.mirror is None:
+
+        parser.error("A path to the server jar, or a fleet manifest, is required")
+
+    if args.json:
+
+        # Keeping stdout for our events, anything else printed goes to stderr
+
+        events = sys.stdout
+        sys.stdout = sys.stderr
+
+    begin = time.monotonic()
+
+    def watch(target):
+
+        """
+        Watches a server or fleet until we are interrupted, then exits
+        :param target: ServerUpdater or Fleet to watch
+        :return:
+        """
+
+        watcher = Watcher(target, interval=args.watch_interval, jitter=args.watch_jitter,
+                          max_backoff=args.watch_max_backoff, install=not args.check_only,
+                          default_version=args.version, default_build=args.build)
+
+        # Stopping cleanly when the service manager asks us to:
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: watcher.stop.set())
+
+        try:
+
+            watcher.run()
+
+        except KeyboardInterrupt:
+
+            output("\n# Interrupted, stopping...")
+
+        sys.exit()
+
+    # Setting up our trace exporters:
+
+    if args.trace_file is not None:
+
+        tracer.exporters.append(JsonlExporter(args.trace_file))
+
+    if args.prometheus_file is not None:
+
+        tracer.exporters.append(PrometheusExporter(args.prometheus_file))
+
+    if args.statsd is not None:
+
+        host, _, port = args.statsd.rpartition(':')
+
+        tracer.exporters.append(StatsdExporter(host or '127.0.0.1', int(port or 8125)))
+
+    # Flushing the exporters however we exit:
+
+    atexit.register(tracer.close)
+
     output("+==========================================================================+")
     output(r'''|     _____                              __  __          __      __        |
 |    / ___/___  ______   _____  _____   / / / /___  ____/ /___ _/ /____    |
@@ -1042,8 +7584,93 @@ if __name__ == '__main__':
     output("[Handles the checking, downloading, and installation of server versions]")
     output("[Written by: Owen Cochell]\n")
 
-    serv = ServerUpdater(args.path, config_file=args.config_file, config=args.no_load_config, prompt=args.interactive,
-                         version=args.iv, build=args.ib)
+    cache = None
+    meta = None
+    retry = RetryPolicy(attempts=args.retry_attempts, backoff=args.retry_backoff, connect_timeout=args.connect_timeout,
+                        read_timeout=args.read_timeout)
+
+    if not args.no_cache:
+
+        # Allowed to use the jar and API data caches
+
+        cache = JarCache(args.cache_dir, max_size=args.cache_size * 1048576, max_age=args.cache_age * 86400)
+        meta = MetadataCache(cache.path, ttl=args.cache_ttl)
+
+    # One updater for everything we do, so connections, caches and limits are shared:
+
+    update = Update('0', segments=args.segments, cache=cache, meta=meta, offline=args.offline, base=args.api_base,
+                    api=args.api, delta=args.delta, retry=retry,
+                    limiter=(RateLimiter(args.limit_rate) if args.limit_rate else None), limit_each=args.limit_each,
+                    max_downloads=args.max_downloads)
+
+    if args.mirror is not None:
+
+        # Serving a mirror of the Paper API:
+
+        if cache is None:
+
+            parser.error("Mirror mode requires the jar cache, it can't be used with --no-cache")
+
+        host, _, port = args.mirror.rpartition(':')
+
+        mirror = Mirror(update, host=host or '0.0.0.0', port=int(port))
+
+        try:
+
+            mirror.serve()
+
+        except KeyboardInterrupt:
+
+            output("\n# Interrupted, stopping...")
+
+        sys.exit()
+
+    if args.fleet is not None:
+
+        # Updating a whole fleet of servers:
+
+        fleet = Fleet.load(args.fleet, update, workers=args.workers, config=args.no_load_config, version=args.version,
+                           build=args.build, keep_backups=args.keep_backups)
+
+        if args.watch:
+
+            watch(fleet)
+
+        fleet.run(check=not args.no_check, install=not args.check_only)
+
+        if args.fleet_summary is not None:
+
+            fleet.write_summary(args.fleet_summary)
+
+        statuses = [result['status'] for result in fleet.results]
+        code = (1 if 'failed' in statuses else 0)
+
+        emit('summary', status=('failed' if code else 'complete'), exit_code=code, servers=len(statuses),
+             **{status.replace('-', '_'): statuses.count(status) for status in
+                ('updated', 'up-to-date', 'update-available', 'failed')},
+             seconds=round(time.monotonic() - begin, 3))
+
+        sys.exit(code if args.json else None)
+
+    serv = ServerUpdater(args.path, config_file=args.config_file, config=args.no_load_config,
+                         prompt=args.interactive and not args.watch, version=args.iv, build=args.ib, update=update)
+
+    serv.fileutil.backups.keep = args.keep_backups
+
+    if args.rollback is not None:
+
+        # Rolling back instead of updating:
+
+        serv.rollback(None if args.rollback == 'previous' else args.rollback)
+
+        emit('summary', status=('failed' if serv.failed else 'rolled-back'), exit_code=int(serv.failed),
+             version=serv.version, build=str(serv.buildnum), seconds=round(time.monotonic() - begin, 3))
+
+        sys.exit(int(serv.failed))
+
+    if args.watch:
+
+        watch(serv)
 
     update_available = True
 
@@ -1061,4 +7688,25 @@ if __name__ == '__main__':
 
         # Allowed to install/Can install
 
-        serv.get_new(default_version=args.version, default_build=args.build)
+        installed = serv.get_new(default_version=args.version, default_build=args.build)
+
+        status = ('updated' if installed else 'not-installed')
+
+    elif update_available:
+
+        status = 'update-available'
+
+    else:
+
+        status = 'up-to-date'
+
+    if serv.failed:
+
+        status = 'failed'
+
+    emit('summary', status=status, exit_code=int(serv.failed), version=serv.version, build=str(serv.buildnum),
+         seconds=round(time.monotonic() - begin, 3))
+
+    if args.json:
+
+        sys.exit(int(serv.failed))
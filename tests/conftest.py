@@ -0,0 +1,56 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import server_update  # noqa: E402
+from server import StandIn, make_jar  # noqa: E402
+
+JAR = make_jar()  # Build 100 of every version
+NEW_JAR = make_jar(7, changed=(3, 10, 41))  # Build 102, a few entries differ from build 100
+
+
+@pytest.fixture
+def api():
+
+    """
+    Stand-in Paper API with builds 100 and 102 of 1.16.5, and build 7 of 1.15.2
+    """
+
+    stand_in = StandIn()
+
+    stand_in.add('1.16.5', 100, JAR)
+    stand_in.add('1.16.5', 102, NEW_JAR)
+    stand_in.add('1.15.2', 7, JAR)
+
+    stand_in.start()
+
+    yield stand_in
+
+    stand_in.close()
+
+
+@pytest.fixture
+def make_update(request, api):
+
+    """
+    Factory for updaters talking to the stand-in, make_update(cls=Update, **kwargs).
+    Async updaters are closed once the test is over.
+    """
+
+    def make(cls=server_update.Update, **kwargs):
+
+        update = cls('1.16.5', base=api.v1, **kwargs)
+
+        update.min_segment = 65536  # Small enough to split our test jars up
+
+        if isinstance(update, server_update.AsyncUpdate):
+
+            request.addfinalizer(update.close)
+
+        return update
+
+    return make
@@ -0,0 +1,379 @@
+"""
+Local stand-in for the Paper API, used by the tests and benchmarks.
+Serves the v1 and v2 API shapes from memory, with range support, conditional requests, mirror style deltas,
+and fault injection(Failing statuses, stalls, and connections dropped mid-body).
+"""
+
+import hashlib
+import http.server
+import io
+import json
+import random
+import re
+import socket
+import threading
+import time
+import zipfile
+
+
+def make_jar(seed=0, entries=70, size=80000, changed=()):
+
+    """
+    Builds a deterministic jar
+    :param seed: Seed for the content of the changed entries
+    :param entries: Number of entries
+    :param size: Size of each entry
+    :param changed: Entries whose content depends on the seed, every other entry is the same in every jar
+    :return: Bytes of the jar
+    """
+
+    buffer = io.BytesIO()
+
+    with zipfile.ZipFile(buffer, 'w') as jar:
+
+        for index in range(entries):
+
+            rand = random.Random(index * 1000 + (seed if index in changed else 0))
+            data = rand.randbytes(size // 4) * 4
+            info = zipfile.ZipInfo('f{:04d}.class'.format(index), (2020, 1, 1, 0, 0, 0))
+
+            jar.writestr(info, data, compress_type=(zipfile.ZIP_STORED if index % 2 else zipfile.ZIP_DEFLATED))
+
+    return buffer.getvalue()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+
+        stand_in = self.server.stand_in
+
+        with stand_in.lock:
+
+            stand_in.stats['connections'] += 1
+
+        if stand_in.handshake:
+
+            # Standing in for the TCP and TLS handshakes of a distant server
+
+            time.sleep(stand_in.handshake)
+
+        super().setup()
+
+    def log_message(self, format, *args):
+
+        pass
+
+    def do_HEAD(self):
+
+        self.do_GET()
+
+    def do_GET(self):
+
+        stand_in = self.server.stand_in
+
+        with stand_in.lock:
+
+            stand_in.stats['requests'] += 1
+            stand_in.paths.append((self.command, self.path))
+
+            fail = (stand_in.fail.pop(0) if stand_in.fail else None)
+            stall = (stand_in.stall.pop(0) if stand_in.stall else None)
+
+        if stall or stand_in.latency:
+
+            # Holding the request, like a hung or distant server
+
+            time.sleep((stall or 0) + stand_in.latency)
+
+        if fail:
+
+            return self._send(fail, b'{"error": "injected"}')
+
+        path = self.path.split('?')[0].rstrip('/')
+
+        match = re.fullmatch(r'/api/v1/paper(?:/([^/]+))?', path)
+
+        if match:
+
+            return self._listing(stand_in.v1_listing(match[1]))
+
+        match = re.fullmatch(r'/api/v1/paper/([^/]+)/([^/]+)/download', path)
+
+        if match:
+
+            return self._jar(stand_in.jar(match[1], match[2]))
+
+        match = re.fullmatch(r'/api/v1/paper/([^/]+)/([^/]+)/delta/([0-9a-f]+)', path)
+
+        if match and (match[1], int(match[2]), match[3]) in stand_in.deltas:
+
+            # Delta published like a mirror would
+
+            return self._send(200, stand_in.deltas[match[1], int(match[2]), match[3]])
+
+        match = re.fullmatch(r'/v2/projects/paper(?:/versions/([^/]+)/builds)?', path)
+
+        if match:
+
+            return self._listing(stand_in.v2_listing(match[1]))
+
+        match = re.fullmatch(r'/v2/projects/paper/versions/([^/]+)/builds/(\d+)/downloads/([^/]+)', path)
+
+        if match and match[3] == stand_in.jar_name(match[1], match[2]):
+
+            return self._jar(stand_in.jar(match[1], match[2]))
+
+        self._send(404, b'{"error": "not found"}')
+
+    def _listing(self, data):
+
+        """
+        Sends an API listing, answering conditional requests
+        """
+
+        if data is None:
+
+            return self._send(404, b'{"error": "not found"}')
+
+        stand_in = self.server.stand_in
+        data = json.dumps(data).encode()
+        etag = '"{}"'.format(hashlib.sha256(data).hexdigest()[:16])
+        modified = 'Thu, 01 Oct 2020 00:00:00 GMT'
+
+        if self.headers.get('If-None-Match') == etag or self.headers.get('If-Modified-Since') == modified:
+
+            stand_in.stats['not_modified'] += 1
+
+            return self._send(304, b'', ([] if stand_in.bare_304 else [('ETag', etag), ('Last-Modified', modified)]))
+
+        self._send(200, data, [('Content-Type', 'application/json'), ('ETag', etag), ('Last-Modified', modified)])
+
+    def _jar(self, data):
+
+        """
+        Sends a jar, or the requested range of it
+        """
+
+        if data is None:
+
+            return self._send(404, b'{"error": "not found"}')
+
+        stand_in = self.server.stand_in
+        etag = '"{}"'.format(hashlib.sha256(data).hexdigest())
+        wanted = self.headers.get('Range')
+
+        if self.headers.get('If-Range') not in (None, etag):
+
+            # File changed since the client started, sending all of it
+
+            wanted = None
+
+        headers = [('ETag', etag)] + ([('Accept-Ranges', 'bytes')] if stand_in.ranges else [])
+
+        if not stand_in.length:
+
+            # Leaving out the length, like a server that compresses or streams on the fly
+
+            return self._send(200, data, headers, chunked=True)
+
+        if wanted and stand_in.ranges:
+
+            first, last = wanted.split('=')[1].split('-')
+
+            if not first:
+
+                first, last = max(0, len(data) - int(last)), ''
+
+            first = int(first)
+            last = (min(int(last), len(data) - 1) if last else len(data) - 1)
+
+            with stand_in.lock:
+
+                stand_in.stats['ranges'] += 1
+                stand_in.stats['range_bytes'] += last + 1 - first
+                stand_in.served.append((first, last))
+
+            return self._send(206, memoryview(data)[first:last + 1], headers + [
+                ('Content-Range', 'bytes {}-{}/{}'.format(first, last, len(data)))])
+
+        self._send(200, data, headers)
+
+    def _send(self, status, body, headers=(), chunked=False):
+
+        """
+        Sends a response, dropping the connection part way through if we were told to.
+        Chunked responses have no Content-Length, and are never dropped.
+        """
+
+        stand_in = self.server.stand_in
+
+        self.send_response(status)
+
+        for name, value in headers:
+
+            self.send_header(name, value)
+
+        self.send_header(*(('Transfer-Encoding', 'chunked') if chunked else ('Content-Length', str(len(body)))))
+        self.end_headers()
+
+        if self.command == 'HEAD':
+
+            return
+
+        if chunked:
+
+            for start in range(0, len(body), 65536):
+
+                chunk = body[start:start + 65536]
+
+                self.wfile.write('{:x}\r\n'.format(len(chunk)).encode() + chunk + b'\r\n')
+
+            self.wfile.write(b'0\r\n\r\n')
+
+            stand_in.stats['body_bytes'] += len(body)
+
+            return
+
+        with stand_in.lock:
+
+            drop = (stand_in.drop.pop(0) if stand_in.drop and len(body) > stand_in.drop[0] else None)
+
+        if drop is not None:
+
+            # Sending part of the body, then resetting the connection
+
+            self.wfile.write(body[:drop])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+
+            return
+
+        stand_in.stats['body_bytes'] += len(body)
+
+        self.wfile.write(body)
+
+
+class Server(http.server.ThreadingHTTPServer):
+
+    request_queue_size = 128  # Clients open many connections at once
+    daemon_threads = True
+
+
+class StandIn:
+
+    """
+    In-memory Paper API on a local port.
+    Builds are added with add(), every version listed in both API shapes.
+    """
+
+    def __init__(self):
+
+        self.builds = {}  # Jar of each build, by version and build
+        self.hashes = {}  # Published hashes that differ from the real ones, by (version, build)
+        self.deltas = {}  # Deltas served at the mirror path, by (version, build, SHA-256 of the old jar)
+        self.ranges = True  # Whether range requests are supported
+        self.length = True  # Whether jars are sent with a Content-Length, chunked without one otherwise
+        self.bare_304 = False  # Whether 304 responses leave out the ETag and Last-Modified headers
+        self.fail = []  # Statuses to answer the next requests with
+        self.stall = []  # Seconds to hold the next requests for
+        self.drop = []  # Byte counts after which the next large bodies are cut off
+        self.latency = 0  # Seconds every request is held for, to stand in for a distant server
+        self.handshake = 0  # Seconds every new connection is held for before its first request
+        self.stats = {'connections': 0, 'requests': 0, 'ranges': 0, 'range_bytes': 0, 'not_modified': 0,
+                      'body_bytes': 0}  # Request counters
+        self.paths = []  # (method, path) of every request
+        self.served = []  # (first, last) byte of every range request
+        self.lock = threading.Lock()  # Lock protecting the counters and faults
+        self.server = None
+
+    def add(self, version, build, data):
+
+        """
+        Adds a build
+        """
+
+        self.builds.setdefault(str(version), {})[int(build)] = data
+
+    def jar(self, version, build):
+
+        builds = self.builds.get(version, {})
+
+        if build == 'latest' and builds:
+
+            build = max(builds)
+
+        try:
+
+            return builds.get(int(build))
+
+        except ValueError:
+
+            return None
+
+    def jar_name(self, version, build):
+
+        return 'paper-{}-{}.jar'.format(version, build)
+
+    def _ordered(self):
+
+        return sorted(self.builds, key=lambda version: [int(part) for part in version.split('.')])
+
+    def v1_listing(self, version=None):
+
+        if version is None:
+
+            return {'project': 'paper', 'versions': self._ordered()[::-1]}
+
+        if version not in self.builds:
+
+            return None
+
+        builds = [str(build) for build in sorted(self.builds[version], reverse=True)]
+
+        return {'project': 'paper', 'version': version, 'builds': {'latest': builds[0], 'all': builds}}
+
+    def v2_listing(self, version=None):
+
+        if version is None:
+
+            return {'project_id': 'paper', 'project_name': 'Paper', 'versions': self._ordered()}
+
+        if version not in self.builds:
+
+            return None
+
+        return {'project_id': 'paper', 'project_name': 'Paper', 'version': version, 'builds': [
+            {'build': build, 'time': '2020-10-01T00:00:00.000Z', 'channel': 'default', 'promoted': False,
+             'changes': [], 'downloads': {'application': {
+                 'name': self.jar_name(version, build),
+                 'sha256': self.hashes.get((version, build), hashlib.sha256(data).hexdigest())}}}
+            for build, data in sorted(self.builds[version].items())]}
+
+    @property
+    def v1(self):
+
+        return 'http://127.0.0.1:{}/api/v1/paper'.format(self.server.server_port)
+
+    @property
+    def v2(self):
+
+        return 'http://127.0.0.1:{}/v2/projects/paper'.format(self.server.server_port)
+
+    def start(self):
+
+        self.server = Server(('127.0.0.1', 0), Handler)
+        self.server.stand_in = self
+
+        threading.Thread(target=self.server.serve_forever, args=(0.05,), daemon=True).start()
+
+        return self
+
+    def close(self):
+
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,99 @@
+import hashlib
+import threading
+import time
+
+import pytest
+
+import server_update
+from conftest import JAR, NEW_JAR
+
+
+@pytest.mark.parametrize('name', ['v1', 'v2'])
+def test_listings(api, name):
+
+    update = server_update.Update('1.16.5', api=name, base=getattr(api, name))
+
+    assert update.get_versions() == ['1.16.5', '1.15.2']
+    assert update.get_buildnums('1.16.5') == ['102', '100']
+    assert update.get_buildnums('1.15.2') == ['7']
+    assert update.catalog.resolve_version('1.16.x') == '1.16.5'
+    assert update.catalog.resolve_build('1.16.5', '>=101') == '102'
+
+
+def test_v2_download_checks_published_hash(api, tmp_path):
+
+    update = server_update.Update('1.16.5', api='v2', base=api.v2)
+    path = str(tmp_path / 'server.jar')
+
+    assert update.download(path, '1.16.5', 'latest')
+    assert (tmp_path / 'server.jar').read_bytes() == NEW_JAR
+    assert ('GET', '/v2/projects/paper/versions/1.16.5/builds/102/downloads/paper-1.16.5-102.jar') in api.paths
+
+
+def test_v2_download_with_wrong_published_hash_fails(api, tmp_path):
+
+    api.hashes[('1.16.5', 100)] = hashlib.sha256(b'something else').hexdigest()
+    update = server_update.Update('1.16.5', api='v2', base=api.v2, cache=server_update.JarCache(str(tmp_path / 'c')))
+
+    assert not update.download(str(tmp_path / 'server.jar'), '1.16.5', 100)
+
+    # A damaged download never makes it into the jar cache:
+
+    assert update.cache.lookup('1.16.5', 100) is None
+
+
+def test_v2_download_of_unlisted_build_fails(api, tmp_path):
+
+    update = server_update.Update('1.16.5', api='v2', base=api.v2)
+
+    assert not update.download(str(tmp_path / 'server.jar'), '1.16.5', 101)
+
+
+@pytest.fixture
+def mirror(api, tmp_path):
+
+    """
+    Mirror serving the v1 API, fetching from the stand-in's v2 API
+    """
+
+    upstream = server_update.Update('1.16.5', api='v2', base=api.v2, cache=server_update.JarCache(str(tmp_path)),
+                                    meta=server_update.MetadataCache(str(tmp_path)))
+    mirror = server_update.Mirror(upstream, host='127.0.0.1', port=0)
+
+    threading.Thread(target=mirror.serve, daemon=True).start()
+
+    while mirror.server is None:
+
+        time.sleep(0.01)
+
+    yield 'http://127.0.0.1:{}/paper'.format(mirror.server.server_address[1])
+
+    mirror.close()
+
+
+def test_mirror_translates_v2_upstream(api, mirror, tmp_path):
+
+    update = server_update.Update('1.16.5', base=mirror)
+
+    assert update.get_versions() == ['1.16.5', '1.15.2']
+    assert update.get_buildnums('1.16.5') == ['102', '100']
+
+    assert update.download(str(tmp_path / 'server.jar'), '1.16.5', 'latest', digest=hashlib.sha256(NEW_JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == NEW_JAR
+
+    # Served from the mirror's jar cache the second time:
+
+    downloads = len([path for method, path in api.paths if '/downloads/' in path])
+
+    assert update.download(str(tmp_path / 'old.jar'), '1.16.5', 100)
+    assert update.download(str(tmp_path / 'old2.jar'), '1.16.5', 100)
+    assert (tmp_path / 'old2.jar').read_bytes() == JAR
+    assert len([path for method, path in api.paths if '/downloads/' in path]) == downloads + 1
+
+
+def test_mirror_refuses_jar_with_wrong_published_hash(api, mirror, tmp_path):
+
+    api.hashes[('1.16.5', 100)] = '0' * 64
+    update = server_update.Update('1.16.5', base=mirror, retry=server_update.RetryPolicy(attempts=1))
+
+    assert not update.download(str(tmp_path / 'server.jar'), '1.16.5', 100)
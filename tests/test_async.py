@@ -0,0 +1,88 @@
+import asyncio
+import hashlib
+
+import server_update
+from conftest import JAR, NEW_JAR
+
+
+def test_listings_match_blocking(api):
+
+    blocking = server_update.Update('1.16.5', base=api.v1)
+    update = server_update.AsyncUpdate('1.16.5', base=api.v1)
+
+    async def listings():
+
+        # Closing the connections while their event loop is still running:
+
+        try:
+
+            return await asyncio.gather(update.get_versions(), update.get_buildnums('1.16.5'),
+                                        update.get_buildnums('1.15.2'), update.get_buildnums('9.9', report=False))
+
+        finally:
+
+            update.close()
+
+    assert asyncio.run(listings()) == [blocking.get_versions(), blocking.get_buildnums('1.16.5'),
+                                       blocking.get_buildnums('1.15.2'), None]
+
+
+def test_server_updater_with_async_update(api, tmp_path):
+
+    (tmp_path / 'server.jar').write_bytes(JAR)
+    (tmp_path / 'version_history.json').write_text('{"currentVersion": "git-Paper-100 (MC: 1.16.5)"}')
+
+    update = server_update.AsyncUpdate('1.16.5', base=api.v1)
+    serv = server_update.ServerUpdater(str(tmp_path / 'server.jar'), version='0', build=0, prompt=False, update=update)
+
+    try:
+
+        assert serv.check() is True
+        assert not serv.failed
+        assert serv.versions() == ['1.16.5', '1.15.2']
+        assert serv.builds('1.16.5') == ['102', '100']
+        assert serv.get_new('1.16.5', 'latest')
+        assert (tmp_path / 'server.jar').read_bytes() == NEW_JAR
+        assert serv.check() is False
+
+    finally:
+
+        update.close()
+
+
+def test_async_update_from_many_threads(api, tmp_path):
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    update = server_update.AsyncUpdate('1.16.5', base=api.v1)
+
+    try:
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+
+            results = list(pool.map(lambda num: update.run(update.download(str(tmp_path / '{}.jar'.format(num)),
+                                                                           '1.16.5', 100)), range(8)))
+
+    finally:
+
+        update.close()
+
+    assert all(results)
+    assert all((tmp_path / '{}.jar'.format(num)).read_bytes() == JAR for num in range(8))
+
+
+def test_download_unknown_length(api, tmp_path):
+
+    api.length = False
+    update = server_update.AsyncUpdate('1.16.5', base=api.v1)
+
+    try:
+
+        assert update.run(update.download(str(tmp_path / 'server.jar'), '1.16.5', 102,
+                                          hashlib.sha256(NEW_JAR).hexdigest()))
+
+    finally:
+
+        update.close()
+
+    assert (tmp_path / 'server.jar').read_bytes() == NEW_JAR
@@ -0,0 +1,84 @@
+import os
+import subprocess
+import sys
+import time
+
+import server_update
+
+from server import make_jar
+
+
+def _jar(tmp_path, seed):
+
+    path = tmp_path / 'build-{}.jar'.format(seed)
+    path.write_bytes(make_jar(seed, entries=4, size=4000, changed=(0,)))
+
+    return str(path)
+
+
+def test_lookup_leaves_index_alone(tmp_path):
+
+    cache = server_update.JarCache(str(tmp_path / 'cache'))
+    digest = cache.add(_jar(tmp_path, 1), '1.16.5', 100)
+    index = os.path.join(cache.jars, 'index.json')
+
+    os.utime(index, (0, 0))
+    os.utime(cache.jar_path(digest), (0, 0))
+
+    assert cache.lookup('1.16.5', 100)['hash'] == digest
+
+    # The use is recorded on the jar, the index is not rewritten
+
+    assert os.path.getmtime(index) == 0
+    assert os.path.getmtime(cache.jar_path(digest)) > time.time() - 60
+
+
+def test_lookup_protects_from_eviction(tmp_path):
+
+    cache = server_update.JarCache(str(tmp_path / 'cache'))
+    first = cache.add(_jar(tmp_path, 1), '1.16.5', 100)
+    second = cache.add(_jar(tmp_path, 2), '1.16.5', 101)
+
+    # Both jars were added long ago, but the first was looked up just now
+
+    for digest in (first, second):
+
+        os.utime(cache.jar_path(digest), (0, 0))
+
+    index = cache._load()
+
+    for entry in index.values():
+
+        entry['used'] = 0
+
+    cache._save(index)
+    cache.lookup('1.16.5', 100)
+
+    cache.max_size = os.path.getsize(cache.jar_path(first))
+    cache.evict()
+
+    assert os.path.isfile(cache.jar_path(first))
+    assert not os.path.isfile(cache.jar_path(second))
+    assert list(cache._load()) == ['1.16.5/100']
+
+
+def test_concurrent_processes_keep_every_entry(tmp_path):
+
+    root = str(tmp_path / 'cache')
+    jars = [_jar(tmp_path, seed) for seed in range(6)]
+    script = ('import sys, server_update\n'
+              'cache = server_update.JarCache(sys.argv[1])\n'
+              'for round in range(10):\n'
+              '    cache.add(sys.argv[2], "1.16.5", int(sys.argv[3]) * 100 + round)\n')
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(server_update.__file__)))
+
+    processes = [subprocess.Popen([sys.executable, '-c', script, root, jar, str(num)], env=env)
+                 for num, jar in enumerate(jars)]
+
+    assert all(process.wait() == 0 for process in processes)
+
+    index = server_update.JarCache(root)._load()
+
+    # Every add saw the others' entries, none were lost to a racing write
+
+    assert len(index) == 60
@@ -0,0 +1,152 @@
+import hashlib
+import threading
+
+import server_update
+from conftest import JAR, NEW_JAR
+from server import make_jar
+
+
+def _base(tmp_path):
+
+    path = tmp_path / 'server.jar'
+
+    path.write_bytes(JAR)
+
+    return str(path), hashlib.sha256(JAR).hexdigest()
+
+
+def _delta(tmp_path, new, claimed=None):
+
+    """
+    Builds a delta from JAR to a new jar, naming the claimed hash as the one it leads to
+    """
+
+    (tmp_path / 'old.jar').write_bytes(JAR)
+    (tmp_path / 'target.jar').write_bytes(new)
+
+    server_update.JarDelta.build(str(tmp_path / 'old.jar'), str(tmp_path / 'target.jar'), str(tmp_path / 'delta'),
+                                 hashlib.sha256(JAR).hexdigest(), claimed or hashlib.sha256(new).hexdigest())
+
+    return (tmp_path / 'delta').read_bytes()
+
+
+def _fell_back(api):
+
+    """
+    Checks that the delta was asked for, and the full jar was downloaded after it
+    """
+
+    delta = ('GET', '/api/v1/paper/1.16.5/102/delta/' + hashlib.sha256(JAR).hexdigest())
+
+    return delta in api.paths and api.paths[-1] == ('GET', '/api/v1/paper/1.16.5/102/download')
+
+
+def test_delta_applies(api, tmp_path):
+
+    api.deltas['1.16.5', 102, hashlib.sha256(JAR).hexdigest()] = _delta(tmp_path, NEW_JAR)
+    update = server_update.Update('1.16.5', base=api.v1, delta=True)
+    dest = str(tmp_path / 'new.jar')
+
+    assert update.download(dest, '1.16.5', 102, digest=hashlib.sha256(NEW_JAR).hexdigest(), base=_base(tmp_path))
+
+    with open(dest, 'rb') as file:
+
+        assert hashlib.sha256(file.read()).hexdigest() == hashlib.sha256(NEW_JAR).hexdigest()
+
+    # Only the delta crossed the network, not a byte of the jar itself
+
+    assert not any(path.endswith('/download') for method, path in api.paths) and api.stats['ranges'] == 0
+    assert len(api.deltas['1.16.5', 102, hashlib.sha256(JAR).hexdigest()]) < len(NEW_JAR) // 4
+
+
+def test_delta_with_wrong_result_falls_back(api, tmp_path):
+
+    # Delta claims to lead to build 102, but rebuilds some other jar
+
+    api.deltas['1.16.5', 102, hashlib.sha256(JAR).hexdigest()] = _delta(
+        tmp_path, make_jar(9, changed=(5,)), claimed=hashlib.sha256(NEW_JAR).hexdigest())
+    api.ranges = False  # No entries download either, the full jar is all that's left
+    update = server_update.Update('1.16.5', base=api.v1, delta=True)
+    dest = str(tmp_path / 'new.jar')
+
+    assert update.download(dest, '1.16.5', 102, digest=hashlib.sha256(NEW_JAR).hexdigest(), base=_base(tmp_path))
+
+    with open(dest, 'rb') as file:
+
+        assert file.read() == NEW_JAR
+
+    assert _fell_back(api)
+
+
+def test_missing_delta_falls_back(api, tmp_path):
+
+    api.ranges = False  # No entries download either, the full jar is all that's left
+    update = server_update.Update('1.16.5', base=api.v1, delta=True)
+    dest = str(tmp_path / 'new.jar')
+
+    assert update.download(dest, '1.16.5', 102, digest=hashlib.sha256(NEW_JAR).hexdigest(), base=_base(tmp_path))
+
+    with open(dest, 'rb') as file:
+
+        assert file.read() == NEW_JAR
+
+    # The stand-in has no delta for us and answered 404
+
+    assert _fell_back(api)
+
+
+def test_entries_download_fetches_changed_entries_only(api, tmp_path):
+
+    update = server_update.Update('1.16.5', base=api.v1, delta=True)
+    dest = str(tmp_path / 'new.jar')
+
+    assert update.download(dest, '1.16.5', 102, digest=hashlib.sha256(NEW_JAR).hexdigest(), base=_base(tmp_path))
+
+    with open(dest, 'rb') as file:
+
+        assert file.read() == NEW_JAR
+
+    assert 0 < api.stats['range_bytes'] < len(NEW_JAR) // 4
+
+
+def test_delta_paths_take_a_download_slot(api, tmp_path, monkeypatch):
+
+    update = server_update.Update('1.16.5', base=api.v1, delta=True, max_downloads=2)
+    running = []
+    peak = []
+    lock = threading.Lock()
+    entries = update._download_entries
+
+    def tracked(*args, **kwargs):
+
+        with lock:
+
+            running.append(1)
+            peak.append(len(running))
+
+        try:
+
+            return entries(*args, **kwargs)
+
+        finally:
+
+            with lock:
+
+                running.pop()
+
+    monkeypatch.setattr(update, '_download_entries', tracked)
+
+    base = _base(tmp_path)
+    threads = [threading.Thread(target=update.download, args=(str(tmp_path / 'new{}.jar'.format(num)), '1.16.5', 102),
+                                kwargs={'base': base}) for num in range(5)]
+
+    for thread in threads:
+
+        thread.start()
+
+    for thread in threads:
+
+        thread.join()
+
+    assert max(peak) <= 2
+    assert update.slots.acquire(blocking=False) and update.slots.acquire(blocking=False)
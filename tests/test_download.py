@@ -0,0 +1,91 @@
+import hashlib
+
+import pytest
+
+import server_update
+from conftest import JAR
+
+
+def _gets(api):
+
+    return sum(1 for method, path in api.paths if method == 'GET' and path.endswith('/download'))
+
+
+def test_single_stream(api, make_update, tmp_path):
+
+    path = str(tmp_path / 'server.jar')
+
+    assert make_update().download(path, '1.16.5', 100, digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+    assert api.stats['ranges'] == 0 and _gets(api) == 1
+
+
+@pytest.mark.parametrize('segments', [2, 4, 8])
+def test_segmented(api, make_update, tmp_path, segments):
+
+    path = str(tmp_path / 'server.jar')
+
+    assert make_update(segments=segments).download(path, '1.16.5', 100, digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+    assert api.stats['ranges'] == segments
+    assert api.stats['range_bytes'] == len(JAR)
+    assert not (tmp_path / 'server.jar.json').exists()
+
+
+def test_falls_back_without_accept_ranges(api, make_update, tmp_path):
+
+    path = str(tmp_path / 'server.jar')
+    api.ranges = False
+
+    assert make_update(segments=4).download(path, '1.16.5', 100, digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+    assert api.stats['ranges'] == 0 and _gets(api) == 1
+    assert ('HEAD', '/api/v1/paper/1.16.5/100/download') in api.paths
+
+
+def test_small_file_is_not_split(api, make_update, tmp_path):
+
+    path = str(tmp_path / 'server.jar')
+    update = make_update(segments=4)
+    update.min_segment = len(JAR)
+
+    assert update.download(path, '1.16.5', 100)
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+    assert api.stats['ranges'] == 0
+
+
+def test_segmented_segment_dropped(api, make_update, tmp_path):
+
+    path = str(tmp_path / 'server.jar')
+    api.drop = [10000]
+
+    assert make_update(segments=4, retry=server_update.RetryPolicy(backoff=0.01)).download(
+        path, '1.16.5', 100, digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+
+    # The retry only asked for what was missing, never the whole file again:
+
+    assert api.stats['ranges'] > 4 and _gets(api) == api.stats['ranges']
+    assert api.served[4:] and sum(last + 1 - first for first, last in api.served[4:]) < len(JAR)
+
+
+def test_wrong_digest_fails(api, make_update, tmp_path):
+
+    path = str(tmp_path / 'server.jar')
+
+    assert not make_update(segments=4).download(path, '1.16.5', 100, digest='0' * 64)
+
+
+@pytest.mark.parametrize('segments', [1, 4])
+def test_unknown_length(api, make_update, tmp_path, segments):
+
+    path = str(tmp_path / 'server.jar')
+    api.length = False
+
+    assert make_update(segments=segments).download(path, '1.16.5', 100, digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+    assert api.stats['ranges'] == 0 and _gets(api) == 1
+
+    # Nothing to resume without a length, so no manifest was ever written
+
+    assert not (tmp_path / 'server.jar.json').exists()
@@ -0,0 +1,77 @@
+import hashlib
+
+import server_update
+from conftest import JAR, NEW_JAR
+
+
+def _fleet(api, tmp_path, count=2, update=None):
+
+    servers = []
+
+    for num in range(count):
+
+        path = tmp_path / 'server{}'.format(num)
+
+        path.mkdir()
+        (path / 'server.jar').write_bytes(JAR)
+        (path / 'version_history.json').write_text('{"currentVersion": "git-Paper-100 (MC: 1.16.5)"}')
+
+        servers.append({'path': str(path / 'server.jar'), 'config_file': None, 'version': '1.16.5',
+                        'build': 'latest'})
+
+    return server_update.Fleet(servers, (update if update is not None else server_update.Update('1.16.5', base=api.v1)))
+
+
+def test_fleet_updates_servers(api, tmp_path):
+
+    results = _fleet(api, tmp_path).run()
+
+    assert [result['status'] for result in results] == ['updated', 'updated']
+    assert [result['target'] for result in results] == ['1.16.5/102', '1.16.5/102']
+
+    for num in range(2):
+
+        assert (tmp_path / 'server{}'.format(num) / 'server.jar').read_bytes() == NEW_JAR
+
+
+def test_watched_fleet_installs_once(api, tmp_path):
+
+    fleet = _fleet(api, tmp_path)
+    watcher = server_update.Watcher(fleet, interval=0)
+
+    watcher.run(polls=3)
+
+    # The version history files still say 100, the server never restarted:
+
+    assert watcher.polls == 3 and watcher.failures == 0
+    assert [result['status'] for result in fleet.results] == ['up-to-date', 'up-to-date']
+    assert [result['current'] for result in fleet.results] == ['1.16.5/102', '1.16.5/102']
+    assert sum(1 for method, path in api.paths if path.endswith('/102/download') and method == 'GET') == 1
+
+    backups = fleet.updaters[fleet.servers[0]['path']].fileutil.backups.list()
+
+    assert [(entry['build'], entry['hash']) for entry in backups] == [('100', hashlib.sha256(JAR).hexdigest())]
+
+
+def test_fleet_with_async_update(api, tmp_path):
+
+    fleet = _fleet(api, tmp_path, count=3, update=server_update.AsyncUpdate('1.16.5', base=api.v1))
+
+    try:
+
+        results = fleet.run()
+
+        assert [result['status'] for result in results] == ['updated'] * 3
+        assert [result['target'] for result in results] == ['1.16.5/102'] * 3
+
+        for num in range(3):
+
+            assert (tmp_path / 'server{}'.format(num) / 'server.jar').read_bytes() == NEW_JAR
+
+        # Nothing left to do on the next run:
+
+        assert [result['status'] for result in fleet.run()] == ['up-to-date'] * 3
+
+    finally:
+
+        fleet.update.close()
@@ -0,0 +1,80 @@
+import server_update
+from conftest import JAR
+from server import StandIn
+
+
+def test_revalidates_with_conditional_request(api, tmp_path):
+
+    update = server_update.Update('1.16.5', meta=server_update.MetadataCache(str(tmp_path), ttl=0), base=api.v1)
+
+    assert update.get_versions() == ['1.16.5', '1.15.2']
+    assert update.get_versions() == ['1.16.5', '1.15.2']
+    assert api.stats['not_modified'] == 1
+
+
+def test_304_without_validators_keeps_cached_ones(api, tmp_path):
+
+    meta = server_update.MetadataCache(str(tmp_path), ttl=0)
+    update = server_update.Update('1.16.5', meta=meta, base=api.v1)
+
+    assert update.get_buildnums('1.16.5') == ['102', '100']
+
+    first = meta.get(update._api_url('1.16.5'))
+
+    api.bare_304 = True
+
+    # Every later request should still be conditional, even though the 304s carry no validators:
+
+    for _ in range(3):
+
+        assert update.get_buildnums('1.16.5') == ['102', '100']
+
+    entry = meta.get(update._api_url('1.16.5'))
+
+    assert api.stats['not_modified'] == 3
+    assert (entry['etag'], entry['modified']) == (first['etag'], first['modified'])
+    assert entry['fetched'] > first['fetched']
+
+
+def test_offline_answers_from_cache(api, tmp_path):
+
+    meta = server_update.MetadataCache(str(tmp_path), ttl=0)
+
+    assert server_update.Update('1.16.5', meta=meta, base=api.v1).get_versions() is not None
+
+    requests = api.stats['requests']
+    offline = server_update.Update('1.16.5', meta=meta, base=api.v1, offline=True)
+
+    assert offline.get_versions() == ['1.16.5', '1.15.2']
+    assert api.stats['requests'] == requests
+
+
+def test_catalog_per_base(api, tmp_path):
+
+    other = StandIn()
+    other.add('1.17.1', 5, JAR)
+    other.start()
+
+    meta = server_update.MetadataCache(str(tmp_path))
+
+    try:
+
+        for version, base in (('1.16.5', api.v1), ('1.17.1', other.v1)):
+
+            update = server_update.Update(version, meta=meta, base=base)
+
+            assert update.get_versions() and update.get_buildnums(version)
+
+    finally:
+
+        other.close()
+
+    # Each base kept its own catalog in the shared directory, neither sees the other's builds:
+
+    first = server_update.Update('1.16.5', meta=meta, base=api.v1, offline=True).catalog
+    second = server_update.Update('1.17.1', meta=meta, base=other.v1, offline=True).catalog
+
+    assert first.path != second.path
+    assert (first.latest_version(), first.latest_build('1.16.5')) == ('1.16.5', '102')
+    assert (second.latest_version(), second.latest_build('1.17.1')) == ('1.17.1', '5')
+    assert first.latest_build('1.17.1') is None and second.latest_build('1.16.5') is None
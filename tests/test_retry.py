@@ -0,0 +1,107 @@
+import functools
+import hashlib
+import time
+
+import pytest
+
+import server_update
+from conftest import JAR
+
+
+@pytest.fixture(params=[server_update.Update, server_update.AsyncUpdate], ids=['blocking', 'async'])
+def client(request, make_update):
+
+    """
+    Makes blocking or async updaters with a quick retry policy, returns (update, call)
+    """
+
+    def make(**kwargs):
+
+        update = make_update(request.param, retry=server_update.RetryPolicy(**dict({'backoff': 0.01}, **kwargs)))
+
+        return update, functools.partial(server_update.call_update, update)
+
+    return make
+
+
+def test_server_errors_are_retried(api, client):
+
+    update, call = client()
+    api.fail = [500, 503]
+
+    assert call(update.get_versions) == ['1.16.5', '1.15.2']
+    assert api.stats['requests'] == 3
+
+
+def test_gives_up_after_attempts(api, client):
+
+    update, call = client(attempts=2)
+    api.fail = [500, 500, 500]
+
+    assert call(update.get_versions) is None
+    assert api.stats['requests'] == 2
+
+
+def test_client_errors_are_not_retried(api, client):
+
+    update, call = client()
+
+    assert call(update.get_buildnums, '9.9', report=False) is None
+    assert api.stats['requests'] == 1
+
+
+def test_stalled_request_times_out_and_is_retried(api, client):
+
+    update, call = client(read_timeout=0.3)
+    api.stall = [2]
+    start = time.monotonic()
+
+    assert call(update.get_versions) == ['1.16.5', '1.15.2']
+    assert time.monotonic() - start < 1.5
+    assert api.stats['requests'] == 2
+
+
+def test_stalled_download_times_out_and_is_retried(api, client, tmp_path):
+
+    update, call = client(read_timeout=0.3)
+    api.stall = [2]
+    start = time.monotonic()
+
+    assert call(update.download, str(tmp_path / 'server.jar'), '1.16.5', 100,
+                digest=hashlib.sha256(JAR).hexdigest())
+    assert time.monotonic() - start < 1.5
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+
+
+def test_dropped_download_resumes_from_last_good_byte(api, client, tmp_path):
+
+    update, call = client()
+    api.drop = [len(JAR) // 2]
+
+    assert call(update.download, str(tmp_path / 'server.jar'), '1.16.5', 100,
+                digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+
+    # Only the missing half was sent again:
+
+    assert api.stats['ranges'] == 1
+    assert api.stats['range_bytes'] <= len(JAR) - len(JAR) // 2 + 65536
+
+
+def test_dropped_download_restarts_without_ranges(api, client, tmp_path):
+
+    update, call = client()
+    api.ranges = False
+    api.drop = [len(JAR) // 2]
+
+    assert call(update.download, str(tmp_path / 'server.jar'), '1.16.5', 100,
+                digest=hashlib.sha256(JAR).hexdigest())
+    assert (tmp_path / 'server.jar').read_bytes() == JAR
+
+
+def test_download_gives_up_after_attempts(api, client, tmp_path):
+
+    update, call = client(attempts=2)
+    api.drop = [1000, 1000, 1000]
+
+    assert not call(update.download, str(tmp_path / 'server.jar'), '1.16.5', 100)
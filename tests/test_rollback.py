@@ -0,0 +1,78 @@
+import hashlib
+
+import pytest
+
+import server_update
+from conftest import JAR, NEW_JAR
+
+
+@pytest.fixture
+def server(tmp_path):
+
+    """
+    Server directory running build 100, whose version history file keeps saying so(The server never restarts)
+    """
+
+    (tmp_path / 'server.jar').write_bytes(JAR)
+    (tmp_path / 'version_history.json').write_text('{"currentVersion": "git-Paper-100 (MC: 1.16.5)"}')
+
+    return tmp_path
+
+
+def _updater(api, server, cache=None):
+
+    # A new updater every time, like separate runs of the script
+
+    return server_update.ServerUpdater(str(server / 'server.jar'), version='0', build=0, prompt=False, base=api.v1,
+                                       cache=cache)
+
+
+def _live(server):
+
+    return hashlib.sha256((server / 'server.jar').read_bytes()).digest()
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_update_rollback_roll_forward(api, server, tmp_path_factory, cached):
+
+    cache = (server_update.JarCache(str(tmp_path_factory.mktemp('cache'))) if cached else None)
+
+    assert _updater(api, server, cache).get_new('1.16.5', '102')
+    assert _live(server) == hashlib.sha256(NEW_JAR).digest()
+
+    # Rolling back, the version history file still claims build 100 is live:
+
+    serv = _updater(api, server, cache)
+
+    assert serv.rollback()
+    assert (serv.version, serv.buildnum) == ('1.16.5', '100')
+    assert _live(server) == hashlib.sha256(JAR).digest()
+
+    backups = serv.fileutil.backups.list()
+
+    assert [entry['build'] for entry in backups] == ['102', '100']
+    assert backups[0]['hash'] == hashlib.sha256(NEW_JAR).hexdigest()
+
+    # Rolling forward again:
+
+    serv = _updater(api, server, cache)
+
+    assert serv.rollback('102')
+    assert (serv.version, serv.buildnum) == ('1.16.5', '102')
+    assert _live(server) == hashlib.sha256(NEW_JAR).digest()
+
+    backups = serv.fileutil.backups.list()
+
+    assert [(entry['build'], entry['hash']) for entry in backups] == [
+        ('100', hashlib.sha256(JAR).hexdigest()), ('102', hashlib.sha256(NEW_JAR).hexdigest())]
+
+
+def test_unknown_jar_falls_back_to_version_history(api, server):
+
+    serv = _updater(api, server)
+
+    assert serv.get_new('1.16.5', '102')
+
+    entry = serv.fileutil.backups.list()[0]
+
+    assert (entry['version'], entry['build'], entry['hash']) == ('1.16.5', '100', hashlib.sha256(JAR).hexdigest())
@@ -0,0 +1,19 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench'))
+
+import startup  # noqa: E402
+
+
+def test_check_path_skips_lazy_modules(api):
+
+    # Timing is left to bench/startup.py, this only checks what gets imported
+
+    with tempfile.TemporaryDirectory() as directory:
+
+        wall, times = startup.run(api, directory)
+
+    assert not set(times) & set(startup.LAZY)
+    assert 'http.client' in times